@@ -0,0 +1,130 @@
+"""Compact, sorted index of the slide files of one folder."""
+
+from __future__ import annotations
+
+import os
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+
+
+class FileIndex:
+    """File names of one folder, sorted, in a single UTF-8 buffer.
+
+    The folder is stored once; each row is an ``(offset, length)`` pair into
+    the buffer, held in two typed arrays, so a row costs a few bytes instead
+    of a Python string per path. Names are appended to the buffer and only
+    the arrays are reordered; removed names leave garbage that is compacted
+    once it outweighs the live names. ``row_of`` is a dict lookup, the dict
+    being rebuilt lazily after the rows change.
+    """
+
+    def __init__(self, folder: str = "") -> None:
+        self.reset(folder)
+
+    def reset(self, folder: str) -> None:
+        self.folder = folder
+        self._buffer = bytearray()
+        self._offsets = array("Q")
+        self._lengths = array("I")
+        self._live_bytes = 0
+        self._rows: dict[str, int] | None = None
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, row: int) -> str:
+        """The file name at ``row``; lets ``bisect`` search the index."""
+        offset = self._offsets[row]
+        return self._buffer[offset:offset + self._lengths[row]].decode("utf-8", "surrogateescape")
+
+    name = __getitem__
+
+    def path(self, row: int) -> str:
+        return os.path.join(self.folder, self[row])
+
+    def paths(self) -> Iterator[str]:
+        return (self.path(row) for row in range(len(self)))
+
+    def row_of(self, file_path: str) -> int:
+        """Row of ``file_path``, or -1 if it is not in the index."""
+        folder, name = os.path.split(file_path)
+        if folder != self.folder:
+            return -1
+        if self._rows is None:
+            self._rows = {self[row]: row for row in range(len(self))}
+        return self._rows.get(name, -1)
+
+    def insertion_runs(self, file_paths: Iterable[str]) -> list[tuple[int, list[str]]]:
+        """Group new names into ``(row, names)`` runs, ascending, in final row order.
+
+        Applying the runs in order with ``insert`` keeps the index sorted.
+        Names already present or outside the folder are skipped.
+        """
+        runs: list[tuple[int, list[str]]] = []
+        inserted = 0
+        last_position = -1
+        for name in sorted({os.path.basename(path) for path in file_paths if os.path.dirname(path) == self.folder}):
+            position = bisect_left(self, name)
+            if position < len(self) and self[position] == name:
+                continue
+            if position == last_position:
+                runs[-1][1].append(name)
+            else:
+                runs.append((position + inserted, [name]))
+                last_position = position
+            inserted += 1
+        return runs
+
+    def insert(self, row: int, names: list[str]) -> None:
+        """Insert already sorted ``names`` at ``row``."""
+        offsets = array("Q")
+        lengths = array("I")
+        for name in names:
+            self._append(name, offsets, lengths)
+        self._offsets[row:row] = offsets
+        self._lengths[row:row] = lengths
+        self._rows = None
+
+    def insert_runs(self, runs: list[tuple[int, list[str]]]) -> None:
+        """Apply ``insertion_runs`` output in one pass, rebuilding the row arrays once."""
+        offsets = array("Q")
+        lengths = array("I")
+        previous = inserted = 0
+        for row, names in runs:
+            position = row - inserted
+            offsets.extend(self._offsets[previous:position])
+            lengths.extend(self._lengths[previous:position])
+            for name in names:
+                self._append(name, offsets, lengths)
+            previous = position
+            inserted += len(names)
+        offsets.extend(self._offsets[previous:])
+        lengths.extend(self._lengths[previous:])
+        self._offsets = offsets
+        self._lengths = lengths
+        self._rows = None
+
+    def remove(self, row: int, count: int = 1) -> None:
+        """Remove ``count`` rows starting at ``row``."""
+        self._live_bytes -= sum(self._lengths[row:row + count])
+        del self._offsets[row:row + count]
+        del self._lengths[row:row + count]
+        self._rows = None
+        if len(self._buffer) > 2 * self._live_bytes + 65536:
+            self._compact()
+
+    def _append(self, name: str, offsets: array, lengths: array) -> None:
+        encoded = name.encode("utf-8", "surrogateescape")
+        offsets.append(len(self._buffer))
+        lengths.append(len(encoded))
+        self._buffer += encoded
+        self._live_bytes += len(encoded)
+
+    def _compact(self) -> None:
+        buffer = bytearray()
+        for row in range(len(self)):
+            offset = self._offsets[row]
+            self._offsets[row] = len(buffer)
+            buffer += self._buffer[offset:offset + self._lengths[row]]
+        self._buffer = buffer
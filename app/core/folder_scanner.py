@@ -0,0 +1,127 @@
+"""Background scanning of a folder for HTML slides."""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+HTML_SUFFIXES = (".html", ".htm")
+# A batch is sent when it is this large or this old, whichever comes first,
+# so the first entries of a slow share appear without waiting for a full batch.
+BATCH_SIZE = 500
+BATCH_INTERVAL_S = 0.1
+
+
+class _ScanSignals(QObject):
+    batch = pyqtSignal(int, list)
+    finished = pyqtSignal(int, int)
+    failed = pyqtSignal(int, str)
+
+
+class _ScanTask:
+    def __init__(self, generation: int, folder: str, cancelled: threading.Event, signals: _ScanSignals) -> None:
+        self.generation = generation
+        self.folder = folder
+        self.cancelled = cancelled
+        self.signals = signals
+
+    def run(self) -> None:
+        batch: list[str] = []
+        total = 0
+        sent_at = time.monotonic()
+        try:
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    if self.cancelled.is_set():
+                        return
+                    # Suffix first: is_file() reuses the dirent type and only
+                    # stats when the filesystem does not report one.
+                    if entry.name.lower().endswith(HTML_SUFFIXES) and entry.is_file():
+                        batch.append(entry.path)
+                    if batch and (len(batch) >= BATCH_SIZE or time.monotonic() - sent_at >= BATCH_INTERVAL_S):
+                        total += len(batch)
+                        self.signals.batch.emit(self.generation, batch)
+                        batch, sent_at = [], time.monotonic()
+        except OSError as exc:
+            self.signals.failed.emit(self.generation, exc.strerror or str(exc))
+            return
+        if self.cancelled.is_set():
+            return
+        if batch:
+            total += len(batch)
+            self.signals.batch.emit(self.generation, batch)
+        self.signals.finished.emit(self.generation, total)
+
+
+class FolderScanner(QObject):
+    """Lists HTML files of a folder on a worker thread.
+
+    ``batch_found`` delivers unsorted paths as they are discovered, then
+    ``finished`` the total count, or ``failed`` an error message. Starting a
+    new scan cancels the previous one; its pending signals are dropped.
+
+    Each scan gets a daemon thread of its own: a cancelled scan only stops
+    between directory entries, and one blocked on a hung network share must
+    hold up neither the scan of the next folder nor application exit.
+    """
+
+    batch_found = pyqtSignal(list)
+    finished = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        # Not parented: worker threads keep it alive after this object is gone.
+        self._signals = _ScanSignals()
+        self._signals.batch.connect(self._on_batch)
+        self._signals.finished.connect(self._on_finished)
+        self._signals.failed.connect(self._on_failed)
+        self._generation = 0
+        self._cancelled = threading.Event()
+        self._running = False
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self, folder: str) -> None:
+        self.cancel()
+        self._cancelled = threading.Event()
+        self._running = True
+        self._thread = threading.Thread(
+            target=_ScanTask(self._generation, folder, self._cancelled, self._signals).run,
+            name="folder-scan",
+            daemon=True
+        )
+        self._thread.start()
+
+    def cancel(self) -> None:
+        """Stop the running scan, if any, after its current directory entry."""
+        self._cancelled.set()
+        self._generation += 1
+        self._running = False
+
+    def wait(self, msecs: int = -1) -> bool:
+        """Wait for the latest scan's thread; True if it has ended."""
+        if self._thread is None:
+            return True
+        self._thread.join(None if msecs < 0 else msecs / 1000)
+        return not self._thread.is_alive()
+
+    def _on_batch(self, generation: int, paths: list) -> None:
+        if generation == self._generation:
+            self.batch_found.emit(paths)
+
+    def _on_finished(self, generation: int, total: int) -> None:
+        if generation == self._generation:
+            self._running = False
+            self.finished.emit(total)
+
+    def _on_failed(self, generation: int, message: str) -> None:
+        if generation == self._generation:
+            self._running = False
+            self.failed.emit(message)
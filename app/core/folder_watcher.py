@@ -0,0 +1,124 @@
+"""Incremental tracking of changes to the open folder."""
+
+from __future__ import annotations
+
+import os
+
+from PyQt6.QtCore import QFileSystemWatcher, QObject, QTimer, pyqtSignal
+
+from app.core.folder_scanner import FolderScanner
+
+# Bursts of events (a copy of many files, an editor's save) are coalesced.
+DEBOUNCE_MS = 250
+
+
+class FolderWatcher(QObject):
+    """Reports additions, removals and content changes of HTML files in a folder.
+
+    Directory events only say that *something* changed, so the folder is
+    re-listed on a worker thread and diffed against the known file set;
+    ``files_changed`` carries the added and removed paths (a rename is one
+    of each). Content changes are reported by ``file_modified`` for the files
+    passed to ``watch_files`` only, typically the slides currently loaded.
+    """
+
+    files_changed = pyqtSignal(list, list)
+    file_modified = pyqtSignal(str)
+
+    def __init__(self, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._directory_changed)
+        self._watcher.fileChanged.connect(self._file_changed)
+
+        self._scanner = FolderScanner(self)
+        self._scanner.batch_found.connect(self._listing_batch)
+        self._scanner.finished.connect(self._listing_finished)
+        self._scanner.failed.connect(self._listing_failed)
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(DEBOUNCE_MS)
+        self._timer.timeout.connect(self._flush)
+
+        self._folder = ""
+        self._known: set[str] | None = None
+        self._listed: list[str] = []
+        self._dirty = False
+        self._modified: set[str] = set()
+        self._watched_files: set[str] = set()
+
+    def watch(self, folder: str) -> None:
+        """Start watching ``folder``; changes are diffed once ``set_baseline`` is called."""
+        self._scanner.cancel()
+        self._timer.stop()
+        if self._watcher.directories():
+            self._watcher.removePaths(self._watcher.directories())
+        self._folder = folder
+        self._known = None
+        self._dirty = False
+        self._modified.clear()
+        self._watcher.addPath(folder)
+
+    def set_baseline(self, file_paths: list[str]) -> None:
+        """Record the files of the initial scan; earlier events are diffed now."""
+        self._known = set(file_paths)
+        if self._dirty:
+            self._timer.start()
+
+    def rescan(self) -> None:
+        """Diff the folder now, for filesystems that do not deliver events."""
+        self._dirty = True
+        self._flush()
+
+    def watch_files(self, file_paths: list[str]) -> None:
+        """Report content changes of exactly these files."""
+        wanted = set(file_paths)
+        stale = [path for path in self._watched_files - wanted if path in self._watcher.files()]
+        if stale:
+            self._watcher.removePaths(stale)
+        self._watched_files = wanted
+        missing = [path for path in wanted if path not in self._watcher.files()]
+        if missing:
+            self._watcher.addPaths(missing)
+
+    def _directory_changed(self, _folder: str) -> None:
+        self._dirty = True
+        self._timer.start()
+
+    def _file_changed(self, file_path: str) -> None:
+        self._modified.add(file_path)
+        self._timer.start()
+
+    def _flush(self) -> None:
+        for file_path in sorted(self._modified):
+            # Editors that save by rename drop the watch; restore it.
+            if os.path.exists(file_path):
+                if file_path in self._watched_files and file_path not in self._watcher.files():
+                    self._watcher.addPath(file_path)
+                self.file_modified.emit(file_path)
+        self._modified.clear()
+
+        if self._dirty and self._known is not None and not self._scanner.running:
+            self._dirty = False
+            self._listed = []
+            self._scanner.start(self._folder)
+
+    def _listing_batch(self, paths: list) -> None:
+        self._listed.extend(paths)
+
+    def _listing_failed(self, _message: str) -> None:
+        # Keep the known files; a later event or rescan retries.
+        self._listed = []
+
+    def _listing_finished(self, _total: int) -> None:
+        current = set(self._listed)
+        self._listed = []
+        added = sorted(current - self._known)
+        removed = sorted(self._known - current)
+        self._known = current
+        if added or removed:
+            self.files_changed.emit(added, removed)
+        if self._dirty:
+            # More events arrived while listing.
+            self._timer.start()
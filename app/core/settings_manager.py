@@ -14,6 +14,8 @@ class SettingsManager:
     KEY_LAST_FOLDER = "viewer/last_folder"
     KEY_LAST_FILE = "viewer/last_file"
     KEY_AUTOPLAY_MS = "viewer/autoplay_ms"
+    KEY_CACHE_PAGES = "cache/pages"
+    KEY_CACHE_BUDGET_MB = "cache/budget_mb"
 
     def __init__(self) -> None:
         self._settings = QSettings(self.ORG_NAME, self.APP_NAME)
@@ -36,5 +38,12 @@ class SettingsManager:
     def set_autoplay_ms(self, interval_ms: int) -> None:
         self._settings.setValue(self.KEY_AUTOPLAY_MS, interval_ms)
 
+    def get_cache_pages(self) -> int:
+        """Number of pages kept warm: current, next and previous by default."""
+        return int(self._settings.value(self.KEY_CACHE_PAGES, 3, int))
+
+    def get_cache_budget_mb(self) -> int:
+        return int(self._settings.value(self.KEY_CACHE_BUDGET_MB, 512, int))
+
     def sync(self) -> None:
         self._settings.sync()
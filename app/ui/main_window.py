@@ -2,15 +2,12 @@
 
 from __future__ import annotations
 
-from pathlib import Path
-
-from PyQt6.QtCore import QDir, QTimer, Qt
+from PyQt6.QtCore import QDir, QItemSelectionModel, QModelIndex, QTimer, Qt
 from PyQt6.QtGui import QAction, QKeySequence, QShortcut
 from PyQt6.QtWidgets import (
     QFileDialog,
     QLabel,
-    QListWidget,
-    QListWidgetItem,
+    QListView,
     QMainWindow,
     QMessageBox,
     QSpinBox,
@@ -18,8 +15,13 @@ from PyQt6.QtWidgets import (
     QToolBar,
 )
 
+from app.core.file_index import FileIndex
+from app.core.folder_scanner import FolderScanner
+from app.core.folder_watcher import FolderWatcher
 from app.core.settings_manager import SettingsManager
 from app.widgets.html_viewer import HtmlViewer
+from app.widgets.slide_cache import SlideCache
+from app.widgets.slide_list_model import SlideListModel
 
 
 class MainWindow(QMainWindow):
@@ -32,23 +34,57 @@ class MainWindow(QMainWindow):
 
         self.settings = SettingsManager()
         self.current_folder = ""
-        self.html_files: list[str] = []
+        # Sorted slide files of current_folder; the sidebar's model wraps it.
+        self.files = FileIndex()
         self.current_index = -1
+        # File on screen; survives rescans so it is not reloaded when it reappears.
+        self._shown_file = ""
+        # Slide to select once the running scan finds it.
+        self._pending_file = ""
+        self._notify_scan_errors = True
+        # +1 after Next/auto-play, -1 after Previous; decides what to preload.
+        self._direction = 1
 
         self.autoplay_timer = QTimer(self)
         self.autoplay_timer.timeout.connect(self.next_slide)
 
+        self.scanner = FolderScanner(self)
+        self.scanner.batch_found.connect(self._add_scanned_files)
+        self.scanner.finished.connect(self._scan_finished)
+        self.scanner.failed.connect(self._scan_failed)
+
+        self.watcher = FolderWatcher(self)
+        self.watcher.files_changed.connect(self._apply_file_changes)
+        self.watcher.file_modified.connect(self._file_modified)
+
         self._setup_ui()
         self._setup_shortcuts()
         self._restore_state()
 
     def _setup_ui(self) -> None:
         """Create widgets and layout containers."""
-        self.sidebar = QListWidget()
+        self.slide_model = SlideListModel(self.files, self)
+        self.sidebar = QListView()
         self.sidebar.setObjectName("Sidebar")
-        self.sidebar.currentRowChanged.connect(self.open_slide_by_index)
+        self.sidebar.setUniformItemSizes(True)
+        self.sidebar.setModel(self.slide_model)
+        self.sidebar.selectionModel().currentRowChanged.connect(
+            lambda current, _previous: self.open_slide_by_index(current.row())
+        )
 
         self.viewer = HtmlViewer()
+        self.viewer.loadFinished.connect(self._preload_neighbours)
+
+        # Cached pages report their content size to the viewer for fit-to-screen.
+        self.slide_cache = SlideCache(
+            max_pages=self.settings.get_cache_pages(),
+            memory_budget=self.settings.get_cache_budget_mb() * 1024 * 1024,
+            page_factory=self.viewer.create_page,
+            parent=self,
+        )
+
+        self.cache_label = QLabel()
+        self.statusBar().addPermanentWidget(self.cache_label)
 
         splitter = QSplitter()
         splitter.addWidget(self.sidebar)
@@ -113,8 +149,9 @@ class MainWindow(QMainWindow):
     def _restore_state(self) -> None:
         """Load previously used folder and last opened slide."""
         folder = self.settings.get_last_folder()
-        if folder and Path(folder).is_dir():
-            self.load_folder(folder)
+        if folder:
+            # Deferred so the window paints before the folder is touched.
+            QTimer.singleShot(0, lambda: self.load_folder(folder, notify_errors=False))
 
     def select_folder(self) -> None:
         """Prompt user to choose a folder containing HTML files."""
@@ -125,81 +162,171 @@ class MainWindow(QMainWindow):
 
         self.load_folder(folder)
 
-    def load_folder(self, folder: str) -> None:
-        """Scan a folder for HTML files and update sidebar."""
-        path = Path(folder)
-        if not path.exists() or not path.is_dir():
-            QMessageBox.warning(self, "Invalid Folder", "Selected path is not a folder.")
-            return
-
-        self.current_folder = str(path)
+    def load_folder(self, folder: str, notify_errors: bool = True) -> None:
+        """Start scanning a folder for HTML files; the sidebar fills as they are found."""
+        self.scanner.cancel()
+        self.current_folder = folder
+        self.current_index = -1
+        self._pending_file = self.settings.get_last_file()
+        self._notify_scan_errors = notify_errors
+        self.slide_cache.clear()
+        self.slide_model.reset(folder)
+        self.statusBar().showMessage("Scanning folder…")
+        self.watcher.watch(folder)
+        self.scanner.start(folder)
+
+    def _select_row(self, row: int, notify: bool = True) -> None:
+        """Make ``row`` the sidebar's current row, opening it unless ``notify`` is False."""
+        selection = self.sidebar.selectionModel()
+        selection.blockSignals(not notify)
+        selection.setCurrentIndex(
+            self.slide_model.index(row) if row >= 0 else QModelIndex(),
+            QItemSelectionModel.SelectionFlag.ClearAndSelect,
+        )
+        selection.blockSignals(False)
+
+    def _add_scanned_files(self, paths: list) -> None:
+        """Merge a batch of scanned paths into the sorted file index and sidebar."""
+        self.slide_model.merge(paths)
+        self.statusBar().showMessage(f"Scanning folder… {len(self.files)} files")
+
+        # The merge resets the model, so the selection is restored by path.
+        if self.current_index >= 0:
+            self.current_index = self.files.row_of(self._shown_file)
+            self._select_row(self.current_index, notify=False)
+        elif self._pending_file in paths:
+            self._select_row(self.files.row_of(self._pending_file))
+
+    def _scan_finished(self, total: int) -> None:
         self.settings.set_last_folder(self.current_folder)
+        self.watcher.set_baseline(list(self.files.paths()))
+        self.statusBar().showMessage(f"{total} slides", 3000)
 
-        files = [
-            str(file)
-            for file in sorted(path.iterdir())
-            if file.is_file() and file.suffix.lower() in {".html", ".htm"}
-        ]
-
-        self.html_files = files
-        self.sidebar.clear()
-
-        for file_path in self.html_files:
-            self.sidebar.addItem(QListWidgetItem(Path(file_path).name))
-
-        if not self.html_files:
+        if not len(self.files):
             self.current_index = -1
-            self.viewer.setHtml("<h2 style='font-family:sans-serif'>No HTML files found.</h2>")
+            self._shown_file = ""
+            self.viewer.show_message("<h2 style='font-family:sans-serif'>No HTML files found.</h2>")
             return
 
-        last_file = self.settings.get_last_file()
-        start_index = 0
-        if last_file in self.html_files:
-            start_index = self.html_files.index(last_file)
+        if self.current_index < 0:
+            self._select_row(0)
 
-        self.sidebar.setCurrentRow(start_index)
+    def _scan_failed(self, message: str) -> None:
+        self.statusBar().clearMessage()
+        if self._notify_scan_errors:
+            QMessageBox.warning(self, "Invalid Folder", f"Cannot read folder: {message}")
 
     def refresh_file_list(self) -> None:
-        """Re-scan the current folder for updated HTML files."""
+        """Pick up folder changes the watcher has not reported yet.
+
+        Changes are normally applied as they happen, so this only re-lists the
+        folder in the background and touches nothing if it is unchanged.
+        """
         if not self.current_folder:
             self.select_folder()
             return
 
-        current_file = self._current_file_path()
-        self.load_folder(self.current_folder)
-        if current_file and current_file in self.html_files:
-            self.sidebar.setCurrentRow(self.html_files.index(current_file))
+        if not self.scanner.running:
+            self.watcher.rescan()
+
+    def _apply_file_changes(self, added: list, removed: list) -> None:
+        """Apply a watcher diff to the file index and sidebar, keeping the selection."""
+        previous_index = self.current_index
+        selection = self.sidebar.selectionModel()
+        selection.blockSignals(True)
+        self.slide_model.remove(removed)
+        for file_path in removed:
+            self.slide_cache.invalidate(file_path)
+        self.slide_model.add(added)
+        selection.blockSignals(False)
+        self.statusBar().showMessage(f"{len(added)} added, {len(removed)} removed", 3000)
+
+        row = self.files.row_of(self._shown_file)
+        if row >= 0:
+            self.current_index = row
+            self._select_row(row, notify=False)
+            self._preload_neighbours()
+        elif len(self.files):
+            # The slide on screen is gone: show the one that took its place.
+            row = min(max(previous_index, 0), len(self.files) - 1)
+            self._select_row(row, notify=False)
+            self.open_slide_by_index(row)
+        else:
+            self.current_index = -1
+            self._shown_file = ""
+            self.viewer.show_message("<h2 style='font-family:sans-serif'>No HTML files found.</h2>")
+
+    def _file_modified(self, file_path: str) -> None:
+        """Reload the slide on screen if it changed; drop stale preloaded pages."""
+        if file_path == self._shown_file:
+            self.viewer.reload()
+        else:
+            self.slide_cache.invalidate(file_path)
+            self._preload_neighbours()
 
     def open_slide_by_index(self, index: int) -> None:
         """Load selected HTML file by list index."""
-        if index < 0 or index >= len(self.html_files):
+        if index < 0 or index >= len(self.files):
             return
 
         self.current_index = index
-        file_path = self.html_files[index]
-        self.viewer.load_local_file(file_path)
+        file_path = self.files.path(index)
+        if file_path == self._shown_file:
+            return
+        self._shown_file = file_path
+        page, _hit = self.slide_cache.page_for(file_path)
+        self.viewer.show_page(page)
         self.settings.set_last_file(file_path)
+        if self.slide_cache.is_loaded(file_path):
+            self._preload_neighbours()
+        # Otherwise the viewer's loadFinished triggers the preload, so it does
+        # not compete with the visible page.
+        self._cache_updated()
+
+    def _preload_neighbours(self, _ok: bool = True) -> None:
+        """Warm the slides most likely to be shown next, in the current direction."""
+        count = len(self.files)
+        if count < 2 or self.current_index < 0:
+            return
+
+        slots = self.slide_cache.max_pages - 1
+        steps = list(range(1, slots)) + [-1] if slots >= 2 else [1] * slots
+        neighbours: list[str] = []
+        for step in steps:
+            file_path = self.files.path((self.current_index + step * self._direction) % count)
+            if file_path != self._shown_file and file_path not in neighbours:
+                neighbours.append(file_path)
+        self.slide_cache.preload(neighbours)
+        self._cache_updated()
+
+    def _cache_updated(self) -> None:
+        """Watch the files of the loaded pages and refresh the counters."""
+        self.watcher.watch_files(self.slide_cache.paths())
+        stats = self.slide_cache.stats()
+        self.cache_label.setText(
+            f"Cache: {stats['pages']} pages, {stats['hits']} hits / {stats['misses']} misses"
+        )
 
     def _current_file_path(self) -> str:
-        if 0 <= self.current_index < len(self.html_files):
-            return self.html_files[self.current_index]
+        if 0 <= self.current_index < len(self.files):
+            return self.files.path(self.current_index)
         return ""
 
     def next_slide(self) -> None:
         """Move to the next slide with wrap-around."""
-        if not self.html_files:
+        if not len(self.files):
             return
 
-        next_index = (self.current_index + 1) % len(self.html_files)
-        self.sidebar.setCurrentRow(next_index)
+        self._direction = 1
+        self._select_row((self.current_index + 1) % len(self.files))
 
     def previous_slide(self) -> None:
         """Move to the previous slide with wrap-around."""
-        if not self.html_files:
+        if not len(self.files):
             return
 
-        prev_index = (self.current_index - 1) % len(self.html_files)
-        self.sidebar.setCurrentRow(prev_index)
+        self._direction = -1
+        self._select_row((self.current_index - 1) % len(self.files))
 
     def toggle_fullscreen(self) -> None:
         """Toggle fullscreen state for presentation mode."""
@@ -234,5 +361,6 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event) -> None:  # noqa: N802 (Qt naming)
         """Persist settings before application exit."""
+        self.scanner.cancel()
         self.settings.sync()
         super().closeEvent(event)
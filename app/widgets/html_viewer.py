@@ -2,69 +2,211 @@
 
 from __future__ import annotations
 
-from PyQt6.QtCore import QUrl
+from PyQt6.QtCore import QFile, QIODevice, QObject, Qt, QTimer, QUrl, pyqtSlot
+from PyQt6.QtWebChannel import QWebChannel
+from PyQt6.QtWebEngineCore import QWebEnginePage, QWebEngineScript
 from PyQt6.QtWebEngineWidgets import QWebEngineView
 
+# Resize events (splitter drags, entering fullscreen) are coalesced into one fit.
+FIT_DEBOUNCE_MS = 50
+
+# Content size in CSS pixels, as measured by both the observer and the fallback query.
+MEASURE_JS = """
+    (() => {
+        const doc = document.documentElement;
+        const body = document.body;
+        const width = Math.max(
+            doc ? doc.scrollWidth : 0,
+            body ? body.scrollWidth : 0,
+            doc ? doc.clientWidth : 0
+        );
+        const height = Math.max(
+            doc ? doc.scrollHeight : 0,
+            body ? body.scrollHeight : 0,
+            doc ? doc.clientHeight : 0
+        );
+        return { width: width || 1, height: height || 1 };
+    })
+"""
+
+# Pushes the content size to the viewer whenever the document, the body or one
+# of its children changes size. Runs in the application world, isolated from
+# the slide's own scripts.
+OBSERVER_JS = """
+new QWebChannel(qt.webChannelTransport, (channel) => {
+    const bridge = channel.objects.fitBridge;
+    const measure = %s;
+    let last = null;
+    const report = () => {
+        const size = measure();
+        if (!last || last.width !== size.width || last.height !== size.height) {
+            last = size;
+            bridge.report(size.width, size.height);
+        }
+    };
+    const observer = new ResizeObserver(report);
+    observer.observe(document.documentElement);
+    if (document.body) {
+        observer.observe(document.body);
+        for (const child of document.body.children) observer.observe(child);
+        new MutationObserver((mutations) => {
+            for (const mutation of mutations) {
+                for (const node of mutation.addedNodes) {
+                    if (node.nodeType === Node.ELEMENT_NODE) observer.observe(node);
+                }
+            }
+            report();
+        }).observe(document.body, { childList: true });
+    }
+    report();
+});
+""" % MEASURE_JS
+
+_observer_source = ""
+
+
+def _observer_script() -> QWebEngineScript:
+    global _observer_source
+    if not _observer_source:
+        resource = QFile(":/qtwebchannel/qwebchannel.js")
+        if resource.open(QIODevice.OpenModeFlag.ReadOnly):
+            _observer_source = bytes(resource.readAll()).decode("utf-8") + OBSERVER_JS
+            resource.close()
+
+    script = QWebEngineScript()
+    script.setName("fit-observer")
+    script.setSourceCode(_observer_source)
+    script.setInjectionPoint(QWebEngineScript.InjectionPoint.DocumentReady)
+    script.setWorldId(QWebEngineScript.ScriptWorldId.ApplicationWorld)
+    script.setRunsOnSubFrames(False)
+    return script
+
+
+class _ContentSize(QObject):
+    """Cached content size of one page, updated by the page's ResizeObserver.
+
+    Lives as a child of the page, so the cache is dropped with the page; a new
+    load invalidates it.
+    """
+
+    def __init__(self, page: QWebEnginePage, on_change) -> None:
+        super().__init__(page)
+        self.size: tuple[float, float] | None = None
+        self.measuring = False
+        self._on_change = on_change
+        page.loadStarted.connect(self.invalidate)
+
+    def invalidate(self) -> None:
+        self.size = None
+
+    def store(self, width: float, height: float) -> None:
+        size = (max(float(width), 1.0), max(float(height), 1.0))
+        if size != self.size:
+            self.size = size
+            self._on_change(self.parent())
+
+    @pyqtSlot(float, float)
+    def report(self, width: float, height: float) -> None:
+        self.store(width, height)
+
 
 class HtmlViewer(QWebEngineView):
-    """Extends QWebEngineView with a best-effort responsive zoom strategy."""
+    """Extends QWebEngineView with a best-effort responsive zoom strategy.
+
+    The zoom factor is computed from a cached content size per page, so a
+    resize costs no round trip to the renderer. Pages made by ``create_page``
+    keep their cache current with an injected ResizeObserver reporting over
+    QWebChannel; other pages are measured once per load with runJavaScript.
+    """
 
     def __init__(self, parent=None) -> None:
         super().__init__(parent)
         self._fit_enabled = True
+        # Messages are shown on a page of our own so cached slide pages are never overwritten.
+        self._message_page = QWebEnginePage(self.page().profile(), self)
+        self._fit_timer = QTimer(self)
+        self._fit_timer.setSingleShot(True)
+        self._fit_timer.setInterval(FIT_DEBOUNCE_MS)
+        self._fit_timer.timeout.connect(self._apply_fit)
         self.loadFinished.connect(self._apply_fit)
 
+    def create_page(self, parent: QObject | None = None) -> QWebEnginePage:
+        """Create a page that reports its content size whenever it changes."""
+        page = QWebEnginePage(self.page().profile(), parent)
+        content_size = _ContentSize(page, self._content_size_changed)
+        channel = QWebChannel(page)
+        channel.registerObject("fitBridge", content_size)
+        page.setWebChannel(channel, QWebEngineScript.ScriptWorldId.ApplicationWorld)
+        page.scripts().insert(_observer_script())
+        return page
+
     def load_local_file(self, file_path: str) -> None:
         """Load a local HTML file in the web engine."""
         self.load(QUrl.fromLocalFile(file_path))
 
+    def show_page(self, page: QWebEnginePage) -> None:
+        """Display an already created (and possibly fully loaded) page."""
+        if page is self.page():
+            return
+        self.setPage(page)
+        # A page that finished loading off-screen will not emit loadFinished again.
+        self._apply_fit()
+
+    def show_message(self, html: str) -> None:
+        """Display a static HTML message instead of a slide."""
+        self.show_page(self._message_page)
+        self._message_page.setHtml(html)
+
     def set_fit_enabled(self, enabled: bool) -> None:
         self._fit_enabled = enabled
         self._apply_fit()
 
     def resizeEvent(self, event) -> None:  # noqa: N802 (Qt naming)
         super().resizeEvent(event)
-        # Recalculate zoom when the window size changes.
-        self._apply_fit()
+        # Recalculate zoom once the window size settles.
+        self._fit_timer.start()
+
+    def _content_size(self, page: QWebEnginePage) -> _ContentSize:
+        content_size = page.findChild(_ContentSize, options=Qt.FindChildOption.FindDirectChildrenOnly)
+        if content_size is None:
+            content_size = _ContentSize(page, self._content_size_changed)
+        return content_size
+
+    def _content_size_changed(self, page: QWebEnginePage) -> None:
+        if page is self.page():
+            self._fit_timer.start()
 
     def _apply_fit(self) -> None:
-        """Fit content to viewport by calculating a zoom factor via JS metrics."""
+        """Fit content to viewport from the cached content size of the current page."""
+        self._fit_timer.stop()
         if not self._fit_enabled:
             self.setZoomFactor(1.0)
             return
 
-        js = """
-            (() => {
-                const doc = document.documentElement;
-                const body = document.body;
-                const width = Math.max(
-                    doc ? doc.scrollWidth : 0,
-                    body ? body.scrollWidth : 0,
-                    doc ? doc.clientWidth : 0
-                );
-                const height = Math.max(
-                    doc ? doc.scrollHeight : 0,
-                    body ? body.scrollHeight : 0,
-                    doc ? doc.clientHeight : 0
-                );
-                return { width: width || 1, height: height || 1 };
-            })();
-        """
-
-        def apply_zoom(dimensions: dict) -> None:
-            if not dimensions:
-                self.setZoomFactor(1.0)
-                return
-
-            content_width = max(float(dimensions.get("width", 1.0)), 1.0)
-            content_height = max(float(dimensions.get("height", 1.0)), 1.0)
-            viewport = self.size()
-
-            width_ratio = viewport.width() / content_width
-            height_ratio = viewport.height() / content_height
-            zoom = min(width_ratio, height_ratio)
-            zoom = max(0.25, min(zoom, 2.5))
+        page = self.page()
+        content_size = self._content_size(page)
+        if content_size.size is None:
+            # Not reported yet: measure once; the result fits when it arrives.
+            if not content_size.measuring:
+                content_size.measuring = True
 
-            self.setZoomFactor(zoom)
+                def store(dimensions: dict) -> None:
+                    content_size.measuring = False
+                    if dimensions:
+                        content_size.store(dimensions.get("width", 1.0), dimensions.get("height", 1.0))
+                        if page is self.page():
+                            self._apply_fit()
+
+                page.runJavaScript(f"({MEASURE_JS})()", QWebEngineScript.ScriptWorldId.ApplicationWorld, store)
+            return
 
-        self.page().runJavaScript(js, apply_zoom)
+        content_width, content_height = content_size.size
+        viewport = self.size()
+
+        width_ratio = viewport.width() / content_width
+        height_ratio = viewport.height() / content_height
+        zoom = min(width_ratio, height_ratio)
+        zoom = max(0.25, min(zoom, 2.5))
+
+        if abs(zoom - self.zoomFactor()) > 1e-3:
+            self.setZoomFactor(zoom)
@@ -0,0 +1,156 @@
+"""LRU cache of pre-rendered web pages for instant slide navigation."""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Callable
+from pathlib import Path
+
+from PyQt6.QtCore import QObject, QUrl
+from PyQt6.QtWebEngineCore import QWebEnginePage, QWebEngineProfile
+
+# A page's real footprint lives in the renderer process and cannot be queried,
+# so it is estimated from a fixed per-page overhead plus the document size.
+PAGE_OVERHEAD_BYTES = 32 * 1024 * 1024
+DOCUMENT_COST_FACTOR = 8
+
+
+def estimate_page_cost(file_path: str) -> int:
+    try:
+        size = Path(file_path).stat().st_size
+    except OSError:
+        size = 0
+    return PAGE_OVERHEAD_BYTES + size * DOCUMENT_COST_FACTOR
+
+
+class SlideCache(QObject):
+    """Keeps up to ``max_pages`` loaded pages within ``memory_budget`` bytes.
+
+    Pages are keyed by file path and evicted least recently used first. The
+    page currently shown is never evicted; if its file is invalidated it is
+    marked stale instead and dropped once another page is shown. ``page_factory`` creates the pages,
+    given the cache as parent; by default plain pages of ``profile``.
+    """
+
+    def __init__(
+        self,
+        max_pages: int = 3,
+        memory_budget: int = 512 * 1024 * 1024,
+        profile: QWebEngineProfile | None = None,
+        page_factory: Callable[[QObject], QWebEnginePage] | None = None,
+        parent: QObject | None = None,
+    ) -> None:
+        super().__init__(parent)
+        self.max_pages = max(1, max_pages)
+        self.memory_budget = memory_budget
+        self._profile = profile or QWebEngineProfile.defaultProfile()
+        self._page_factory = page_factory or (lambda parent: QWebEnginePage(self._profile, parent))
+        self._pages: OrderedDict[str, tuple[QWebEnginePage, int]] = OrderedDict()
+        self._pinned = ""
+        self._stale: set[str] = set()
+        self._loaded: set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def page_for(self, file_path: str) -> tuple[QWebEnginePage, bool]:
+        """Return the page for ``file_path`` and whether it was already cached.
+
+        The returned page is pinned until another page is requested.
+        """
+        if self._pinned != file_path and self._pinned in self._stale:
+            self._discard(self._pinned)
+        if file_path in self._stale:
+            self._discard(file_path)
+        entry = self._pages.get(file_path)
+        hit = entry is not None
+        if hit:
+            self._pages.move_to_end(file_path)
+            self.hits += 1
+        else:
+            self.misses += 1
+            entry = self._load(file_path)
+        self._pinned = file_path
+        self._evict()
+        return entry[0], hit
+
+    def preload(self, file_paths: list[str]) -> None:
+        """Start loading ``file_paths`` in the background, most wanted first."""
+        wanted: list[str] = []
+        pinned = self._pages.get(self._pinned)
+        used = pinned[1] if pinned else 0
+        for file_path in file_paths[: self.max_pages - 1]:
+            entry = self._pages.get(file_path)
+            used += entry[1] if entry else estimate_page_cost(file_path)
+            if used > self.memory_budget:
+                break
+            wanted.append(file_path)
+            if entry is None:
+                self._load(file_path)
+        # Rank preloads just below the pinned page, the most wanted last evicted.
+        for file_path in reversed(wanted):
+            self._pages.move_to_end(file_path)
+        if self._pinned in self._pages:
+            self._pages.move_to_end(self._pinned)
+        self._evict()
+
+    def invalidate(self, file_path: str) -> None:
+        """Drop a page whose file changed; the pinned page is kept until unpinned."""
+        if file_path == self._pinned and file_path in self._pages:
+            self._stale.add(file_path)
+        else:
+            self._discard(file_path)
+
+    def clear(self) -> None:
+        """Drop every page except the pinned one."""
+        for file_path in list(self._pages):
+            if file_path != self._pinned:
+                self._discard(file_path)
+
+    def contains(self, file_path: str) -> bool:
+        return file_path in self._pages
+
+    def paths(self) -> list[str]:
+        return list(self._pages)
+
+    def is_loaded(self, file_path: str) -> bool:
+        return file_path in self._loaded
+
+    def estimated_bytes(self) -> int:
+        return sum(cost for _, cost in self._pages.values())
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "pages": len(self._pages),
+            "estimated_bytes": self.estimated_bytes(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _load(self, file_path: str) -> tuple[QWebEnginePage, int]:
+        page = self._page_factory(self)
+        page.loadFinished.connect(lambda _ok, path=file_path: self._loaded.add(path))
+        page.load(QUrl.fromLocalFile(file_path))
+        entry = (page, estimate_page_cost(file_path))
+        self._pages[file_path] = entry
+        return entry
+
+    def _evict(self) -> None:
+        over_budget = self.estimated_bytes() > self.memory_budget
+        while len(self._pages) > self.max_pages or over_budget:
+            victim = next((path for path in self._pages if path != self._pinned), None)
+            if victim is None:
+                return
+            self._discard(victim)
+            self.evictions += 1
+            over_budget = self.estimated_bytes() > self.memory_budget
+
+    def _discard(self, file_path: str) -> None:
+        entry = self._pages.pop(file_path, None)
+        self._loaded.discard(file_path)
+        self._stale.discard(file_path)
+        if entry is not None:
+            entry[0].deleteLater()
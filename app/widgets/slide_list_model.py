@@ -0,0 +1,69 @@
+"""List model exposing a ``FileIndex`` to the sidebar view."""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, QObject, Qt
+
+from app.core.file_index import FileIndex
+
+
+class SlideListModel(QAbstractListModel):
+    """One row per slide file; names are decoded only when a row is painted.
+
+    All changes go through ``reset``, ``merge``, ``add`` and ``remove``.
+    ``add`` and ``remove`` signal each run of rows so attached views and
+    their selection follow them; ``merge`` resets the model instead, for
+    bulk loads that would otherwise be thousands of single-row inserts.
+    """
+
+    def __init__(self, files: FileIndex, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self.files = files
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:  # noqa: N802 (Qt naming)
+        return 0 if parent.isValid() else len(self.files)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.files.name(index.row())
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return self.files.path(index.row())
+        return None
+
+    def reset(self, folder: str) -> None:
+        self.beginResetModel()
+        self.files.reset(folder)
+        self.endResetModel()
+
+    def add(self, file_paths: Iterable[str]) -> int:
+        """Insert new paths at their sorted rows; return how many were added."""
+        added = 0
+        for row, names in self.files.insertion_runs(file_paths):
+            self.beginInsertRows(QModelIndex(), row, row + len(names) - 1)
+            self.files.insert(row, names)
+            self.endInsertRows()
+            added += len(names)
+        return added
+
+    def merge(self, file_paths: Iterable[str]) -> int:
+        """Add a batch of paths in one pass and one model reset; return how many were added."""
+        runs = self.files.insertion_runs(file_paths)
+        if not runs:
+            return 0
+        self.beginResetModel()
+        self.files.insert_runs(runs)
+        self.endResetModel()
+        return sum(len(names) for _, names in runs)
+
+    def remove(self, file_paths: Iterable[str]) -> int:
+        """Remove paths present in the index; return how many were removed."""
+        rows = sorted({row for row in map(self.files.row_of, file_paths) if row >= 0}, reverse=True)
+        for row in rows:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            self.files.remove(row)
+            self.endRemoveRows()
+        return len(rows)
@@ -0,0 +1,248 @@
+"""Rate limiting and admission control for the API.
+
+``AdmissionMiddleware`` decides before a request reaches its handler:
+
+1. Per-client token buckets reject with 429 and ``Retry-After`` once a
+   client exceeds its route's rate. Routes share the ``default`` policy
+   unless configured otherwise.
+2. A global cap on in-flight requests sheds the excess with 503 instead of
+   letting every caller's latency grow.
+3. Routes that write to the database are shed with 503 while the write path
+   is saturated (see ``saturated`` in ``AdmissionController``).
+
+Health, readiness and metrics endpoints and CORS preflights are never limited.
+Policies are keyed ``"<METHOD> <route template>"`` and can be overridden
+with the ``RATE_LIMITS`` environment variable, a JSON object such as
+``{"POST /api/calculate": {"rate": 20, "burst": 40}}``.
+
+A client is identified by its ``X-API-Key`` header only when the key is one
+of ``ADMISSION_API_KEYS`` (comma-separated); any other key is ignored, so
+inventing keys does not earn fresh buckets. Otherwise the client is its IP
+address: the peer address, or behind a reverse proxy listed in
+``TRUSTED_PROXIES`` (comma-separated peer addresses) the right-most
+``X-Forwarded-For`` entry that is not itself a trusted proxy. Without
+``TRUSTED_PROXIES`` the header is ignored, as any client can forge it, and
+every user behind a proxy shares the proxy's buckets.
+"""
+
+import json
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional
+
+from starlette.routing import Match
+
+from metrics import REGISTRY, Counter
+
+EXEMPT_ROUTES = {"GET /api/", "GET /api/ready", "GET /api/admission", "GET /metrics"}
+
+# Routes that persist data and are shed while the write path is saturated.
+WRITE_ROUTES = {
+    "POST /api/status",
+    "POST /api/calculate",
+    "POST /api/calculations/import",
+    "POST /api/calculations/purge",
+    "POST /api/readings/batch",
+    "POST /api/recalculations",
+    "POST /api/rates",
+    "DELETE /api/calculations"
+}
+
+# Built-in per-route limits; wiping the history is allowed once a minute per client.
+DEFAULT_ROUTE_LIMITS = {
+    "DELETE /api/calculations": {"rate": 1 / 60, "burst": 1}
+}
+
+# Upper bound on tracked (policy, client) buckets; the least recently used go first.
+MAX_BUCKETS = 100000
+
+DECISIONS = REGISTRY.register(Counter(
+    "admission_rejections_total", "Requests rejected by admission control", ("route", "reason")
+))
+
+
+def _split(value: str) -> list:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+class RoutePolicy:
+    __slots__ = ("name", "rate", "burst", "write")
+
+    def __init__(self, name: str, rate: float, burst: float, write: bool = False) -> None:
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.write = write
+
+
+class AdmissionController:
+    """Token buckets, the in-flight counter and the rejection counters."""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        max_concurrent: int,
+        route_limits: Optional[Dict[str, dict]] = None,
+        saturated: Optional[Callable[[], bool]] = None,
+        api_keys: Iterable[str] = (),
+        trusted_proxies: Iterable[str] = ()
+    ) -> None:
+        self.default = RoutePolicy("default", rate, burst)
+        self.api_keys = frozenset(api_keys)
+        self.trusted_proxies = frozenset(trusted_proxies)
+        self.max_concurrent = max_concurrent
+        self.saturated = saturated
+        self.policies: Dict[str, RoutePolicy] = {}
+        for route, limits in {**DEFAULT_ROUTE_LIMITS, **(route_limits or {})}.items():
+            self.policies[route] = RoutePolicy(
+                route,
+                float(limits.get("rate", rate)),
+                float(limits.get("burst", burst)),
+                bool(limits.get("write", route in WRITE_ROUTES))
+            )
+        for route in WRITE_ROUTES - self.policies.keys():
+            self.policies[route] = RoutePolicy("default", rate, burst, write=True)
+        # (policy name, client) -> [tokens, last refill time]
+        self._buckets: "OrderedDict[tuple, list]" = OrderedDict()
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = {"rate_limited": 0, "concurrency": 0, "saturated": 0}
+
+    @classmethod
+    def from_env(cls, environ, saturated: Optional[Callable[[], bool]] = None) -> "AdmissionController":
+        return cls(
+            rate=float(environ.get('RATE_LIMIT_PER_SECOND', 50)),
+            burst=float(environ.get('RATE_LIMIT_BURST', 100)),
+            max_concurrent=int(environ.get('MAX_CONCURRENT_REQUESTS', 256)),
+            route_limits=json.loads(environ.get('RATE_LIMITS', '{}')),
+            saturated=saturated,
+            api_keys=_split(environ.get('ADMISSION_API_KEYS', '')),
+            trusted_proxies=_split(environ.get('TRUSTED_PROXIES', ''))
+        )
+
+    def client(self, peer: Optional[str], api_key: Optional[str], forwarded_for: Optional[str]) -> str:
+        """Bucket key of a request: an allow-listed API key, else the client address."""
+        if api_key is not None and api_key in self.api_keys:
+            return "key:" + api_key
+        address = peer or "unknown"
+        if forwarded_for and address in self.trusted_proxies:
+            for hop in reversed(forwarded_for.split(",")):
+                hop = hop.strip()
+                if not hop:
+                    continue
+                address = hop
+                if hop not in self.trusted_proxies:
+                    break
+        return address
+
+    def policy(self, route: str) -> RoutePolicy:
+        return self.policies.get(route, self.default)
+
+    def take(self, policy: RoutePolicy, client: str) -> float:
+        """Spend one token; return 0 if allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        key = (policy.name, client)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [policy.burst, now]
+            if len(self._buckets) > MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(policy.burst, bucket[0] + (now - bucket[1]) * policy.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0
+        return (1 - bucket[0]) / policy.rate if policy.rate > 0 else 60
+
+    def admit(self, route: str, client: str):
+        """Return None to admit, else ``(status, reason, retry_after)``."""
+        policy = self.policy(route)
+        if self.in_flight >= self.max_concurrent:
+            return 503, "concurrency", 1
+        if policy.write and self.saturated is not None and self.saturated():
+            return 503, "saturated", 1
+        wait = self.take(policy, client)
+        if wait:
+            return 429, "rate_limited", max(1, int(wait + 0.999))
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "tracked_buckets": len(self._buckets),
+            "default": {"rate": self.default.rate, "burst": self.default.burst},
+            "routes": {
+                route: {"rate": policy.rate, "burst": policy.burst, "write": policy.write}
+                for route, policy in self.policies.items()
+            }
+        }
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware applying an ``AdmissionController`` per route."""
+
+    def __init__(self, app, controller: AdmissionController, routes_app) -> None:
+        self.app = app
+        self.controller = controller
+        # Routing happens inside the app, so the route template is matched here.
+        self.routes_app = routes_app
+
+    def _route(self, scope) -> str:
+        for route in self.routes_app.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return f"{scope['method']} {route.path}"
+        return f"{scope['method']} unmatched"
+
+    def _client(self, scope) -> str:
+        api_key = forwarded_for = None
+        for name, value in scope["headers"]:
+            if name == b"x-api-key":
+                api_key = value.decode("latin-1")
+            elif name == b"x-forwarded-for":
+                # Repeated headers are one comma-separated list, in order.
+                value = value.decode("latin-1")
+                forwarded_for = f"{forwarded_for},{value}" if forwarded_for else value
+        client = scope.get("client")
+        return self.controller.client(client[0] if client else None, api_key, forwarded_for)
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        route = self._route(scope)
+        if route in EXEMPT_ROUTES:
+            await self.app(scope, receive, send)
+            return
+
+        controller = self.controller
+        rejection = controller.admit(route, self._client(scope))
+        if rejection is not None:
+            status, reason, retry_after = rejection
+            controller.rejected[reason] += 1
+            DECISIONS.inc(route, reason)
+            body = json.dumps({"detail": f"Request rejected: {reason.replace('_', ' ')}"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(retry_after).encode())
+                ]
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        controller.admitted += 1
+        controller.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.in_flight -= 1
@@ -0,0 +1,151 @@
+"""Generate the frontend's tariff module from the backend's rate schedule.
+
+    python build_frontend_tariff.py          # rewrite frontend/src/tariff.generated.js
+    python build_frontend_tariff.py --check  # exit 1 if the file is out of date
+
+The module holds each meter type's compiled table (``CompiledSchedule.table()``
+of ``tariff.DEFAULT_RATES``) and two lookup functions that perform the same
+floating-point operations, in the same order, as ``CompiledSchedule.cost``
+and ``CompiledSchedule.kw_for_amount``. Client-side previews therefore match
+the server without a round trip. Regenerate the file whenever
+``DEFAULT_RATES`` changes; the test suite fails while it is stale.
+
+The tables are those of the seed schedule only. ``TARIFF_VERSION`` records
+its version so the client can compare it with the ``X-Rate-Version`` header
+of ``GET /api/rates`` and price through the API once a schedule added at
+runtime is in force.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict
+
+from rate_schedules import SEED_VERSION
+from tariff import DEFAULT_RATES, TariffEngine
+
+ROOT_DIR = Path(__file__).parent
+OUTPUT = ROOT_DIR.parent / "frontend" / "src" / "tariff.generated.js"
+TABLES_PREFIX = "export const TARIFF_TABLES = "
+VERSION_PREFIX = "export const TARIFF_VERSION = "
+
+TEMPLATE = """\
+// Generated by backend/build_frontend_tariff.py from tariff.DEFAULT_RATES.
+// Do not edit by hand: change the backend schedule and regenerate.
+
+// Rate schedule version of these tables; compare with X-Rate-Version from /api/rates.
+{version_prefix}{version};
+
+{prefix}{tables};
+
+const bound = (value) => (value === null ? Infinity : value);
+
+// Python's bisect_left/bisect_right over a sorted table column.
+const bisect = (values, x, right) => {{
+  let lo = 0;
+  let hi = values.length;
+  while (lo < hi) {{
+    const mid = (lo + hi) >> 1;
+    const v = bound(values[mid]);
+    if (v < x || (right && v === x)) lo = mid + 1;
+    else hi = mid;
+  }}
+  return lo;
+}};
+
+const fullTier = (table, i) => ({{
+  tier: table.labels[i],
+  usage: table.widths[i],
+  rate: table.rates[i],
+  cost: table.widths[i] * table.rates[i]
+}});
+
+// Price ``kw`` with one compiled table; mirrors CompiledSchedule.cost.
+export const priceKw = (table, kw) => {{
+  if (kw <= 0) return {{ totalCost: 0, breakdown: [] }};
+  const index = bisect(table.bounds, kw, false) - 1;
+  const full = Math.min(index, table.rates.length);
+  const breakdown = [];
+  for (let i = 0; i < full; i++) breakdown.push(fullTier(table, i));
+  if (index >= table.rates.length) {{
+    return {{ totalCost: table.costs[table.costs.length - 1], breakdown }};
+  }}
+  const usage = kw - table.bounds[index];
+  const rate = table.rates[index];
+  const tierCost = usage * rate;
+  breakdown.push({{ tier: table.labels[index], usage, rate, cost: tierCost }});
+  return {{ totalCost: table.costs[index] + tierCost, breakdown }};
+}};
+
+// kWh bought by ``amount`` with one compiled table; mirrors CompiledSchedule.kw_for_amount.
+export const kwForAmount = (table, amount) => {{
+  if (amount <= 0) return 0;
+  const index = bisect(table.costs, amount, true) - 1;
+  if (index >= table.rates.length) return bound(table.bounds[table.bounds.length - 1]);
+  return table.bounds[index] + (amount - table.costs[index]) / table.rates[index];
+}};
+
+// Returns null for an unknown meter type, like the API.
+export const kwToMoney = (meterType, kw) =>
+  TARIFF_TABLES[meterType] ? priceKw(TARIFF_TABLES[meterType], kw) : null;
+
+export const moneyToKw = (meterType, amount) =>
+  TARIFF_TABLES[meterType] ? kwForAmount(TARIFF_TABLES[meterType], amount) : null;
+"""
+
+
+def client_tables(rates: Dict[str, object]) -> Dict[str, dict]:
+    engine = TariffEngine(rates)
+    return {meter_type: schedule.table() for meter_type, schedule in engine.schedules.items()}
+
+
+def render(rates: Dict[str, object] = DEFAULT_RATES, version: int = SEED_VERSION) -> str:
+    def dumps(value) -> str:
+        return json.dumps(value, ensure_ascii=False, allow_nan=False)
+
+    tables = "{\n" + ",\n".join(
+        f"  {dumps(meter_type)}: {{\n" + ",\n".join(
+            f"    {dumps(key)}: {dumps(column)}" for key, column in table.items()
+        ) + "\n  }"
+        for meter_type, table in client_tables(rates).items()
+    ) + "\n}"
+    return TEMPLATE.format(version_prefix=VERSION_PREFIX, version=version, prefix=TABLES_PREFIX, tables=tables)
+
+
+def _read_value(prefix: str, path: Path):
+    text = path.read_text(encoding="utf-8")
+    start = text.index(prefix) + len(prefix)
+    return json.JSONDecoder().raw_decode(text, start)[0]
+
+
+def read_tables(path: Path = OUTPUT) -> Dict[str, dict]:
+    """Parse the tables back out of a generated module."""
+    return _read_value(TABLES_PREFIX, path)
+
+
+def read_version(path: Path = OUTPUT) -> int:
+    """Parse the schedule version back out of a generated module."""
+    return _read_value(VERSION_PREFIX, path)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--check", action="store_true", help="fail if the generated file is out of date")
+    parser.add_argument("--output", type=Path, default=OUTPUT)
+    args = parser.parse_args()
+
+    content = render()
+    if args.check:
+        current = args.output.read_text(encoding="utf-8") if args.output.exists() else None
+        if current != content:
+            print(f"{args.output} is out of date; run build_frontend_tariff.py", file=sys.stderr)
+            return 1
+        return 0
+    args.output.write_text(content, encoding="utf-8")
+    print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
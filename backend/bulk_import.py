@@ -0,0 +1,193 @@
+"""Streaming bulk import of electricity calculations.
+
+Request bodies are consumed chunk by chunk, split into lines, validated and
+priced row by row, and written with chunked unordered ``insert_many`` calls,
+so memory use is bounded by the write chunk size rather than the upload size.
+"""
+
+import csv
+import json
+import time
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+# Cap on per-line rejection details kept in the summary; the count is exact.
+MAX_REPORTED_ERRORS = 1000
+
+# Longest accepted line; longer ones are rejected without being buffered.
+MAX_LINE_BYTES = 1 << 20
+
+# CSV cells that map onto optional model fields; empty cells become None.
+OPTIONAL_FIELDS = {"previous_reading", "current_reading", "consumption", "amount", "total_cost", "timestamp"}
+
+
+async def iter_lines(
+    chunks: AsyncIterator[bytes], max_line_bytes: int = MAX_LINE_BYTES
+) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """Yield ``(line_number, raw_line)`` for each non-blank line of a byte stream.
+
+    Lines longer than ``max_line_bytes`` are yielded as ``None`` and never
+    buffered whole, so one runaway line cannot exhaust memory.
+    """
+    buffer = bytearray()
+    line_number = 0
+    scanned = 0
+    too_long = False
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", max(start, scanned))
+            if end < 0:
+                break
+            line_number += 1
+            if too_long or end - start > max_line_bytes:
+                too_long = False
+                yield line_number, None
+            else:
+                raw = bytes(buffer[start:end])
+                if raw.strip():
+                    yield line_number, raw
+            start = end + 1
+        del buffer[:start]
+        if len(buffer) > max_line_bytes:
+            # The rest of this line is dropped as it arrives.
+            too_long = True
+            buffer.clear()
+        scanned = len(buffer)
+    if too_long:
+        yield line_number + 1, None
+    elif buffer.strip():
+        yield line_number + 1, bytes(buffer)
+
+
+def parse_ndjson_line(text: str) -> dict:
+    row = json.loads(text)
+    if not isinstance(row, dict):
+        raise ValueError("Expected a JSON object")
+    return row
+
+
+class CsvRowParser:
+    """Parses CSV lines against the header row seen first.
+
+    Quoted fields spanning several lines are not supported.
+    """
+
+    def __init__(self) -> None:
+        self.header: Optional[List[str]] = None
+
+    def __call__(self, text: str) -> Optional[dict]:
+        if self.header is None:
+            # Spreadsheet exports often start with a UTF-8 byte order mark.
+            text = text.lstrip("\ufeff")
+        values = next(csv.reader([text]))
+        if self.header is None:
+            self.header = [name.strip() for name in values]
+            return None
+        if len(values) != len(self.header):
+            raise ValueError(f"Expected {len(self.header)} columns, got {len(values)}")
+
+        row = {}
+        for name, value in zip(self.header, values):
+            value = value.strip()
+            if name == "breakdown":
+                row[name] = json.loads(value) if value else None
+            elif name in OPTIONAL_FIELDS:
+                row[name] = value or None
+            else:
+                row[name] = value
+        return row
+
+
+class ImportSummary:
+    """Running totals reported back to the caller."""
+
+    def __init__(self, dry_run: bool) -> None:
+        self.dry_run = dry_run
+        self.accepted = 0
+        self.rejected_count = 0
+        self.rejected: List[dict] = []
+        self._started = time.perf_counter()
+
+    def reject(self, line: int, error: str) -> None:
+        self.rejected_count += 1
+        if len(self.rejected) < MAX_REPORTED_ERRORS:
+            self.rejected.append({"line": line, "error": error})
+
+    def as_dict(self) -> dict:
+        return {
+            "accepted": self.accepted,
+            "rejected_count": self.rejected_count,
+            "rejected": self.rejected,
+            "dry_run": self.dry_run,
+            "elapsed_seconds": round(time.perf_counter() - self._started, 3)
+        }
+
+
+async def _flush(
+    collection,
+    batch: List[Tuple[int, dict]],
+    summary: ImportSummary,
+    on_written: Optional[Callable[[List[dict]], None]]
+) -> None:
+    if summary.dry_run:
+        summary.accepted += len(batch)
+        return
+    if on_written is not None:
+        on_written([doc for _, doc in batch])
+
+    try:
+        result = await collection.insert_many([doc for _, doc in batch], ordered=False)
+        summary.accepted += len(result.inserted_ids)
+    except BulkWriteError as exc:
+        summary.accepted += exc.details.get("nInserted", 0)
+        for error in exc.details.get("writeErrors", []):
+            summary.reject(batch[error["index"]][0], error.get("errmsg", "Write error"))
+
+
+async def import_calculations(
+    chunks: AsyncIterator[bytes],
+    fmt: str,
+    collection,
+    build_document: Callable[[dict], dict],
+    chunk_size: int = 1000,
+    dry_run: bool = False,
+    on_written: Optional[Callable[[List[dict]], None]] = None,
+    max_line_bytes: int = MAX_LINE_BYTES
+) -> dict:
+    """Stream rows from ``chunks`` into ``collection``.
+
+    ``build_document`` validates and prices one parsed row, raising
+    ``ValueError`` (or a pydantic ``ValidationError``) to reject it.
+    ``on_written`` is given each chunk of documents before it is inserted.
+    """
+    parse = CsvRowParser() if fmt == "csv" else parse_ndjson_line
+    summary = ImportSummary(dry_run)
+    batch: List[Tuple[int, dict]] = []
+
+    async for line_number, raw in iter_lines(chunks, max_line_bytes):
+        if raw is None:
+            summary.reject(line_number, f"Line longer than {max_line_bytes} bytes")
+            continue
+        try:
+            row = parse(raw.decode("utf-8").strip())
+            if row is None:
+                continue
+            batch.append((line_number, build_document(row)))
+        except ValidationError as exc:
+            summary.reject(line_number, "; ".join(
+                f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in exc.errors()
+            ))
+        except (ValueError, UnicodeDecodeError) as exc:
+            summary.reject(line_number, str(exc))
+
+        if len(batch) >= chunk_size:
+            await _flush(collection, batch, summary, on_written)
+            batch = []
+
+    if batch:
+        await _flush(collection, batch, summary, on_written)
+    return summary.as_dict()
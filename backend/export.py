@@ -0,0 +1,144 @@
+"""Streaming export of stored calculations as CSV, NDJSON or Parquet.
+
+Rows are pulled from a database cursor in bounded batches and each batch is
+encoded and yielded immediately, so memory use does not grow with the size
+of the collection. Parquet output needs pyarrow and writes one row group
+per batch.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, List
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pq = None
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet"
+}
+
+# Parquet column types; every other exported column is a float.
+# Nested and timestamp values are written as strings so each batch has the same schema.
+PARQUET_STRING_COLUMNS = {"id", "calculation_type", "meter_type", "breakdown", "timestamp"}
+
+
+def parquet_available() -> bool:
+    return pa is not None
+
+
+def _cell(value):
+    """Flatten a document value into a scalar suitable for CSV/Parquet."""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def _batches(cursor, batch_size: int) -> AsyncIterator[List[dict]]:
+    batch: List[dict] = []
+    async for doc in cursor:
+        doc.pop("_id", None)
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def stream_csv(cursor, columns: List[str], batch_size: int) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode()
+
+    async for batch in _batches(cursor, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_cell(doc.get(column)) for column in columns] for doc in batch)
+        yield buffer.getvalue().encode()
+
+
+async def stream_ndjson(cursor, columns: List[str], batch_size: int) -> AsyncIterator[bytes]:
+    async for batch in _batches(cursor, batch_size):
+        yield "".join(
+            json.dumps({column: doc.get(column) for column in columns}, default=_json_default) + "\n"
+            for doc in batch
+        ).encode()
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the generator.
+
+    ``tell`` keeps counting across drains so the Parquet footer offsets stay
+    correct.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+async def stream_parquet(cursor, columns: List[str], batch_size: int) -> AsyncIterator[bytes]:
+    sink = _ChunkSink()
+    schema = pa.schema([
+        (column, pa.string() if column in PARQUET_STRING_COLUMNS else pa.float64())
+        for column in columns
+    ])
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    try:
+        async for batch in _batches(cursor, batch_size):
+            table = pa.Table.from_pydict(
+                {column: [_cell(doc.get(column)) for doc in batch] for column in columns},
+                schema=schema
+            )
+            writer.write_table(table)
+            yield sink.drain()
+    except BaseException:
+        writer.close()
+        raise
+    writer.close()
+    yield sink.drain()
+
+
+STREAMERS = {
+    "csv": stream_csv,
+    "ndjson": stream_ndjson,
+    "parquet": stream_parquet
+}
@@ -0,0 +1,54 @@
+"""``Idempotency-Key`` support for create endpoints.
+
+The key and a hash of the request body are stored with the created document
+under a unique sparse index on ``idempotency.key``, which is what guarantees
+a single insert per key, across workers and restarts. A short-lived
+in-memory cache answers retries without a database round trip. Reusing a
+key with a different request body is rejected with 422.
+"""
+
+import hashlib
+from typing import Tuple
+
+import orjson
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+from result_cache import MISSING, ResultCache
+
+KEY_FIELD = "idempotency.key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def request_hash(payload: dict) -> str:
+    return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+class IdempotentWriter:
+    """Inserts into ``collection`` at most once per idempotency key."""
+
+    def __init__(self, collection, cache: ResultCache) -> None:
+        self.collection = collection
+        self.cache = cache
+
+    async def insert(self, key: str, payload_hash: str, doc: dict) -> Tuple[dict, bool]:
+        """Store ``doc`` under ``key``; return the stored document and whether it was a replay."""
+        stored = self.cache.get(key)
+        if stored is MISSING:
+            stored = await self.collection.find_one({KEY_FIELD: key}, {"_id": 0})
+            if stored is None:
+                stored = dict(doc, idempotency={"key": key, "request_hash": payload_hash})
+                try:
+                    await self.collection.insert_one(stored)
+                except DuplicateKeyError:
+                    # A concurrent request with the same key won the insert.
+                    stored = await self.collection.find_one({KEY_FIELD: key}, {"_id": 0})
+                else:
+                    stored.pop("_id", None)
+                    self.cache.put(key, stored)
+                    return stored, False
+            self.cache.put(key, stored)
+
+        if stored["idempotency"]["request_hash"] != payload_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        return stored, True
@@ -0,0 +1,309 @@
+"""Minimal Prometheus-style metrics for the API.
+
+A small in-process registry of counters, gauges and histograms rendered in
+the Prometheus text exposition format. Recording a sample is a dict lookup
+plus a bisect, so it is cheap enough for the hot path. The module provides:
+
+* ``MetricsMiddleware``, a pure ASGI middleware recording per-route request
+  counts, latency, in-flight requests and errors
+* ``InstrumentedDatabase``, a database proxy timing every collection operation
+* ``CALCULATION_SECONDS`` for timing the pure calculation functions
+"""
+
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.01)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in self.values.items()
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, *labels: str, value: float) -> None:
+        self.values[labels] = value
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_labels", "_started")
+
+    def __init__(self, histogram: "Histogram", labels: Tuple[str, ...]) -> None:
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self) -> None:
+        self._started = time.perf_counter()
+
+    def __exit__(self, *_exc) -> None:
+        self._histogram.observe(time.perf_counter() - self._started, *self._labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # Per label set: [count per bucket (non-cumulative, +Inf last), sum].
+        self.values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, seconds: float, *labels: str) -> None:
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, seconds)] += 1
+        entry[1] += seconds
+
+    def time(self, *labels: str) -> _Timer:
+        """Context manager observing the duration of its block."""
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: List[_Metric] = []
+        self.collectors: List[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]) -> None:
+        """Add a callback producing extra exposition lines at scrape time."""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS_TOTAL = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+))
+REQUEST_ERRORS = REGISTRY.register(Counter(
+    "http_request_errors_total", "HTTP requests that raised or returned 5xx", ("method", "route")
+))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served"
+))
+DB_SECONDS = REGISTRY.register(Histogram(
+    "db_operation_duration_seconds", "Database operation latency", ("collection", "operation")
+))
+DB_ERRORS = REGISTRY.register(Counter(
+    "db_operation_errors_total", "Database operations that raised", ("collection", "operation")
+))
+CALCULATION_SECONDS = REGISTRY.register(Histogram(
+    "calculation_duration_seconds", "Time spent in tariff calculations", ("function",), FAST_BUCKETS
+))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request metrics per route template.
+
+    Requests that match no route are grouped under ``route="unmatched"`` to
+    keep label cardinality bounded.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            status = 500
+            raise
+        finally:
+            IN_FLIGHT.dec()
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            REQUEST_SECONDS.observe(time.perf_counter() - started, method, route_path)
+            REQUESTS_TOTAL.inc(method, route_path, str(status))
+            if status >= 500:
+                REQUEST_ERRORS.inc(method, route_path)
+
+
+# --- database instrumentation ----------------------------------------------
+
+_TIMED_METHODS = {
+    "insert_one", "insert_many", "find_one", "count_documents", "replace_one", "update_one",
+    "update_many", "delete_one", "delete_many", "bulk_write", "create_index"
+}
+
+
+class _InstrumentedCursor:
+    """Wraps a find/aggregate cursor, timing ``to_list`` and full iteration.
+
+    Iteration is recorded as ``<operation>_iter`` since it includes the time
+    the consumer (e.g. a streaming response) spends between documents.
+    """
+
+    def __init__(self, cursor, collection: str, operation: str) -> None:
+        self._cursor = cursor
+        self._collection = collection
+        self._operation = operation
+
+    def __getattr__(self, name):
+        attribute = getattr(self._cursor, name)
+        if name in ("sort", "skip", "limit", "batch_size"):
+            def chain(*args, **kwargs):
+                attribute(*args, **kwargs)
+                return self
+            return chain
+        return attribute
+
+    async def to_list(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await self._cursor.to_list(*args, **kwargs)
+        except Exception:
+            DB_ERRORS.inc(self._collection, self._operation)
+            raise
+        finally:
+            DB_SECONDS.observe(time.perf_counter() - started, self._collection, self._operation)
+
+    async def _iterate(self):
+        started = time.perf_counter()
+        try:
+            async for doc in self._cursor:
+                yield doc
+        finally:
+            DB_SECONDS.observe(time.perf_counter() - started, self._collection, f"{self._operation}_iter")
+
+    def __aiter__(self):
+        return self._iterate()
+
+
+class InstrumentedCollection:
+    """Collection proxy timing each awaited operation by collection and name."""
+
+    def __init__(self, collection) -> None:
+        self._collection = collection
+        self._name = collection.name
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if name not in _TIMED_METHODS:
+            return attribute
+
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await attribute(*args, **kwargs)
+            except Exception:
+                DB_ERRORS.inc(self._name, name)
+                raise
+            finally:
+                DB_SECONDS.observe(time.perf_counter() - started, self._name, name)
+        return timed
+
+    def find(self, *args, **kwargs) -> _InstrumentedCursor:
+        return _InstrumentedCursor(self._collection.find(*args, **kwargs), self._name, "find")
+
+    def aggregate(self, *args, **kwargs) -> _InstrumentedCursor:
+        return _InstrumentedCursor(self._collection.aggregate(*args, **kwargs), self._name, "aggregate")
+
+
+class InstrumentedDatabase:
+    """Database proxy handing out instrumented collections."""
+
+    def __init__(self, database) -> None:
+        self._database = database
+        self._collections: Dict[str, InstrumentedCollection] = {}
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name: str) -> InstrumentedCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = InstrumentedCollection(self._database[name])
+        return collection
+
+    async def command(self, *args, **kwargs):
+        return await self._database.command(*args, **kwargs)
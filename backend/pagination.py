@@ -0,0 +1,80 @@
+"""Keyset pagination, filtering and projection helpers for history queries.
+
+Pages are ordered newest first on ``(timestamp, id)``. The cursor handed to
+clients is an opaque url-safe base64 encoding of the last row's sort key.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from fastapi import HTTPException
+
+# Sort order shared by the list endpoints and their supporting indexes.
+SORT_ORDER = [("timestamp", -1), ("id", -1)]
+
+# Header carrying the cursor of the next page when one may exist.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(doc: dict) -> str:
+    key = {"t": doc["timestamp"].isoformat(), "id": doc["id"]}
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Turn a cursor back into a filter matching rows after it."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        timestamp = datetime.fromisoformat(key["t"])
+        last_id = str(key["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return {"$or": [
+        {"timestamp": {"$lt": timestamp}},
+        {"timestamp": timestamp, "id": {"$lt": last_id}}
+    ]}
+
+
+def build_filter(
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    **equals: Optional[str]
+) -> dict:
+    """Combine equality filters, a ``[start, end)`` time range and a cursor."""
+    query: dict = {field: value for field, value in equals.items() if value is not None}
+
+    time_range = {}
+    if start is not None:
+        time_range["$gte"] = start
+    if end is not None:
+        time_range["$lt"] = end
+    if time_range:
+        query["timestamp"] = time_range
+
+    if cursor:
+        query = {"$and": [query, decode_cursor(cursor)]} if query else decode_cursor(cursor)
+    return query
+
+
+def build_projection(fields: Optional[str], allowed: Iterable[str]) -> Optional[dict]:
+    """Parse a comma-separated ``fields`` parameter into a Mongo projection.
+
+    The sort key fields are always included so a cursor can be built from
+    the last row. Returns None when no projection was requested.
+    """
+    if not fields:
+        return None
+
+    allowed = set(allowed)
+    requested: List[str] = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    projection = {name: 1 for name in requested}
+    projection.update({"_id": 0, "id": 1, "timestamp": 1})
+    return projection
@@ -0,0 +1,168 @@
+"""Versioned rate schedules with effective dates.
+
+Schedules are stored as documents ``{version, effective_from, rates}`` and
+cached in memory, sorted by effective date, each with its compiled
+``TariffEngine``. Looking up the schedule in force at a given moment is a
+bisect over the cached dates. A background task polls the collection for a
+newer version and reloads the cache without a restart.
+
+In stored and public form an open-ended tier has ``"max": None``; it is only
+turned into ``float('inf')`` when compiled.
+"""
+
+import asyncio
+import logging
+from bisect import bisect_right
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import orjson
+from pymongo.errors import DuplicateKeyError
+
+from tariff import INFINITY, TariffEngine
+
+logger = logging.getLogger(__name__)
+
+# Version and effective date given to the built-in schedule when the
+# collection is seeded.
+SEED_VERSION = 1
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_public_rates(rates: Dict[str, object]) -> Dict[str, object]:
+    """Replace infinite tier bounds with None so the rates are valid JSON/BSON."""
+    public = {}
+    for meter_type, spec in rates.items():
+        if isinstance(spec, dict):
+            public[meter_type] = dict(spec)
+        else:
+            public[meter_type] = [
+                dict(tier, max=None if tier["max"] in (None, INFINITY) else tier["max"])
+                for tier in spec
+            ]
+    return public
+
+
+def to_engine_rates(rates: Dict[str, object]) -> Dict[str, object]:
+    """Inverse of ``to_public_rates``."""
+    compiled = {}
+    for meter_type, spec in rates.items():
+        if isinstance(spec, dict):
+            compiled[meter_type] = dict(spec)
+        else:
+            compiled[meter_type] = [
+                dict(tier, max=INFINITY if tier["max"] is None else tier["max"])
+                for tier in spec
+            ]
+    return compiled
+
+
+class RateSchedule:
+    """One immutable schedule version, its compiled engine and its JSON body."""
+
+    __slots__ = ("version", "effective_from", "rates", "engine", "etag", "body")
+
+    def __init__(self, version: int, effective_from: datetime, rates: Dict[str, object]):
+        self.version = version
+        self.effective_from = effective_from
+        self.rates = to_public_rates(rates)
+        self.engine = TariffEngine(to_engine_rates(self.rates))
+        self.etag = f'"rates-v{version}"'
+        self.body = orjson.dumps(self.rates)
+
+    def as_dict(self) -> dict:
+        return {"version": self.version, "effective_from": self.effective_from, "rates": self.rates}
+
+
+class RateScheduleCache:
+    """In-memory view of the ``rate_schedules`` collection."""
+
+    def __init__(self, collection, default_rates: Dict[str, object]) -> None:
+        self.collection = collection
+        self.default_rates = default_rates
+        self._listeners: List[Callable[[], None]] = []
+        self.version = None
+        self._set([RateSchedule(SEED_VERSION, EPOCH, default_rates)])
+        self._task: Optional[asyncio.Task] = None
+
+    def _set(self, schedules: List[RateSchedule]) -> None:
+        schedules.sort(key=lambda schedule: (schedule.effective_from, schedule.version))
+        self.schedules = schedules
+        self._dates = [schedule.effective_from for schedule in schedules]
+        version = max(schedule.version for schedule in schedules)
+        changed = version != self.version
+        self.version = version
+        if changed:
+            for listener in self._listeners:
+                listener()
+
+    def on_change(self, listener: Callable[[], None]) -> None:
+        """Call ``listener`` whenever a different set of schedules is loaded."""
+        self._listeners.append(listener)
+
+    def at(self, when: Optional[datetime] = None) -> RateSchedule:
+        """Schedule in force at ``when`` (default: now).
+
+        Dates before the first schedule fall back to the earliest one.
+        """
+        if when is None:
+            when = datetime.utcnow()
+        elif when.tzinfo is not None:
+            when = when.astimezone(timezone.utc).replace(tzinfo=None)
+        index = bisect_right(self._dates, when) - 1
+        return self.schedules[max(index, 0)]
+
+    async def load(self) -> None:
+        """Read every version from the database, seeding it with the defaults if empty."""
+        docs = await self.collection.find({}, {"_id": 0}).to_list(None)
+        if not docs:
+            # Every worker starting on an empty database gets here; the upsert
+            # lets exactly one of them create the seed, and two upserts racing
+            # on the unique index surface as a duplicate key error.
+            seed = RateSchedule(SEED_VERSION, EPOCH, self.default_rates)
+            fields = {key: value for key, value in seed.as_dict().items() if key != "version"}
+            try:
+                await self.collection.update_one({"version": SEED_VERSION}, {"$setOnInsert": fields}, upsert=True)
+            except DuplicateKeyError:
+                pass
+            docs = await self.collection.find({}, {"_id": 0}).to_list(None)
+        self._set([RateSchedule(doc["version"], doc["effective_from"], doc["rates"]) for doc in docs])
+
+    async def refresh(self) -> bool:
+        """Reload if a newer version was stored elsewhere; return whether it did."""
+        latest = await self.collection.find_one({}, {"_id": 0, "version": 1}, sort=[("version", -1)])
+        if latest is None or latest["version"] == self.version:
+            return False
+        await self.load()
+        logger.info("Loaded rate schedule version %s", self.version)
+        return True
+
+    async def add(self, effective_from: datetime, rates: Dict[str, object]) -> RateSchedule:
+        """Store a new version and make it visible immediately in this process."""
+        await self.refresh()
+        if effective_from.tzinfo is not None:
+            effective_from = effective_from.astimezone(timezone.utc).replace(tzinfo=None)
+        schedule = RateSchedule(self.version + 1, effective_from, rates)
+        await self.collection.insert_one(schedule.as_dict())
+        self._set(self.schedules + [schedule])
+        return schedule
+
+    def start(self, interval: float) -> None:
+        self._task = asyncio.create_task(self._poll(interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _poll(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Rate schedule refresh failed")
@@ -0,0 +1,200 @@
+"""Per-meter reading history with incremental consumption and billing.
+
+Readings are stored one document per ``(meter_id, timestamp)`` under a
+unique compound index, which also serves the "latest reading of each meter"
+lookup. Ingesting a batch fetches the last billed reading of every meter in
+the batch, then walks each meter's new readings in time order. Consumption is the difference from the previous
+reading, and positive consumption is priced in one vectorized call per
+rate schedule.
+
+A meter's first reading only establishes the baseline, so it has no
+consumption or cost. Readings at or before the meter's latest stored
+reading are rejected rather than spliced into history. The last billed
+reading of each meter is also kept in a state collection, which serializes
+concurrent batches for the same meter (see ``ingest_readings``).
+"""
+
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from tariff import ERROR_INVALID_METER_TYPE
+
+ERROR_OUT_OF_ORDER = "out_of_order"
+ERROR_READING_DECREASED = "reading_decreased"
+ERROR_DUPLICATE = "duplicate"
+ERROR_CONFLICT = "conflict"
+
+# Tries per meter when concurrent batches keep moving its last reading.
+MAX_CLAIM_ATTEMPTS = 5
+
+READINGS_INDEX = [("meter_id", 1), ("timestamp", -1)]
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+async def latest_readings(collection, meter_ids: Sequence[str]) -> Dict[str, dict]:
+    """Latest stored ``{timestamp, reading}`` per meter, via the compound index."""
+    rows = await collection.aggregate([
+        {"$match": {"meter_id": {"$in": list(meter_ids)}}},
+        {"$sort": {"meter_id": 1, "timestamp": -1}},
+        {"$group": {
+            "_id": "$meter_id",
+            "timestamp": {"$first": "$timestamp"},
+            "reading": {"$first": "$reading"}
+        }}
+    ]).to_list(None)
+    return {row["_id"]: row for row in rows}
+
+
+async def last_readings(state, collection, meter_ids: Sequence[str]) -> Dict[str, dict]:
+    """Last billed ``{timestamp, reading}`` per meter.
+
+    Meters without a state document yet (readings stored before it was kept)
+    fall back to their latest stored reading, returned without an ``_id``.
+    """
+    last = {doc["_id"]: doc for doc in await state.find({"_id": {"$in": list(meter_ids)}}).to_list(None)}
+    missing = [meter_id for meter_id in meter_ids if meter_id not in last]
+    if missing:
+        for meter_id, row in (await latest_readings(collection, missing)).items():
+            last[meter_id] = {"timestamp": row["timestamp"], "reading": row["reading"]}
+    return last
+
+
+async def _claim(state, meter_id: str, last: Optional[dict], new_last: dict) -> bool:
+    """Move the meter's state from ``last`` to ``new_last``; False if another batch moved it first."""
+    fields = {"timestamp": new_last["timestamp"], "reading": new_last["reading"]}
+    if last is None or "_id" not in last:
+        # No state document yet: creating it is the claim.
+        try:
+            await state.insert_one(dict(fields, _id=meter_id))
+        except DuplicateKeyError:
+            return False
+        return True
+    result = await state.update_one({"_id": meter_id, "timestamp": last["timestamp"]}, {"$set": fields})
+    return result.matched_count == 1
+
+
+async def ingest_readings(
+    collection,
+    state,
+    meter_ids: Sequence[str],
+    meter_types: Sequence[str],
+    timestamps: Sequence[datetime],
+    readings: Sequence[float],
+    schedule_at: Callable[[Optional[datetime]], object]
+) -> dict:
+    """Store a batch of readings and bill the consumption since each meter's previous one.
+
+    ``state`` holds one ``{_id: meter_id, timestamp, reading}`` document per
+    meter, the last reading billed. A batch moves it forward with a
+    conditional update on the timestamp it billed from, so concurrent
+    batches for one meter (in any worker) cannot both bill from the same
+    previous reading: the loser re-reads the state and walks its rows again,
+    up to ``MAX_CLAIM_ATTEMPTS`` times, then rejects them as ``conflict``.
+
+    Returns column lists ``consumption``, ``total_cost`` and ``error`` in
+    input order, plus the number of ``accepted`` readings.
+    """
+    count = len(meter_ids)
+    timestamps = [_naive_utc(timestamp) for timestamp in timestamps]
+    consumption: List[Optional[float]] = [None] * count
+    total_cost: List[Optional[float]] = [None] * count
+    errors: List[Optional[str]] = [None] * count
+
+    rows_by_meter: Dict[str, List[int]] = defaultdict(list)
+    for row, meter_id in enumerate(meter_ids):
+        rows_by_meter[meter_id].append(row)
+    for rows in rows_by_meter.values():
+        rows.sort(key=lambda row: timestamps[row])
+
+    def walk(rows: List[int], last: Optional[dict]) -> Optional[dict]:
+        """Check ``rows`` against ``last``; return the new last reading, or ``last`` if none was accepted."""
+        for row in rows:
+            errors[row] = consumption[row] = total_cost[row] = None
+            if schedule_at(timestamps[row]).engine.schedule(meter_types[row]) is None:
+                errors[row] = ERROR_INVALID_METER_TYPE
+                continue
+            if last is not None:
+                if timestamps[row] == last["timestamp"]:
+                    errors[row] = ERROR_DUPLICATE
+                    continue
+                if timestamps[row] < last["timestamp"]:
+                    errors[row] = ERROR_OUT_OF_ORDER
+                    continue
+                used = readings[row] - last["reading"]
+                if used < 0:
+                    errors[row] = ERROR_READING_DECREASED
+                    continue
+                consumption[row] = used
+            last = {"timestamp": timestamps[row], "reading": readings[row]}
+        return last
+
+    pending = dict(rows_by_meter)
+    for _attempt in range(MAX_CLAIM_ATTEMPTS):
+        previous = await last_readings(state, collection, list(pending))
+        conflicts = {}
+        for meter_id, rows in pending.items():
+            last = previous.get(meter_id)
+            new_last = walk(rows, last)
+            if new_last is not last and not await _claim(state, meter_id, last, new_last):
+                conflicts[meter_id] = rows
+        pending = conflicts
+        if not pending:
+            break
+    for rows in pending.values():
+        for row in rows:
+            consumption[row] = total_cost[row] = None
+            errors[row] = ERROR_CONFLICT
+
+    # Rows with positive consumption, grouped by the schedule that prices them.
+    to_price: Dict[int, tuple] = {}
+    for row in range(count):
+        if errors[row] is not None or consumption[row] is None:
+            continue
+        if consumption[row] > 0:
+            schedule = schedule_at(timestamps[row])
+            to_price.setdefault(id(schedule), (schedule, []))[1].append(row)
+        else:
+            total_cost[row] = 0
+
+    for schedule, rows in to_price.values():
+        priced = schedule.engine.kw_to_money_batch(
+            [meter_types[row] for row in rows], [0.0] * len(rows), [consumption[row] for row in rows]
+        )
+        for row, cost in zip(rows, priced["total_cost"]):
+            total_cost[row] = cost
+
+    ingested_at = datetime.utcnow()
+    accepted_rows = [row for row in range(count) if errors[row] is None]
+    docs = [
+        {
+            "meter_id": meter_ids[row],
+            "meter_type": meter_types[row],
+            "timestamp": timestamps[row],
+            "reading": readings[row],
+            "consumption": consumption[row],
+            "total_cost": total_cost[row],
+            "ingested_at": ingested_at
+        }
+        for row in accepted_rows
+    ]
+    accepted = len(docs)
+    if docs:
+        try:
+            await collection.insert_many(docs, ordered=False)
+        except BulkWriteError as exc:
+            # Usually a concurrent batch that stored the same (meter_id, timestamp) first.
+            for error in exc.details.get("writeErrors", []):
+                row = accepted_rows[error["index"]]
+                errors[row] = ERROR_DUPLICATE if error.get("code") == 11000 else error.get("errmsg", "write_error")
+                consumption[row] = total_cost[row] = None
+                accepted -= 1
+
+    return {"accepted": accepted, "consumption": consumption, "total_cost": total_cost, "error": errors}
@@ -0,0 +1,272 @@
+"""Background re-pricing of stored calculations after a tariff change.
+
+A job walks ``electricity_calculations`` in ``_id`` order, one batch at a
+time. Each batch is priced with the compiled tariff arrays, grouped by
+schedule and meter type, and written back with a single unordered
+``bulk_write`` of ``UpdateOne`` operations. After every batch the last
+``_id`` is stored on the job document as its checkpoint.
+
+Jobs are owned through a lease on the job document. A job whose owner died
+(process restart, crash) keeps its checkpoint and is picked up again by
+whichever process next polls after the lease has expired. Re-pricing a
+document twice gives the same result, so resuming from a checkpoint written
+after the batch it covers is safe.
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+
+from pagination import build_filter
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+FAILED = "failed"
+ACTIVE_STATES = [PENDING, RUNNING]
+
+# How long a job stays owned by its runner without a checkpoint being written.
+LEASE = timedelta(seconds=60)
+EXPIRED = datetime(1970, 1, 1)
+
+# Fields read from each calculation to re-price it.
+SOURCE_PROJECTION = {
+    "_id": 1, "calculation_type": 1, "meter_type": 1, "consumption": 1,
+    "previous_reading": 1, "current_reading": 1, "amount": 1, "timestamp": 1
+}
+# Internal job fields that are not returned by the API.
+PUBLIC_PROJECTION = {"_id": 0, "checkpoint": 0, "owner": 0, "lease_until": 0}
+
+
+def reprice(docs: List[dict], schedule_at: Callable[[Optional[datetime]], object]) -> Tuple[List[UpdateOne], int]:
+    """Build the updates re-pricing ``docs``; return them with the skipped count.
+
+    ``schedule_at`` maps a document timestamp to the ``RateSchedule`` to price
+    it with. Documents with an unknown meter or calculation type, or without
+    a positive consumption or amount, are skipped.
+    """
+    groups: Dict[Tuple[int, str], tuple] = {}
+    skipped = 0
+    for doc in docs:
+        schedule = schedule_at(doc.get("timestamp")).engine.schedule(doc.get("meter_type"))
+        calculation_type = doc.get("calculation_type")
+        if calculation_type == "kw_to_money":
+            value = doc.get("consumption")
+            if value is None and doc.get("previous_reading") is not None and doc.get("current_reading") is not None:
+                value = doc["current_reading"] - doc["previous_reading"]
+        elif calculation_type == "money_to_kw":
+            value = doc.get("amount")
+        else:
+            value = None
+        if schedule is None or value is None or value <= 0:
+            skipped += 1
+            continue
+        key = (id(schedule), calculation_type)
+        if key not in groups:
+            groups[key] = (schedule, calculation_type, [], [])
+        groups[key][2].append(doc["_id"])
+        groups[key][3].append(value)
+
+    updates = []
+    for schedule, calculation_type, ids, values in groups.values():
+        array = np.asarray(values, dtype=np.float64)
+        if calculation_type == "kw_to_money":
+            totals = schedule.cost_array(array).tolist()
+            breakdowns = schedule.breakdown_array(array)
+            updates.extend(
+                UpdateOne({"_id": _id}, {"$set": {"consumption": value, "total_cost": total, "breakdown": breakdown}})
+                for _id, value, total, breakdown in zip(ids, values, totals, breakdowns)
+            )
+        else:
+            kws = schedule.kw_for_amount_array(array).tolist()
+            updates.extend(
+                UpdateOne({"_id": _id}, {"$set": {"consumption": round(kw, 2), "total_cost": value}})
+                for _id, value, kw in zip(ids, values, kws)
+            )
+    return updates, skipped
+
+
+class RecalculationManager:
+    """Starts, tracks and resumes recalculation jobs stored in ``jobs``."""
+
+    def __init__(
+        self,
+        source,
+        jobs,
+        rate_schedules,
+        on_finish: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> None:
+        self.source = source
+        self.jobs = jobs
+        self.rate_schedules = rate_schedules
+        self.on_finish = on_finish
+        self.owner = str(uuid.uuid4())
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._poll_task: Optional[asyncio.Task] = None
+
+    async def create(self, params: dict) -> dict:
+        """Store a new job for ``params`` and start running it in this process."""
+        now = datetime.utcnow()
+        job_id = str(uuid.uuid4())
+        total = await self.source.count_documents(self._source_filter(params))
+        await self.jobs.insert_one({
+            "_id": job_id,
+            "id": job_id,
+            "status": PENDING,
+            "params": params,
+            "total": total,
+            "processed": 0,
+            "modified": 0,
+            "skipped": 0,
+            "checkpoint": None,
+            "cancel_requested": False,
+            "owner": None,
+            "lease_until": EXPIRED,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "finished_at": None
+        })
+        await self._claim_and_run(job_id)
+        return await self.get(job_id)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.jobs.find_one({"_id": job_id}, PUBLIC_PROJECTION)
+
+    async def cancel(self, job_id: str) -> bool:
+        """Ask an active job to stop after its current batch; return whether it was active."""
+        result = await self.jobs.update_one(
+            {"_id": job_id, "status": {"$in": ACTIVE_STATES}},
+            {"$set": {"cancel_requested": True, "updated_at": datetime.utcnow()}}
+        )
+        return result.matched_count == 1
+
+    def start(self, interval: float) -> None:
+        """Poll for jobs whose owner has gone away and resume them."""
+        self._poll_task = asyncio.create_task(self._poll(interval))
+
+    async def stop(self) -> None:
+        """Stop polling and running; interrupted jobs resume from their checkpoint later."""
+        tasks = list(self._tasks.values())
+        if self._poll_task is not None:
+            tasks.append(self._poll_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._poll_task = None
+
+    async def _poll(self, interval: float) -> None:
+        while True:
+            try:
+                orphans = await self.jobs.find(
+                    {"status": {"$in": ACTIVE_STATES}, "lease_until": {"$lt": datetime.utcnow()}}, {"_id": 1}
+                ).to_list(None)
+                for job in orphans:
+                    await self._claim_and_run(job["_id"])
+            except Exception:
+                logger.exception("Recalculation job poll failed")
+            await asyncio.sleep(interval)
+
+    async def _claim_and_run(self, job_id: str) -> None:
+        now = datetime.utcnow()
+        result = await self.jobs.update_one(
+            {"_id": job_id, "status": {"$in": ACTIVE_STATES}, "lease_until": {"$lt": now}},
+            {"$set": {"status": RUNNING, "owner": self.owner, "lease_until": now + LEASE, "updated_at": now}}
+        )
+        if result.modified_count == 1:
+            self._tasks[job_id] = asyncio.create_task(self._run(job_id))
+
+    @staticmethod
+    def _source_filter(params: dict) -> dict:
+        return build_filter(
+            None,
+            params.get("start"),
+            params.get("end"),
+            meter_type=params.get("meter_type"),
+            calculation_type=params.get("calculation_type")
+        )
+
+    async def _run(self, job_id: str) -> None:
+        try:
+            job = await self.jobs.find_one({"_id": job_id})
+            status = await self._process(job)
+        except asyncio.CancelledError:
+            # Shutdown: leave the job running so it resumes from its checkpoint.
+            raise
+        except Exception as exc:
+            logger.exception("Recalculation job %s failed", job_id)
+            await self._finish(job_id, FAILED, error=str(exc))
+        else:
+            if status is not None:
+                await self._finish(job_id, status)
+        finally:
+            self._tasks.pop(job_id, None)
+
+    async def _process(self, job: dict) -> Optional[str]:
+        """Re-price batches until done; return the final status, or None if the lease was lost."""
+        params = job["params"]
+        batch_size = params.get("batch_size", 1000)
+        base_filter = self._source_filter(params)
+        checkpoint = job.get("checkpoint")
+
+        # Pick up schedules stored by other processes before pricing.
+        await self.rate_schedules.refresh()
+        as_of = params.get("as_of")
+        if as_of is not None:
+            fixed = self.rate_schedules.at(as_of)
+            schedule_at = lambda _timestamp: fixed  # noqa: E731
+        else:
+            schedule_at = self.rate_schedules.at
+
+        while True:
+            if job.get("cancel_requested"):
+                return CANCELLED
+            query = dict(base_filter)
+            if checkpoint is not None:
+                query["_id"] = {"$gt": checkpoint}
+            docs = await self.source.find(query, SOURCE_PROJECTION).sort([("_id", 1)]).limit(batch_size).to_list(batch_size)
+            if not docs:
+                return COMPLETED
+
+            updates, skipped = reprice(docs, schedule_at)
+            modified = 0
+            if updates:
+                result = await self.source.bulk_write(updates, ordered=False)
+                modified = result.modified_count
+            checkpoint = docs[-1]["_id"]
+
+            now = datetime.utcnow()
+            renewed = await self.jobs.update_one(
+                {"_id": job["_id"], "owner": self.owner},
+                {
+                    "$set": {"checkpoint": checkpoint, "lease_until": now + LEASE, "updated_at": now},
+                    "$inc": {"processed": len(docs), "modified": modified, "skipped": skipped}
+                }
+            )
+            if renewed.matched_count == 0:
+                logger.warning("Lost the lease on recalculation job %s", job["_id"])
+                return None
+            job = await self.jobs.find_one({"_id": job["_id"]}, {"cancel_requested": 1})
+            # Yield between batches even when the store answers without blocking.
+            await asyncio.sleep(0)
+
+    async def _finish(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        now = datetime.utcnow()
+        await self.jobs.update_one(
+            {"_id": job_id, "owner": self.owner},
+            {"$set": {
+                "status": status, "error": error, "lease_until": EXPIRED, "updated_at": now, "finished_at": now
+            }}
+        )
+        # Stored totals changed, so cached rollups are stale even for a partial run.
+        if self.on_finish is not None:
+            await self.on_finish()
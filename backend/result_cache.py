@@ -0,0 +1,73 @@
+"""Bounded LRU/TTL cache for conversion results.
+
+Keys include the rate schedule version the result was priced with, so a new
+rate table can never be served stale results; the owner also clears the
+cache when the schedules change so old entries don't hold memory.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+MISSING = object()
+
+
+class ResultCache:
+    """Least-recently-used cache whose entries also expire after ``ttl`` seconds.
+
+    A ``max_size`` of 0 disables caching (every lookup is a miss).
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: Optional[float] = 300) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable):
+        """Cached value for ``key``, or ``MISSING``."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        value, expires = entry
+        if expires is not None and expires <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value) -> None:
+        if self.max_size <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
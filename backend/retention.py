@@ -0,0 +1,298 @@
+"""Retention, archival and throttled purging for time-stamped collections.
+
+Each collection with a retention period gets a TTL index on ``timestamp``.
+Without archival the TTL index alone removes aged documents (Mongo's TTL
+monitor, or the memory store before each read). With archival
+the TTL index is set ``grace`` days later, as a backstop, and a periodic job
+moves aged documents out first: every batch is written to the archive (an
+``<name>_archive`` collection, or gzipped NDJSON files per calendar month)
+and only then deleted. One process at a time runs the job, guarded by a
+lease document.
+
+All bulk deletes go through ``purge_batches``: bounded ``delete_many`` calls
+on explicit ``_id`` lists with a pause between them, so a large cleanup
+never turns into one long-running delete on the primary.
+
+Rollups of days that have already been materialized are kept when the raw
+documents age out.
+"""
+
+import asyncio
+import gzip
+import logging
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import orjson
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_NONE = "none"
+ARCHIVE_COLLECTION = "collection"
+ARCHIVE_FILES = "files"
+ARCHIVE_MODES = (ARCHIVE_NONE, ARCHIVE_COLLECTION, ARCHIVE_FILES)
+
+TTL_INDEX_NAME = "timestamp_ttl"
+LOCK_ID = "retention"
+LEASE = timedelta(minutes=5)
+EXPIRED = datetime(1970, 1, 1)
+
+
+async def ensure_ttl_index(database, collection, seconds: Optional[int]) -> None:
+    """Create, retune or drop the TTL index on ``timestamp`` to match ``seconds``."""
+    existing = (await collection.index_information()).get(TTL_INDEX_NAME)
+    if seconds is None:
+        if existing is not None:
+            await collection.drop_index(TTL_INDEX_NAME)
+    elif existing is None:
+        await collection.create_index("timestamp", name=TTL_INDEX_NAME, expireAfterSeconds=seconds)
+    elif existing.get("expireAfterSeconds") != seconds:
+        await database.command(
+            "collMod", collection.name, index={"name": TTL_INDEX_NAME, "expireAfterSeconds": seconds}
+        )
+
+
+def _json_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError
+
+
+class Archiver:
+    """Copies documents to the configured archive before they are deleted."""
+
+    def __init__(self, mode: str, database=None, directory: Optional[Path] = None) -> None:
+        if mode not in ARCHIVE_MODES:
+            raise ValueError(f"Unknown ARCHIVE_MODE {mode!r}")
+        self.mode = mode
+        self.database = database
+        self.directory = directory
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != ARCHIVE_NONE
+
+    async def archive(self, collection_name: str, docs: List[dict]) -> None:
+        if self.mode == ARCHIVE_COLLECTION:
+            try:
+                await self.database[f"{collection_name}_archive"].insert_many(docs, ordered=False)
+            except BulkWriteError as exc:
+                # Documents archived by an interrupted earlier run keep their _id.
+                if any(error.get("code") != 11000 for error in exc.details.get("writeErrors", [])):
+                    raise
+        elif self.mode == ARCHIVE_FILES:
+            await asyncio.to_thread(self._write_files, collection_name, docs)
+
+    def _write_files(self, collection_name: str, docs: List[dict]) -> None:
+        by_month: Dict[str, List[bytes]] = defaultdict(list)
+        for doc in docs:
+            timestamp = doc.get("timestamp")
+            month = timestamp.strftime("%Y-%m") if isinstance(timestamp, datetime) else "undated"
+            by_month[month].append(orjson.dumps(doc, default=_json_default) + b"\n")
+        folder = self.directory / collection_name
+        folder.mkdir(parents=True, exist_ok=True)
+        for month, lines in by_month.items():
+            # Each append is a complete gzip member; readers see one stream.
+            with open(folder / f"{month}.ndjson.gz", "ab") as handle:
+                handle.write(gzip.compress(b"".join(lines)))
+                handle.flush()
+                os.fsync(handle.fileno())
+
+
+async def purge_batches(
+    collection,
+    query: dict,
+    batch_size: int,
+    pause: float,
+    archiver: Optional[Archiver] = None,
+    on_batch: Optional[Callable[[int], Awaitable[None]]] = None
+) -> int:
+    """Delete documents matching ``query`` oldest first, one batch at a time.
+
+    Each batch is archived first when ``archiver`` is enabled. ``on_batch``
+    receives the running total after every batch. Returns the number deleted.
+    """
+    archiving = archiver is not None and archiver.enabled
+    projection = None if archiving else {"_id": 1}
+    deleted = 0
+    while True:
+        docs = await collection.find(query, projection).sort([("timestamp", 1)]).limit(batch_size).to_list(batch_size)
+        if not docs:
+            return deleted
+        if archiving:
+            await archiver.archive(collection.name, docs)
+        result = await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+        deleted += result.deleted_count
+        if on_batch is not None:
+            await on_batch(deleted)
+        await asyncio.sleep(pause)
+
+
+class RetentionManager:
+    """Applies retention periods, runs the archival job and tracks purge jobs."""
+
+    def __init__(
+        self,
+        database,
+        retention_days: Dict[str, Optional[float]],
+        archiver: Archiver,
+        grace_days: float = 7,
+        batch_size: int = 1000,
+        pause: float = 0.1
+    ) -> None:
+        self.database = database
+        self.retention_days = retention_days
+        self.archiver = archiver
+        self.grace_days = grace_days
+        self.batch_size = batch_size
+        self.pause = pause
+        self.locks = database.maintenance_locks
+        self.jobs = database.purge_jobs
+        self.owner = str(uuid.uuid4())
+        self._task: Optional[asyncio.Task] = None
+        self._purges: Dict[str, asyncio.Task] = {}
+
+    def ttl_seconds(self, collection_name: str) -> Optional[int]:
+        days = self.retention_days.get(collection_name)
+        if days is None:
+            return None
+        if self.archiver.enabled:
+            days += self.grace_days
+        return int(days * 86400)
+
+    async def ensure_indexes(self) -> None:
+        for name in self.retention_days:
+            await ensure_ttl_index(self.database, self.database[name], self.ttl_seconds(name))
+
+    def start(self, interval: float) -> None:
+        if self.archiver.enabled and any(days is not None for days in self.retention_days.values()):
+            self._task = asyncio.create_task(self._loop(interval))
+
+    async def stop(self) -> None:
+        tasks = list(self._purges.values())
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._purges.clear()
+        self._task = None
+
+    async def _loop(self, interval: float) -> None:
+        while True:
+            try:
+                await self.archive_expired()
+            except Exception:
+                logger.exception("Retention archival failed")
+            await asyncio.sleep(interval)
+
+    async def _acquire(self) -> bool:
+        now = datetime.utcnow()
+        try:
+            await self.locks.update_one(
+                {"_id": LOCK_ID, "lease_until": {"$lt": now}},
+                {"$set": {"owner": self.owner, "lease_until": now + LEASE}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The lock document exists and its lease is still held elsewhere.
+            return False
+        return True
+
+    async def _renew(self, _deleted: int) -> None:
+        await self.locks.update_one(
+            {"_id": LOCK_ID, "owner": self.owner}, {"$set": {"lease_until": datetime.utcnow() + LEASE}}
+        )
+
+    async def archive_expired(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Archive and delete every document past its retention; return counts per collection."""
+        if not await self._acquire():
+            return {}
+        now = now or datetime.utcnow()
+        moved = {}
+        try:
+            for name, days in self.retention_days.items():
+                if days is None:
+                    continue
+                cutoff = now - timedelta(days=days)
+                moved[name] = await purge_batches(
+                    self.database[name], {"timestamp": {"$lt": cutoff}},
+                    self.batch_size, self.pause, self.archiver, on_batch=self._renew
+                )
+                if moved[name]:
+                    logger.info("Archived %s documents from %s older than %s", moved[name], name, cutoff)
+        finally:
+            await self.locks.update_one({"_id": LOCK_ID, "owner": self.owner}, {"$set": {"lease_until": EXPIRED}})
+        return moved
+
+    async def start_purge(
+        self,
+        collection_name: str,
+        before: Optional[datetime],
+        archive: bool,
+        batch_size: int,
+        pause: float,
+        on_finish: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> dict:
+        """Start a background purge of ``collection_name`` and return its job document."""
+        job_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        job = {
+            "_id": job_id,
+            "id": job_id,
+            "collection": collection_name,
+            "before": before,
+            "archive": archive and self.archiver.enabled,
+            "status": "running",
+            "deleted": 0,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "finished_at": None
+        }
+        await self.jobs.insert_one(job)
+        self._purges[job_id] = asyncio.create_task(
+            self._purge(job_id, collection_name, before, job["archive"], batch_size, pause, on_finish)
+        )
+        return await self.get_purge(job_id)
+
+    async def get_purge(self, job_id: str) -> Optional[dict]:
+        return await self.jobs.find_one({"_id": job_id}, {"_id": 0})
+
+    async def _purge(self, job_id, collection_name, before, archive, batch_size, pause, on_finish) -> None:
+        async def progress(deleted: int) -> None:
+            await self.jobs.update_one(
+                {"_id": job_id}, {"$set": {"deleted": deleted, "updated_at": datetime.utcnow()}}
+            )
+
+        status, error = "completed", None
+        try:
+            await purge_batches(
+                self.database[collection_name],
+                {"timestamp": {"$lt": before}} if before is not None else {},
+                batch_size,
+                pause,
+                self.archiver if archive else None,
+                on_batch=progress
+            )
+        except asyncio.CancelledError:
+            status = "interrupted"
+            raise
+        except Exception as exc:
+            logger.exception("Purge job %s failed", job_id)
+            status, error = "failed", str(exc)
+        finally:
+            self._purges.pop(job_id, None)
+            now = datetime.utcnow()
+            await asyncio.shield(self.jobs.update_one(
+                {"_id": job_id},
+                {"$set": {"status": status, "error": error, "updated_at": now, "finished_at": now}}
+            ))
+            if on_finish is not None and status != "interrupted":
+                await on_finish()
@@ -0,0 +1,227 @@
+"""Consumption and revenue rollups for the calculations summary endpoint.
+
+Aggregation runs in Mongo at a fixed daily grain per ``(day, meter_type,
+calculation_type)``, with per-tier sums taken from ``breakdown``. Days that
+have fully elapsed are materialized into a rollup collection, along with a
+watermark recording how far materialization has got. A summary request reads
+closed days from the rollups, aggregates only the open day and any partial
+days at the edges of the requested range live, and folds the daily rows into
+the requested grouping.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ReplaceOne
+
+GROUPINGS = ("meter_type", "calculation_type", "tier", "day", "week", "month")
+
+WATERMARK_ID = "watermark"
+
+# A day is only materialized once this long has passed since it ended, so
+# late writes (e.g. from the write-behind buffer) still land in live results.
+SETTLE_DELAY = timedelta(minutes=5)
+
+_DAY_EXPR = {"$dateFromParts": {
+    "year": {"$year": "$timestamp"},
+    "month": {"$month": "$timestamp"},
+    "day": {"$dayOfMonth": "$timestamp"}
+}}
+_ROW_KEY = {"day": _DAY_EXPR, "meter_type": "$meter_type", "calculation_type": "$calculation_type"}
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def floor_day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def ceil_day(value: datetime) -> datetime:
+    day = floor_day(value)
+    return day if day == value else day + timedelta(days=1)
+
+
+def bucket_key(day: datetime, grouping: str) -> str:
+    if grouping == "week":
+        return (day - timedelta(days=day.weekday())).date().isoformat()
+    if grouping == "month":
+        return day.strftime("%Y-%m")
+    return day.date().isoformat()
+
+
+async def aggregate_daily(collection, match: dict) -> List[dict]:
+    """Aggregate matching calculations into daily rows with per-tier sums."""
+    totals = await collection.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": _ROW_KEY,
+            "count": {"$sum": 1},
+            "consumption": {"$sum": {"$ifNull": ["$consumption", 0]}},
+            "total_cost": {"$sum": {"$ifNull": ["$total_cost", 0]}}
+        }}
+    ]).to_list(None)
+    tiers = await collection.aggregate([
+        {"$match": match},
+        {"$unwind": "$breakdown"},
+        {"$group": {
+            "_id": dict(_ROW_KEY, tier="$breakdown.tier"),
+            "count": {"$sum": 1},
+            "consumption": {"$sum": "$breakdown.usage"},
+            "total_cost": {"$sum": "$breakdown.cost"}
+        }}
+    ]).to_list(None)
+
+    rows: Dict[tuple, dict] = {}
+    for total in totals:
+        key = total["_id"]
+        rows[(key["day"], key["meter_type"], key["calculation_type"])] = {
+            "day": key["day"],
+            "meter_type": key["meter_type"],
+            "calculation_type": key["calculation_type"],
+            "count": total["count"],
+            "consumption": total["consumption"],
+            "total_cost": total["total_cost"],
+            "tiers": {}
+        }
+    for tier in tiers:
+        key = tier["_id"]
+        row = rows.get((key["day"], key["meter_type"], key["calculation_type"]))
+        if row is not None:
+            row["tiers"][key["tier"]] = {
+                "count": tier["count"],
+                "consumption": tier["consumption"],
+                "total_cost": tier["total_cost"]
+            }
+    # Tier labels are stored as values rather than keys so any label is a valid document.
+    for row in rows.values():
+        row["tiers"] = [dict(tier=label, **values) for label, values in row["tiers"].items()]
+    return list(rows.values())
+
+
+class RollupStore:
+    """Materializes closed days of ``source`` into ``rollups``."""
+
+    def __init__(self, source, rollups) -> None:
+        self.source = source
+        self.rollups = rollups
+
+    async def invalidate(self) -> None:
+        """Drop every materialized day, e.g. after history was deleted or repriced."""
+        await self.rollups.delete_many({})
+
+    async def refresh_days(self, days: Iterable[datetime]) -> None:
+        """Rematerialize already materialized ``days``, e.g. after a backdated import.
+
+        Days at or past the watermark are left alone; the next summary
+        request materializes them anyway.
+        """
+        watermark = await self.rollups.find_one({"_id": WATERMARK_ID})
+        if watermark is None:
+            return
+        days = sorted({floor_day(_naive_utc(day)) for day in days})
+        days = [day for day in days if day < watermark["until"]]
+        if not days:
+            return
+        await self.rollups.delete_many({"day": {"$in": days}})
+        await self._store(await aggregate_daily(self.source, {"$or": [
+            {"timestamp": {"$gte": day, "$lt": day + timedelta(days=1)}} for day in days
+        ]}))
+
+    async def _store(self, rows: List[dict]) -> None:
+        if rows:
+            await self.rollups.bulk_write([
+                ReplaceOne(
+                    {"_id": f"{row['day'].isoformat()}|{row['meter_type']}|{row['calculation_type']}"},
+                    row,
+                    upsert=True
+                )
+                for row in rows
+            ], ordered=False)
+
+    async def _materialize(self, today: datetime) -> None:
+        """Bring the rollups up to (but not including) ``today``."""
+        watermark = await self.rollups.find_one({"_id": WATERMARK_ID})
+        since = watermark["until"] if watermark else None
+        if since is not None and since >= today:
+            return
+
+        match = {"timestamp": {"$lt": today}}
+        if since is not None:
+            match["timestamp"]["$gte"] = since
+        await self._store(await aggregate_daily(self.source, match))
+        await self.rollups.replace_one(
+            {"_id": WATERMARK_ID}, {"_id": WATERMARK_ID, "until": today}, upsert=True
+        )
+
+    async def daily_rows(
+        self,
+        filters: dict,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        now: Optional[datetime] = None
+    ) -> List[dict]:
+        """Daily rows for ``[start, end)``: cached for closed days, live otherwise."""
+        start, end = _naive_utc(start), _naive_utc(end)
+        today = floor_day((now or datetime.utcnow()) - SETTLE_DELAY)
+        cache_lo = ceil_day(start) if start is not None else None
+        cache_hi = min(floor_day(end), today) if end is not None else today
+
+        if cache_lo is not None and cache_lo >= cache_hi:
+            live_ranges = [(start, end)]
+            rows: List[dict] = []
+        else:
+            await self._materialize(today)
+            day_range = {"$lt": cache_hi}
+            if cache_lo is not None:
+                day_range["$gte"] = cache_lo
+            rows = await self.rollups.find(
+                dict(filters, day=day_range), {"_id": 0}
+            ).to_list(None)
+            live_ranges = [(cache_hi, end)]
+            if cache_lo is not None and start < cache_lo:
+                live_ranges.append((start, cache_lo))
+
+        ranges = []
+        for lo, hi in live_ranges:
+            time_range = {}
+            if lo is not None:
+                time_range["$gte"] = lo
+            if hi is not None:
+                time_range["$lt"] = hi
+            ranges.append({"timestamp": time_range} if time_range else {})
+        match = dict(filters, **{"$or": ranges}) if len(ranges) > 1 else dict(filters, **ranges[0])
+        return rows + await aggregate_daily(self.source, match)
+
+
+def summarize(rows: List[dict], grouping: str) -> dict:
+    """Fold daily rows into totals per ``grouping`` value."""
+    groups: Dict[str, dict] = defaultdict(lambda: {"count": 0, "consumption": 0, "total_cost": 0})
+
+    def add(key, values) -> None:
+        group = groups[key]
+        group["count"] += values["count"]
+        group["consumption"] += values["consumption"]
+        group["total_cost"] += values["total_cost"]
+
+    totals = {"count": 0, "consumption": 0, "total_cost": 0}
+    for row in rows:
+        for field in totals:
+            totals[field] += row[field]
+        if grouping == "tier":
+            for values in row["tiers"]:
+                add(values["tier"], values)
+        elif grouping in ("meter_type", "calculation_type"):
+            add(row[grouping], row)
+        else:
+            add(bucket_key(row["day"], grouping), row)
+
+    return {
+        "group_by": grouping,
+        "groups": [dict(key=key, **values) for key, values in sorted(groups.items(), key=lambda item: str(item[0]))],
+        "totals": totals
+    }
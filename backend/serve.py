@@ -0,0 +1,43 @@
+"""Deployment entry point: run the API under uvicorn with settings from the environment.
+
+    python serve.py
+
+``WEB_CONCURRENCY`` sets the number of worker processes. Each worker opens
+its own database client in the app's lifespan handler, sized by the
+``MONGO_*`` pool variables (see ``storage.POOL_OPTIONS``); the total number
+of connections is at most workers x ``MONGO_MAX_POOL_SIZE``.
+"""
+
+import logging
+import os
+from pathlib import Path
+
+import uvicorn
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+    if workers > 1 and os.environ.get('STORAGE_BACKEND') == 'memory':
+        logger.warning("STORAGE_BACKEND=memory keeps a separate store in each of the %s workers", workers)
+
+    uvicorn.run(
+        "server:app",
+        app_dir=str(ROOT_DIR),
+        host=os.environ.get('HOST', '0.0.0.0'),
+        port=int(os.environ.get('PORT', 8001)),
+        workers=workers,
+        backlog=int(os.environ.get('BACKLOG', 2048)),
+        timeout_keep_alive=int(os.environ.get('KEEP_ALIVE_SECONDS', 5)),
+        limit_concurrency=int(os.environ['LIMIT_CONCURRENCY']) if 'LIMIT_CONCURRENCY' in os.environ else None,
+        log_level=os.environ.get('LOG_LEVEL', 'info').lower()
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,104 @@
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 import os
+import asyncio
 import logging
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import Dict, List, Optional, Union
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
+
+from admission import AdmissionController, AdmissionMiddleware
+from bulk_import import import_calculations
+from export import MEDIA_TYPES, STREAMERS, parquet_available
+from idempotency import KEY_FIELD, REPLAYED_HEADER, IdempotentWriter, request_hash
+from metrics import CALCULATION_SECONDS, CONTENT_TYPE, REGISTRY, InstrumentedDatabase, MetricsMiddleware
+from pagination import NEXT_CURSOR_HEADER, SORT_ORDER, build_filter, build_projection, encode_cursor
+from rate_schedules import RateScheduleCache
+from readings import READINGS_INDEX, ingest_readings
+from recalculation import RecalculationManager
+from result_cache import MISSING, ResultCache
+from retention import Archiver, RetentionManager
+from rollups import GROUPINGS, RollupStore, floor_day, summarize
+from storage import LazyDatabase, pool_options
+from tariff import DEFAULT_RATES
+from write_behind import WriteBehindBuffer
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Database connection: MongoDB by default, or the in-process store with
+# STORAGE_BACKEND=memory (no MONGO_URL needed). The client is only created
+# when the lifespan handler starts, i.e. inside each worker process.
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo')
+database = LazyDatabase(STORAGE_BACKEND)
+# Every collection operation is timed for /metrics
+db = InstrumentedDatabase(database)
+READINESS_TIMEOUT_SECONDS = float(os.environ.get('READINESS_TIMEOUT_SECONDS', 2))
+POOL_OPTIONS = pool_options()
+
+# Closed days of history are materialized here for the summary endpoint.
+rollup_store = RollupStore(db.electricity_calculations, db.calculation_rollups)
+
+# Write-behind persistence is opt-in; by default every write is awaited.
+WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+write_buffer = WriteBehindBuffer(
+    max_queue=int(os.environ.get('WRITE_BEHIND_MAX_QUEUE', 10000)),
+    batch_size=int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 500)),
+    flush_interval=float(os.environ.get('WRITE_BEHIND_FLUSH_MS', 50)) / 1000
+) if WRITE_BEHIND_ENABLED else None
+
+# Writes are shed once the write-behind queue, or else the Mongo connection
+# pool, is this full.
+WRITE_SATURATION_RATIO = float(os.environ.get('WRITE_SATURATION_RATIO', 0.9))
+
+def write_path_saturated() -> bool:
+    if write_buffer is not None:
+        return write_buffer.stats()["pending"] >= WRITE_SATURATION_RATIO * write_buffer.max_queue
+    if STORAGE_BACKEND == "mongo":
+        in_use = database.pool_monitor.stats()["in_use"]
+        return in_use >= WRITE_SATURATION_RATIO * POOL_OPTIONS.get("maxPoolSize", 100)
+    return False
+
+# Per-client token buckets and a global in-flight cap, configured from env.
+# Opt-in: behind a reverse proxy set TRUSTED_PROXIES as well, or every user
+# shares the proxy's buckets; API keys count as clients only if listed in
+# ADMISSION_API_KEYS.
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+admission = AdmissionController.from_env(os.environ, saturated=write_path_saturated)
 
-# Create the main app without a prefix
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect to the database and start background tasks; undo both on shutdown"""
+    database.connect()
+    await create_indexes()
+    await load_rate_schedules()
+    recalculations.start(RECALCULATION_POLL_SECONDS)
+    retention.start(RETENTION_INTERVAL_SECONDS)
+    if write_buffer is not None:
+        write_buffer.start()
+    yield
+    await shutdown_db_client()
+
+# Retried POST /calculate requests carrying an Idempotency-Key are answered
+# from this cache, falling back to the unique index on the stored key.
+idempotent_calculations = IdempotentWriter(
+    db.electricity_calculations,
+    ResultCache(
+        max_size=int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', 10000)),
+        ttl=float(os.environ.get('IDEMPOTENCY_CACHE_TTL_SECONDS', 600))
+    )
+)
+
+# Create the main app without a prefix; responses are encoded with orjson
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -57,44 +135,150 @@ class ElectricityCalculationCreate(BaseModel):
     total_cost: Optional[float] = None
     breakdown: Optional[List[dict]] = None
 
-# Electricity rate configurations
-RATES = {
-    "residential": [
-        {"min": 1, "max": 200, "rate": 2.19},
-        {"min": 201, "max": 400, "rate": 5.63},
-        {"min": 401, "max": 700, "rate": 8.13},
-        {"min": 701, "max": 2000, "rate": 11.25},
-        {"min": 2001, "max": float('inf'), "rate": 12.5}
-    ],
-    "commercial": {"rate": 16.25},
-    "factory": {"rate": 6.75}
-}
+class CalculationImportRow(ElectricityCalculationCreate):
+    timestamp: Optional[datetime] = None  # None stamps the row with the import time
+
+class KwToMoneyBatch(BaseModel):
+    meter_type: List[str]
+    previous_reading: List[float]
+    current_reading: List[float]
+
+    @model_validator(mode="after")
+    def check_lengths(self):
+        if not len(self.meter_type) == len(self.previous_reading) == len(self.current_reading):
+            raise ValueError("meter_type, previous_reading and current_reading must have the same length")
+        return self
+
+class MoneyToKwBatch(BaseModel):
+    meter_type: List[str]
+    amount: List[float]
+
+    @model_validator(mode="after")
+    def check_lengths(self):
+        if len(self.meter_type) != len(self.amount):
+            raise ValueError("meter_type and amount must have the same length")
+        return self
+
+class ReadingBatch(BaseModel):
+    meter_id: List[str]
+    meter_type: List[str]
+    timestamp: List[datetime]
+    reading: List[float]
+
+    @model_validator(mode="after")
+    def check_lengths(self):
+        if not len(self.meter_id) == len(self.meter_type) == len(self.timestamp) == len(self.reading):
+            raise ValueError("meter_id, meter_type, timestamp and reading must have the same length")
+        return self
+
+class RecalculationCreate(BaseModel):
+    as_of: Optional[datetime] = None  # None prices each record at its own timestamp
+    meter_type: Optional[str] = None
+    calculation_type: Optional[str] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    batch_size: int = Field(1000, ge=1, le=10000)
+
+class PurgeCreate(BaseModel):
+    before: Optional[datetime] = None
+    all: bool = False  # purge every calculation; must be explicit
+    archive: bool = False
+    batch_size: int = Field(1000, ge=1, le=10000)
+    pause_ms: float = Field(100, ge=0, le=10000)
+
+    @model_validator(mode="after")
+    def check_scope(self):
+        if (self.before is None) == (not self.all):
+            raise ValueError("Give exactly one of before or all: true")
+        return self
+
+class RateTier(BaseModel):
+    min: Union[int, float] = Field(ge=0)
+    max: Optional[Union[int, float]] = None  # None means no upper bound
+    rate: float = Field(gt=0)
+
+class FlatRate(BaseModel):
+    rate: float = Field(gt=0)
+
+class RateScheduleCreate(BaseModel):
+    effective_from: datetime
+    rates: Dict[str, Union[List[RateTier], FlatRate]]
+
+    @model_validator(mode="after")
+    def check_tiers(self):
+        missing = sorted(set(DEFAULT_RATES) - set(self.rates))
+        if missing:
+            raise ValueError(f"rates are required for every meter type; missing: {', '.join(missing)}")
+        for meter_type, spec in self.rates.items():
+            if not isinstance(spec, list):
+                continue
+            if not spec:
+                raise ValueError(f"{meter_type}: at least one tier is required")
+            if spec[0].min not in (0, 1):
+                # Tier widths are max - min + 1 counted from 0 kWh, as in DEFAULT_RATES.
+                raise ValueError(f"{meter_type}: the first tier must start at 0 or 1")
+            for index, tier in enumerate(spec):
+                if tier.max is None and index != len(spec) - 1:
+                    raise ValueError(f"{meter_type}: only the last tier may be open-ended")
+                if tier.max is not None and tier.max < tier.min:
+                    raise ValueError(f"{meter_type}: tier {index} has max below min")
+                if index and tier.min != spec[index - 1].max + 1:
+                    raise ValueError(f"{meter_type}: tier {index} must start at the previous tier's max + 1")
+        return self
+
+# Electricity rate configurations, shared with the generated frontend tables
+RATES = DEFAULT_RATES
+
+# Versioned schedules, seeded from RATES. Every calculation endpoint prices
+# through the compiled engine of the schedule in force at its as_of date.
+RATE_REFRESH_SECONDS = float(os.environ.get('RATE_REFRESH_SECONDS', 30))
+rate_schedules = RateScheduleCache(db.rate_schedules, RATES)
+
+# Repeated single conversions are served from an LRU/TTL cache keyed on
+# (operation, meter_type, value, schedule version); RESULT_CACHE_SIZE=0 disables it.
+conversion_cache = ResultCache(
+    max_size=int(os.environ.get('RESULT_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('RESULT_CACHE_TTL_SECONDS', 300))
+)
+rate_schedules.on_change(conversion_cache.clear)
+
+# Background re-pricing of stored calculations; jobs interrupted by a restart
+# are resumed from their checkpoint by the next poll.
+RECALCULATION_POLL_SECONDS = float(os.environ.get('RECALCULATION_POLL_SECONDS', 30))
+recalculations = RecalculationManager(
+    db.electricity_calculations, db.recalculation_jobs, rate_schedules, on_finish=rollup_store.invalidate
+)
+
+# Retention per collection in days (unset keeps documents forever). Aged
+# documents are removed by TTL indexes, or with ARCHIVE_MODE=collection|files
+# archived in throttled batches first, the TTL index then acting as a backstop
+# ARCHIVE_GRACE_DAYS later.
+def retention_days(name: str) -> Optional[float]:
+    value = os.environ.get(name)
+    return float(value) if value else None
+
+RETENTION_INTERVAL_SECONDS = float(os.environ.get('RETENTION_INTERVAL_SECONDS', 3600))
+PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', 1000))
+PURGE_PAUSE_SECONDS = float(os.environ.get('PURGE_PAUSE_MS', 100)) / 1000
+retention = RetentionManager(
+    db,
+    {
+        "electricity_calculations": retention_days('CALCULATIONS_RETENTION_DAYS'),
+        "status_checks": retention_days('STATUS_RETENTION_DAYS')
+    },
+    Archiver(
+        os.environ.get('ARCHIVE_MODE', 'none'),
+        database=db,
+        directory=Path(os.environ.get('ARCHIVE_DIR', ROOT_DIR / 'archive'))
+    ),
+    grace_days=float(os.environ.get('ARCHIVE_GRACE_DAYS', 7)),
+    batch_size=PURGE_BATCH_SIZE,
+    pause=PURGE_PAUSE_SECONDS
+)
 
 def calculate_residential_cost(kw: float):
     """Calculate cost for residential meter with tiered pricing"""
-    total_cost = 0
-    remaining_kw = kw
-    breakdown = []
-
-    for tier in RATES["residential"]:
-        if remaining_kw <= 0:
-            break
-        
-        tier_range = float('inf') if tier["max"] == float('inf') else tier["max"] - tier["min"] + 1
-        tier_usage = min(remaining_kw, tier_range)
-        
-        if tier_usage > 0:
-            tier_cost = tier_usage * tier["rate"]
-            total_cost += tier_cost
-            breakdown.append({
-                "tier": f"{tier['min']}-{tier['max'] if tier['max'] != float('inf') else '∞'}",
-                "usage": tier_usage,
-                "rate": tier["rate"],
-                "cost": tier_cost
-            })
-            remaining_kw -= tier_usage
-
-    return {"total_cost": total_cost, "breakdown": breakdown}
+    return rate_schedules.at().engine.kw_to_money("residential", kw)
 
 def calculate_flat_rate_cost(kw: float, rate: float):
     """Calculate cost for commercial/factory meters with flat rate"""
@@ -107,6 +291,49 @@ def calculate_flat_rate_cost(kw: float, rate: float):
     }]
     return {"total_cost": total_cost, "breakdown": breakdown}
 
+def build_calculation(row: dict) -> dict:
+    """Validate an imported row and fill in its consumption and cost.
+
+    A row with a ``timestamp`` is stored with it and priced with the rate
+    schedule in force at that moment.
+    """
+    fields = CalculationImportRow(**row).dict(exclude_none=True)
+    timestamp = fields.get("timestamp")
+    if timestamp is not None and timestamp.tzinfo is not None:
+        fields["timestamp"] = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    calc = ElectricityCalculation(**fields)
+    tariff_engine = rate_schedules.at(calc.timestamp).engine
+
+    if calc.calculation_type == "kw_to_money":
+        if calc.previous_reading is not None and calc.current_reading is not None:
+            calc.consumption = calc.current_reading - calc.previous_reading
+        if calc.consumption is None or calc.consumption <= 0:
+            raise ValueError("Current reading must be greater than previous reading")
+        result = tariff_engine.kw_to_money(calc.meter_type, calc.consumption)
+        if result is None:
+            raise ValueError("Invalid meter type")
+        calc.total_cost = result["total_cost"]
+        calc.breakdown = result["breakdown"]
+    elif calc.calculation_type == "money_to_kw":
+        if calc.amount is None or calc.amount <= 0:
+            raise ValueError("Amount must be greater than 0")
+        total_kw = tariff_engine.money_to_kw(calc.meter_type, calc.amount)
+        if total_kw is None:
+            raise ValueError("Invalid meter type")
+        calc.consumption = round(total_kw, 2)
+        calc.total_cost = calc.amount
+    else:
+        raise ValueError("Invalid calculation type")
+
+    return calc.dict()
+
+async def persist(collection, doc: dict) -> None:
+    """Insert ``doc`` directly, or queue it when write-behind mode is enabled"""
+    if write_buffer is not None:
+        await write_buffer.enqueue(collection, doc)
+    else:
+        await collection.insert_one(doc)
+
 # Add your routes to the router instead of directly to app
 @api_router.get("/")
 async def root():
@@ -116,51 +343,178 @@ async def root():
 async def create_status_check(input: StatusCheckCreate):
     status_dict = input.dict()
     status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
+    await persist(db.status_checks, status_obj.dict())
     return status_obj
 
-@api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+@api_router.get("/status", responses={200: {"model": List[StatusCheck]}})
+async def get_status_checks(
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = None
+):
+    """Get status checks, newest first, one keyset page at a time"""
+    query = build_filter(cursor)
+    status_checks = await db.status_checks.find(query, {"_id": 0}).sort(SORT_ORDER).to_list(limit)
+    headers = {}
+    if len(status_checks) == limit:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(status_checks[-1])
+    # Documents were validated on the way in, so they are serialized as stored
+    return ORJSONResponse(status_checks, headers=headers)
 
 @api_router.post("/calculate", response_model=ElectricityCalculation)
-async def create_calculation(input: ElectricityCalculationCreate):
-    """Create and store an electricity calculation"""
+async def create_calculation(
+    input: ElectricityCalculationCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255)
+):
+    """Create and store an electricity calculation
+
+    A retry carrying the same ``Idempotency-Key`` header returns the
+    calculation stored by the first request instead of inserting another.
+    """
     calculation_dict = input.dict()
     calculation_obj = ElectricityCalculation(**calculation_dict)
+
+    if idempotency_key is not None:
+        stored, replayed = await idempotent_calculations.insert(
+            idempotency_key, request_hash(calculation_dict), calculation_obj.dict()
+        )
+        if replayed:
+            response.headers[REPLAYED_HEADER] = "true"
+        return ElectricityCalculation(**stored)
     
     # Store in database
-    await db.electricity_calculations.insert_one(calculation_obj.dict())
+    await persist(db.electricity_calculations, calculation_obj.dict())
     
     return calculation_obj
 
-@api_router.get("/calculations", response_model=List[ElectricityCalculation])
-async def get_calculations(limit: int = 100):
-    """Get stored electricity calculations"""
-    calculations = await db.electricity_calculations.find().sort("timestamp", -1).to_list(limit)
-    return [ElectricityCalculation(**calc) for calc in calculations]
+@api_router.get("/calculations", responses={200: {"model": List[ElectricityCalculation]}})
+async def get_calculations(
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    meter_type: Optional[str] = None,
+    calculation_type: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """Get stored electricity calculations.
+
+    Results are newest first. When a page is full, the cursor for the next
+    page is returned in the ``X-Next-Cursor`` header. ``fields`` is a
+    comma-separated projection that is applied in Mongo; ``id`` and
+    ``timestamp`` are always included.
+
+    Stored documents are returned as-is, without re-validation.
+    """
+    query = build_filter(
+        cursor, start, end, meter_type=meter_type, calculation_type=calculation_type
+    )
+    projection = build_projection(fields, ElectricityCalculation.model_fields) or {"_id": 0, "idempotency": 0}
+    calculations = await db.electricity_calculations.find(query, projection).sort(SORT_ORDER).to_list(limit)
+    headers = {}
+    if limit > 0 and len(calculations) == limit:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(calculations[-1])
+    return ORJSONResponse(calculations, headers=headers)
+
+@api_router.get("/calculations/summary")
+async def get_calculations_summary(
+    group_by: str = Query("meter_type", pattern=f"^({'|'.join(GROUPINGS)})$"),
+    meter_type: Optional[str] = None,
+    calculation_type: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """Get total consumption, cost and count per meter type, tier or time bucket.
+
+    Time buckets are UTC days, ISO weeks starting Monday, or calendar months.
+    """
+    filters = build_filter(meter_type=meter_type, calculation_type=calculation_type)
+    rows = await rollup_store.daily_rows(filters, start, end)
+    return summarize(rows, group_by)
+
+@api_router.get("/calculations/export")
+async def export_calculations(
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    fields: Optional[str] = None,
+    meter_type: Optional[str] = None,
+    calculation_type: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    batch_size: int = Query(1000, ge=1, le=10000)
+):
+    """Stream stored calculations as CSV, NDJSON or Parquet.
+
+    Accepts the same filters and ``fields`` projection as ``GET /calculations``.
+    """
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+
+    query = build_filter(
+        None, start, end, meter_type=meter_type, calculation_type=calculation_type
+    )
+    projection = build_projection(fields, ElectricityCalculation.model_fields)
+    columns = [name for name in ElectricityCalculation.model_fields if projection is None or name in projection]
+    cursor = db.electricity_calculations.find(query, projection).sort(SORT_ORDER).batch_size(batch_size)
+
+    return StreamingResponse(
+        STREAMERS[format](cursor, columns, batch_size),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename=calculations.{format}"}
+    )
+
+@api_router.post("/calculations/import")
+async def import_calculations_stream(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    dry_run: bool = False,
+    chunk_size: int = Query(1000, ge=1, le=10000)
+):
+    """Stream an NDJSON or CSV upload of calculations into the database.
+
+    The format defaults to CSV for a ``text/csv`` body and NDJSON otherwise.
+    With ``dry_run`` rows are validated and priced but nothing is written.
+    Rows may be backdated, so the summary rollups of the days they land in
+    are rematerialized afterwards.
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if content_type.startswith("text/csv") else "ndjson"
+
+    days = set()
+    summary = await import_calculations(
+        request.stream(),
+        format,
+        db.electricity_calculations,
+        build_calculation,
+        chunk_size=chunk_size,
+        dry_run=dry_run,
+        on_written=lambda docs: days.update(floor_day(doc["timestamp"]) for doc in docs)
+    )
+    await rollup_store.refresh_days(days)
+    return summary
 
 @api_router.post("/calculate/kw-to-money")
 async def calculate_kw_to_money(
     meter_type: str,
     previous_reading: float,
-    current_reading: float
+    current_reading: float,
+    as_of: Optional[datetime] = None
 ):
-    """Calculate cost from kW consumption"""
+    """Calculate cost from kW consumption at the rates in force on ``as_of`` (default now)"""
     consumption = current_reading - previous_reading
     
     if consumption <= 0:
         return {"error": "Current reading must be greater than previous reading"}
     
-    if meter_type == "residential":
-        result = calculate_residential_cost(consumption)
-    elif meter_type == "commercial":
-        result = calculate_flat_rate_cost(consumption, RATES["commercial"]["rate"])
-    elif meter_type == "factory":
-        result = calculate_flat_rate_cost(consumption, RATES["factory"]["rate"])
-    else:
-        return {"error": "Invalid meter type"}
+    schedule = rate_schedules.at(as_of)
+    key = ("kw_to_money", meter_type, consumption, schedule.version)
+    result = conversion_cache.get(key)
+    if result is MISSING:
+        with CALCULATION_SECONDS.time("kw_to_money"):
+            result = schedule.engine.kw_to_money(meter_type, consumption)
+        if result is None:
+            return {"error": "Invalid meter type"}
+        conversion_cache.put(key, result)
     
     return {
         "consumption": consumption,
@@ -172,35 +526,22 @@ async def calculate_kw_to_money(
 @api_router.post("/calculate/money-to-kw")
 async def calculate_money_to_kw(
     meter_type: str,
-    amount: float
+    amount: float,
+    as_of: Optional[datetime] = None
 ):
-    """Calculate kW from money amount"""
+    """Calculate kW from money amount at the rates in force on ``as_of`` (default now)"""
     if amount <= 0:
         return {"error": "Amount must be greater than 0"}
     
-    total_kw = 0
-    
-    if meter_type == "residential":
-        remaining_amount = amount
-        for tier in RATES["residential"]:
-            if remaining_amount <= 0:
-                break
-            
-            tier_range = float('inf') if tier["max"] == float('inf') else tier["max"] - tier["min"] + 1
-            max_tier_cost = float('inf') if tier_range == float('inf') else tier_range * tier["rate"]
-            
-            if remaining_amount >= max_tier_cost and tier_range != float('inf'):
-                total_kw += tier_range
-                remaining_amount -= max_tier_cost
-            else:
-                total_kw += remaining_amount / tier["rate"]
-                break
-    elif meter_type == "commercial":
-        total_kw = amount / RATES["commercial"]["rate"]
-    elif meter_type == "factory":
-        total_kw = amount / RATES["factory"]["rate"]
-    else:
-        return {"error": "Invalid meter type"}
+    schedule = rate_schedules.at(as_of)
+    key = ("money_to_kw", meter_type, amount, schedule.version)
+    total_kw = conversion_cache.get(key)
+    if total_kw is MISSING:
+        with CALCULATION_SECONDS.time("money_to_kw"):
+            total_kw = schedule.engine.money_to_kw(meter_type, amount)
+        if total_kw is None:
+            return {"error": "Invalid meter type"}
+        conversion_cache.put(key, total_kw)
     
     return {
         "amount": amount,
@@ -208,28 +549,241 @@ async def calculate_money_to_kw(
         "meter_type": meter_type
     }
 
+@api_router.post("/calculate/kw-to-money/batch")
+async def calculate_kw_to_money_batch(input: KwToMoneyBatch, as_of: Optional[datetime] = None):
+    """Calculate costs for many meter readings in one request.
+
+    Rows that fail validation get an error code in ``error`` instead of
+    failing the whole batch.
+    """
+    with CALCULATION_SECONDS.time("kw_to_money_batch"):
+        return rate_schedules.at(as_of).engine.kw_to_money_batch(
+            input.meter_type, input.previous_reading, input.current_reading
+        )
+
+@api_router.post("/calculate/money-to-kw/batch")
+async def calculate_money_to_kw_batch(input: MoneyToKwBatch, as_of: Optional[datetime] = None):
+    """Calculate kW for many money amounts in one request"""
+    with CALCULATION_SECONDS.time("money_to_kw_batch"):
+        return rate_schedules.at(as_of).engine.money_to_kw_batch(input.meter_type, input.amount)
+
+@api_router.post("/readings/batch")
+async def ingest_meter_readings(input: ReadingBatch):
+    """Store meter readings and bill the consumption since each meter's previous reading.
+
+    A meter's first reading sets its baseline and has no consumption. Rows
+    that are rejected (unknown meter type, out of order, duplicate, reading
+    decreased, or a conflict with concurrent batches for the same meter that
+    persisted through retries) get an error code in ``error``; the rest of
+    the batch is stored.
+    """
+    return await ingest_readings(
+        db.meter_readings,
+        db.meter_state,
+        input.meter_id,
+        input.meter_type,
+        input.timestamp,
+        input.reading,
+        rate_schedules.at
+    )
+
+@api_router.get("/readings/{meter_id}")
+async def get_meter_readings(
+    meter_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """Get a meter's stored readings, newest first"""
+    query = build_filter(None, start, end, meter_id=meter_id)
+    readings = await db.meter_readings.find(query, {"_id": 0}).sort(READINGS_INDEX).to_list(limit)
+    return ORJSONResponse(readings)
+
+@api_router.get("/ready")
+async def readiness():
+    """Report whether this worker can reach the database, with connection pool counters"""
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(db.command("ping"), READINESS_TIMEOUT_SECONDS)
+        body = {"status": "ready", "ping_ms": round((time.perf_counter() - started) * 1000, 3)}
+    except Exception as exc:
+        body = {"status": "unavailable", "error": str(exc) or type(exc).__name__}
+    body.update(
+        pid=os.getpid(),
+        storage=STORAGE_BACKEND,
+        connected=database.connected,
+        pool=database.pool_monitor.stats()
+    )
+    if STORAGE_BACKEND == "mongo":
+        body["pool_options"] = POOL_OPTIONS
+    return ORJSONResponse(body, status_code=200 if body["status"] == "ready" else 503)
+
+@api_router.get("/admission")
+async def get_admission_stats():
+    """Get rate limiting and load shedding counters with the configured limits"""
+    return {"enabled": ADMISSION_ENABLED, **admission.stats()}
+
+@api_router.get("/write-behind")
+async def get_write_behind_stats():
+    """Get write-behind queue counters"""
+    if write_buffer is None:
+        return {"enabled": False}
+    return {"enabled": True, **write_buffer.stats()}
+
+@api_router.get("/calculate/cache")
+async def get_conversion_cache_stats():
+    """Get hit/miss/eviction counters of the conversion result cache"""
+    return conversion_cache.stats()
+
 @api_router.get("/rates")
-async def get_rates():
-    """Get current electricity rates"""
-    return RATES
+async def get_rates(request: Request, as_of: Optional[datetime] = None):
+    """Get the electricity rates in force on ``as_of`` (default now).
+
+    Served pre-serialized from the in-memory schedule cache with an ETag
+    per version. An open-ended tier has ``max: null``.
+    """
+    schedule = rate_schedules.at(as_of)
+    headers = {
+        "ETag": schedule.etag,
+        "Cache-Control": f"public, max-age={int(RATE_REFRESH_SECONDS)}",
+        "X-Rate-Version": str(schedule.version)
+    }
+    if request.headers.get("if-none-match") == schedule.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(schedule.body, media_type="application/json", headers=headers)
+
+@api_router.get("/rates/versions")
+async def get_rate_versions():
+    """List every cached rate schedule version with its effective date"""
+    return [
+        {"version": schedule.version, "effective_from": schedule.effective_from}
+        for schedule in rate_schedules.schedules
+    ]
+
+@api_router.post("/rates")
+async def create_rate_schedule(input: RateScheduleCreate):
+    """Store a new rate schedule version effective from ``effective_from``"""
+    rates = {
+        meter_type: [tier.dict() for tier in spec] if isinstance(spec, list) else spec.dict()
+        for meter_type, spec in input.rates.items()
+    }
+    try:
+        schedule = await rate_schedules.add(input.effective_from, rates)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Rate schedule version conflict, retry")
+    return schedule.as_dict()
+
+@api_router.post("/recalculations", status_code=202)
+async def start_recalculation(input: RecalculationCreate):
+    """Start re-pricing stored calculations in the background.
+
+    Without ``as_of`` each record is priced with the schedule in force at its
+    own timestamp. Poll the returned job for progress.
+    """
+    return await recalculations.create(input.dict())
+
+@api_router.get("/recalculations/{job_id}")
+async def get_recalculation(job_id: str):
+    """Get the status and progress counters of a recalculation job"""
+    job = await recalculations.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Recalculation job not found")
+    return job
+
+@api_router.post("/recalculations/{job_id}/cancel")
+async def cancel_recalculation(job_id: str):
+    """Stop a recalculation job after its current batch"""
+    if not await recalculations.cancel(job_id):
+        job = await recalculations.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Recalculation job not found")
+        raise HTTPException(status_code=409, detail=f"Recalculation job already {job['status']}")
+    return await recalculations.get(job_id)
+
+@api_router.post("/calculations/purge", status_code=202)
+async def start_purge(input: PurgeCreate):
+    """Delete calculations older than ``before``, or with ``all`` every one, in the background.
+
+    Documents are removed in ``batch_size`` chunks with a ``pause_ms`` pause
+    between them; with ``archive`` each chunk is archived first (requires
+    ``ARCHIVE_MODE``). Poll the returned job for progress.
+    """
+    if input.archive and not retention.archiver.enabled:
+        raise HTTPException(status_code=400, detail="Archiving requires ARCHIVE_MODE to be set")
+    return await retention.start_purge(
+        "electricity_calculations",
+        input.before,
+        input.archive,
+        input.batch_size,
+        input.pause_ms / 1000,
+        on_finish=rollup_store.invalidate
+    )
+
+@api_router.get("/calculations/purge/{job_id}")
+async def get_purge(job_id: str):
+    """Get the status and deleted count of a purge job"""
+    job = await retention.get_purge(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Purge job not found")
+    return job
 
 @api_router.delete("/calculations")
 async def clear_calculations():
-    """Clear all stored calculations"""
+    """Clear all stored calculations in a single ``delete_many``.
+
+    Use POST /api/calculations/purge for large collections; it deletes in
+    throttled batches in the background.
+    """
     result = await db.electricity_calculations.delete_many({})
+    await rollup_store.invalidate()
     return {"deleted_count": result.deleted_count}
 
 # Include the router in the main app
 app.include_router(api_router)
 
+def runtime_metrics():
+    """Exposition lines for state owned by other components"""
+    lines = [
+        "# TYPE rate_schedule_version gauge",
+        f"rate_schedule_version {rate_schedules.version}"
+    ]
+    cache_stats = conversion_cache.stats()
+    for name in ("hits", "misses", "evictions", "expirations", "invalidations"):
+        lines += [
+            f"# TYPE conversion_cache_{name}_total counter",
+            f"conversion_cache_{name}_total {cache_stats[name]}"
+        ]
+    lines += ["# TYPE conversion_cache_size gauge", f"conversion_cache_size {cache_stats['size']}"]
+    if write_buffer is not None:
+        for name, value in write_buffer.stats().items():
+            kind = "counter" if name in ("queued", "flushed", "dropped") else "gauge"
+            metric = f"write_behind_{name}_total" if kind == "counter" else f"write_behind_{name}"
+            lines += [f"# TYPE {metric} {kind}", f"{metric} {value}"]
+    return lines
+
+REGISTRY.add_collector(runtime_metrics)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+if ADMISSION_ENABLED:
+    # Inside CORS so rejections still carry CORS headers
+    app.add_middleware(AdmissionMiddleware, controller=admission, routes_app=app)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "X-Rate-Version", REPLAYED_HEADER, "Retry-After"],
 )
 
+# Added last so it is outermost and times the whole middleware stack
+app.add_middleware(MetricsMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -237,6 +791,26 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
+async def create_indexes():
+    """Create the indexes backing the list queries, uniqueness and retention TTLs"""
+    await db.electricity_calculations.create_index(SORT_ORDER)
+    await db.electricity_calculations.create_index([("meter_type", 1)] + SORT_ORDER)
+    await db.electricity_calculations.create_index([("calculation_type", 1)] + SORT_ORDER)
+    await db.electricity_calculations.create_index(KEY_FIELD, unique=True, sparse=True)
+    await db.status_checks.create_index(SORT_ORDER)
+    await db.rate_schedules.create_index("version", unique=True)
+    await db.meter_readings.create_index(READINGS_INDEX, unique=True)
+    await retention.ensure_indexes()
+
+async def load_rate_schedules():
+    """Load rate schedules into memory and poll for new versions"""
+    await rate_schedules.load()
+    rate_schedules.start(RATE_REFRESH_SECONDS)
+
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await rate_schedules.stop()
+    await recalculations.stop()
+    await retention.stop()
+    if write_buffer is not None:
+        await write_buffer.close()
+    database.close()
\ No newline at end of file
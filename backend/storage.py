@@ -0,0 +1,974 @@
+"""Storage backends for the API.
+
+Routes talk to collections through the Motor API. ``open_database`` returns
+either a real Motor database or an in-process ``MemoryDatabase`` that
+implements the subset of that API the app uses:
+
+* ``insert_one``/``insert_many``, ``find`` (filter, projection, sort, skip,
+  limit, async iteration), ``find_one``, ``count_documents``
+* ``replace_one``/``update_one``/``update_many``, ``delete_one``/``delete_many``
+  and ``bulk_write``
+* ``aggregate`` with ``$match``, ``$unwind``, ``$group``, ``$sort``, ``$limit``
+  and ``$project``
+* ``create_index``/``drop_index``, where unique (optionally sparse) indexes are
+  enforced and TTL indexes (``expireAfterSeconds``) expire documents whose
+  date is past the limit; expired documents are removed before every read
+
+Every memory collection keeps a sorted index on ``timestamp`` and a hash index
+on ``meter_type``. Queries filtering on those fields scan only the matching
+documents, and ``find().sort("timestamp", -1).limit(n)`` walks the sorted
+index and stops early.
+
+Select the backend with ``STORAGE_BACKEND=mongo`` (default) or ``memory``.
+``LazyDatabase`` defers creating the client until it is connected from the
+app's lifespan handler (or first used), so nothing is opened at import time
+or before uvicorn has forked its workers. Motor pool settings come from the
+``MONGO_*`` variables in ``POOL_OPTIONS``.
+"""
+
+import os
+import re
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta, timezone
+from itertools import count
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.monitoring import ConnectionPoolListener
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+SORTED_INDEX_FIELD = "timestamp"
+HASH_INDEX_FIELD = "meter_type"
+
+_MISSING = object()
+
+
+# Motor client option -> (environment variable, default). A default of None
+# leaves the driver's own default in place.
+POOL_OPTIONS = {
+    "maxPoolSize": ("MONGO_MAX_POOL_SIZE", 50),
+    "minPoolSize": ("MONGO_MIN_POOL_SIZE", 0),
+    "maxIdleTimeMS": ("MONGO_MAX_IDLE_TIME_MS", 60000),
+    "waitQueueTimeoutMS": ("MONGO_WAIT_QUEUE_TIMEOUT_MS", None),
+    "serverSelectionTimeoutMS": ("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+    "connectTimeoutMS": ("MONGO_CONNECT_TIMEOUT_MS", 5000)
+}
+
+
+def pool_options() -> Dict[str, int]:
+    options = {}
+    for option, (variable, default) in POOL_OPTIONS.items():
+        value = os.environ.get(variable, default)
+        if value is not None:
+            options[option] = int(value)
+    return options
+
+
+def open_database(backend: str, event_listeners: Iterable[Any] = ()):
+    """Return ``(client, db)`` for the configured storage backend."""
+    if backend == "memory":
+        client = MemoryClient()
+        return client, client[os.environ.get('DB_NAME', 'electricity')]
+    if backend != "mongo":
+        raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}")
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], event_listeners=list(event_listeners), **pool_options())
+    return client, client[os.environ['DB_NAME']]
+
+
+class PoolMonitor(ConnectionPoolListener):
+    """Counts connection pool events for the readiness endpoint."""
+
+    def __init__(self) -> None:
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self.checked_in = 0
+        self.check_out_failures = 0
+        self.cleared = 0
+
+    def stats(self) -> dict:
+        return {
+            "open": self.created - self.closed,
+            "in_use": self.checked_out - self.checked_in,
+            "created": self.created,
+            "closed": self.closed,
+            "check_out_failures": self.check_out_failures,
+            "cleared": self.cleared
+        }
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        self.cleared += 1
+
+    def pool_closed(self, event) -> None:
+        pass
+
+    def connection_created(self, event) -> None:
+        self.created += 1
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def connection_closed(self, event) -> None:
+        self.closed += 1
+
+    def connection_check_out_started(self, event) -> None:
+        pass
+
+    def connection_check_out_failed(self, event) -> None:
+        self.check_out_failures += 1
+
+    def connection_checked_out(self, event) -> None:
+        self.checked_out += 1
+
+    def connection_checked_in(self, event) -> None:
+        self.checked_in += 1
+
+
+class LazyCollection:
+    """Collection handle resolved through its ``LazyDatabase`` on each use."""
+
+    def __init__(self, database: "LazyDatabase", name: str) -> None:
+        self._database = database
+        self.name = name
+
+    def __getattr__(self, name: str):
+        return getattr(self._database.collection(self.name), name)
+
+
+class LazyDatabase:
+    """Database handle whose client is created by ``connect()`` or on first use."""
+
+    def __init__(self, backend: str) -> None:
+        self.backend = backend
+        self.client = None
+        self.pool_monitor = PoolMonitor()
+        self._database = None
+        self._collections: Dict[str, Any] = {}
+
+    @property
+    def connected(self) -> bool:
+        return self._database is not None
+
+    def connect(self):
+        if self._database is None:
+            self.client, self._database = open_database(self.backend, [self.pool_monitor])
+        return self._database
+
+    def close(self) -> None:
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+        self._database = None
+        self._collections.clear()
+
+    def collection(self, name: str):
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = self.connect()[name]
+        return collection
+
+    def __getitem__(self, name: str) -> LazyCollection:
+        return LazyCollection(self, name)
+
+    async def command(self, *args, **kwargs):
+        return await self.connect().command(*args, **kwargs)
+
+
+# --- document helpers -------------------------------------------------------
+
+def _naive_utc(value):
+    """Aware datetimes as naive UTC, the form BSON stores and Motor returns."""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _clone(value):
+    """Copy nested dicts/lists so stored documents never alias caller objects."""
+    if isinstance(value, dict):
+        return {key: _clone(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_clone(item) for item in value]
+    return _naive_utc(value)
+
+
+def _get(doc: dict, path: str):
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _set(doc: dict, path: str, value) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _unset(doc: dict, path: str) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(last, None)
+
+
+def _sort_key(value):
+    """Order values like Mongo does across types: missing/null < numbers < strings < ..."""
+    if value is _MISSING or value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (5, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, dict):
+        return (3, str(sorted(value.items())))
+    if isinstance(value, ObjectId):
+        return (4, str(value))
+    if isinstance(value, datetime):
+        return (6, _naive_utc(value))
+    return (7, str(value))
+
+
+def _normalize_sort(key_or_list, direction=None) -> List[Tuple[str, int]]:
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    return [(key, order) for key, order in key_or_list]
+
+
+def _sort_docs(docs: List[dict], keys: List[Tuple[str, int]]) -> None:
+    for field, direction in reversed(keys):
+        docs.sort(key=lambda doc: _sort_key(_get(doc, field)), reverse=direction < 0)
+
+
+def _project(doc: dict, projection: Optional[dict]) -> dict:
+    if not projection:
+        return _clone(doc)
+    include = [field for field, keep in projection.items() if keep and field != "_id"]
+    if include:
+        result = {}
+        for field in include:
+            value = _get(doc, field)
+            if value is not _MISSING:
+                _set(result, field, _clone(value))
+        if projection.get("_id", 1) and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+    result = _clone(doc)
+    for field, keep in projection.items():
+        if not keep:
+            _unset(result, field)
+    return result
+
+
+# --- query matching ---------------------------------------------------------
+
+def _compare(value, operand, op) -> bool:
+    if value is _MISSING or value is None or operand is None:
+        return False
+    try:
+        return op(_naive_utc(value), _naive_utc(operand))
+    except TypeError:
+        return False
+
+
+def _values_at(doc: dict, path: str) -> List[Any]:
+    """Candidate values for ``path``, expanding arrays like Mongo queries do."""
+    value = _get(doc, path)
+    if isinstance(value, list):
+        return [value] + value
+    return [value]
+
+
+def _equals(value, operand) -> bool:
+    if operand is None:
+        return value is None or value is _MISSING
+    return _naive_utc(value) == _naive_utc(operand)
+
+
+def _match_operators(doc: dict, path: str, condition: dict) -> bool:
+    values = _values_at(doc, path)
+    for op, operand in condition.items():
+        if op == "$eq":
+            ok = any(_equals(value, operand) for value in values)
+        elif op == "$ne":
+            ok = not any(_equals(value, operand) for value in values)
+        elif op == "$gt":
+            ok = any(_compare(value, operand, lambda a, b: a > b) for value in values)
+        elif op == "$gte":
+            ok = any(_compare(value, operand, lambda a, b: a >= b) for value in values)
+        elif op == "$lt":
+            ok = any(_compare(value, operand, lambda a, b: a < b) for value in values)
+        elif op == "$lte":
+            ok = any(_compare(value, operand, lambda a, b: a <= b) for value in values)
+        elif op == "$in":
+            ok = any(_equals(value, item) for value in values for item in operand)
+        elif op == "$nin":
+            ok = not any(_equals(value, item) for value in values for item in operand)
+        elif op == "$exists":
+            ok = (_get(doc, path) is not _MISSING) == bool(operand)
+        elif op == "$regex":
+            ok = any(isinstance(value, str) and re.search(operand, value) for value in values)
+        elif op == "$not":
+            ok = not _match_operators(doc, path, operand)
+        else:
+            raise NotImplementedError(f"Query operator {op} is not supported by the memory store")
+        if not ok:
+            return False
+    return True
+
+
+def matches(doc: dict, query: Optional[dict]) -> bool:
+    """Evaluate a Mongo query filter against one document."""
+    if not query:
+        return True
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(matches(doc, part) for part in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, part) for part in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, part) for part in condition):
+                return False
+        elif isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            if not _match_operators(doc, key, condition):
+                return False
+        elif not any(_equals(value, condition) for value in _values_at(doc, key)):
+            return False
+    return True
+
+
+# --- aggregation ------------------------------------------------------------
+
+def _evaluate(expr, doc: dict):
+    if isinstance(expr, str) and expr.startswith("$"):
+        value = _get(doc, expr[1:])
+        return None if value is _MISSING else value
+    if isinstance(expr, list):
+        return [_evaluate(item, doc) for item in expr]
+    if not isinstance(expr, dict):
+        return expr
+    if len(expr) == 1:
+        op, arg = next(iter(expr.items()))
+        if op.startswith("$"):
+            return _evaluate_operator(op, arg, doc)
+    return {key: _evaluate(value, doc) for key, value in expr.items()}
+
+
+def _evaluate_operator(op: str, arg, doc: dict):
+    if op == "$ifNull":
+        for item in arg:
+            value = _evaluate(item, doc)
+            if value is not None:
+                return value
+        return None
+    if op in ("$year", "$month", "$dayOfMonth", "$hour"):
+        value = _evaluate(arg, doc)
+        if value is None:
+            return None
+        return getattr(value, {"$year": "year", "$month": "month", "$dayOfMonth": "day", "$hour": "hour"}[op])
+    if op == "$dateFromParts":
+        parts = {key: _evaluate(value, doc) for key, value in arg.items()}
+        return datetime(parts.get("year", 1970), parts.get("month", 1), parts.get("day", 1), parts.get("hour", 0))
+    if op in ("$add", "$multiply", "$subtract", "$divide"):
+        values = [_evaluate(item, doc) for item in arg]
+        if any(value is None for value in values):
+            return None
+        if op == "$add":
+            return sum(values)
+        if op == "$multiply":
+            result = 1
+            for value in values:
+                result *= value
+            return result
+        if op == "$subtract":
+            return values[0] - values[1]
+        return values[0] / values[1]
+    if op == "$literal":
+        return arg
+    raise NotImplementedError(f"Expression operator {op} is not supported by the memory store")
+
+
+def _accumulate(op: str, values: List[Any]):
+    if op == "$sum":
+        return sum(value for value in values if isinstance(value, (int, float)) and not isinstance(value, bool))
+    if op == "$avg":
+        numbers = [value for value in values if isinstance(value, (int, float))]
+        return sum(numbers) / len(numbers) if numbers else None
+    present = [value for value in values if value is not None]
+    if op == "$min":
+        return min(present, key=_sort_key) if present else None
+    if op == "$max":
+        return max(present, key=_sort_key) if present else None
+    if op == "$first":
+        return values[0] if values else None
+    if op == "$last":
+        return values[-1] if values else None
+    if op == "$push":
+        return values
+    raise NotImplementedError(f"Accumulator {op} is not supported by the memory store")
+
+
+def _group(docs: Iterable[dict], spec: dict) -> List[dict]:
+    groups: Dict[Any, Tuple[Any, Dict[str, List[Any]]]] = {}
+    accumulators = {field: next(iter(acc.items())) for field, acc in spec.items() if field != "_id"}
+    for doc in docs:
+        key = _evaluate(spec["_id"], doc)
+        hashable = repr(key)
+        if hashable not in groups:
+            groups[hashable] = (key, {field: [] for field in accumulators})
+        _, values = groups[hashable]
+        for field, (_, expr) in accumulators.items():
+            values[field].append(_evaluate(expr, doc))
+
+    results = []
+    for key, values in groups.values():
+        row = {"_id": key}
+        for field, (op, _) in accumulators.items():
+            row[field] = _accumulate(op, values[field])
+        results.append(row)
+    return results
+
+
+def run_pipeline(docs: Iterable[dict], pipeline: List[dict]) -> List[dict]:
+    current: Iterable[dict] = docs
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == "$match":
+            current = [doc for doc in current if matches(doc, spec)]
+        elif name == "$unwind":
+            path = (spec["path"] if isinstance(spec, dict) else spec)[1:]
+            unwound = []
+            for doc in current:
+                value = _get(doc, path)
+                if isinstance(value, list):
+                    for item in value:
+                        copy = dict(doc)
+                        _set(copy, path, item)
+                        unwound.append(copy)
+            current = unwound
+        elif name == "$group":
+            current = _group(current, spec)
+        elif name == "$sort":
+            current = list(current)
+            _sort_docs(current, list(spec.items()))
+        elif name == "$limit":
+            current = list(current)[:spec]
+        elif name == "$skip":
+            current = list(current)[spec:]
+        elif name == "$project":
+            current = [
+                {field: _evaluate(f"${field}" if expr in (1, True) else expr, doc)
+                 for field, expr in spec.items() if expr not in (0, False)}
+                for doc in current
+            ]
+        else:
+            raise NotImplementedError(f"Pipeline stage {name} is not supported by the memory store")
+    return list(current)
+
+
+# --- cursors ----------------------------------------------------------------
+
+class _ListCursor:
+    """Async cursor over already-computed results."""
+
+    def __init__(self, results: List[dict]) -> None:
+        self._results = results
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        return self._results if not length else self._results[:length]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self._results:
+            yield doc
+
+
+class MemoryCursor:
+    """Lazy ``find`` cursor supporting the Motor chaining methods."""
+
+    def __init__(self, collection: "MemoryCollection", query: Optional[dict], projection: Optional[dict]) -> None:
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None) -> "MemoryCursor":
+        self._sort = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, count: int) -> "MemoryCursor":
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> "MemoryCursor":
+        self._limit = count
+        return self
+
+    def batch_size(self, _size: int) -> "MemoryCursor":
+        return self
+
+    def _results(self, length: Optional[int] = None) -> List[dict]:
+        limit = self._limit
+        if length:
+            limit = min(limit, length) if limit else length
+        docs = self._collection._select(self._query, self._sort, self._skip + limit if limit else 0)
+        docs = docs[self._skip:]
+        if limit:
+            docs = docs[:limit]
+        return [_project(doc, self._projection) for doc in docs]
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        return self._results(length)
+
+    def __aiter__(self):
+        return _ListCursor(self._results()).__aiter__()
+
+
+# --- collections ------------------------------------------------------------
+
+class MemoryCollection:
+    """In-process collection with the Motor methods the app uses."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._docs: Dict[int, dict] = {}
+        self._seq = count()
+        self._by_id: Dict[Any, int] = {}
+        self._sorted: List[Tuple[Any, int]] = []
+        self._hashed: Dict[Any, set] = {}
+        self._unique: Dict[Tuple[str, ...], Dict[tuple, int]] = {}
+        self._sparse: set = set()
+        self.indexes: Dict[str, dict] = {"_id_": {"key": [("_id", 1)], "unique": True}}
+
+    # index maintenance
+
+    def _unique_key(self, fields: Tuple[str, ...], doc: dict) -> Optional[tuple]:
+        """Index key of ``doc``, or None when a sparse index skips it."""
+        values = tuple(_get(doc, field) for field in fields)
+        if fields in self._sparse and all(value is _MISSING for value in values):
+            return None
+        values = tuple(None if value is _MISSING else value for value in values)
+        return values
+
+    def _check_unique(self, doc: dict, ignore: Optional[int] = None) -> None:
+        seq = self._by_id.get(doc["_id"])
+        if seq is not None and seq != ignore:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_")
+        for fields, entries in self._unique.items():
+            key = self._unique_key(fields, doc)
+            seq = entries.get(key) if key is not None else None
+            if seq is not None and seq != ignore:
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.name} index: {'_'.join(fields)}"
+                )
+
+    def _index(self, seq: int, doc: dict) -> None:
+        self._by_id[doc["_id"]] = seq
+        timestamp = doc.get(SORTED_INDEX_FIELD, _MISSING)
+        if timestamp is not _MISSING:
+            insort(self._sorted, (_sort_key(timestamp), seq))
+        meter_type = doc.get(HASH_INDEX_FIELD, _MISSING)
+        if meter_type is not _MISSING:
+            self._hashed.setdefault(meter_type, set()).add(seq)
+        for fields, entries in self._unique.items():
+            key = self._unique_key(fields, doc)
+            if key is not None:
+                entries[key] = seq
+
+    def _unindex(self, seq: int, doc: dict) -> None:
+        self._by_id.pop(doc["_id"], None)
+        timestamp = doc.get(SORTED_INDEX_FIELD, _MISSING)
+        if timestamp is not _MISSING:
+            entry = (_sort_key(timestamp), seq)
+            position = bisect_left(self._sorted, entry)
+            if position < len(self._sorted) and self._sorted[position] == entry:
+                del self._sorted[position]
+        meter_type = doc.get(HASH_INDEX_FIELD, _MISSING)
+        if meter_type is not _MISSING:
+            self._hashed.get(meter_type, set()).discard(seq)
+        for fields, entries in self._unique.items():
+            key = self._unique_key(fields, doc)
+            if key is not None and entries.get(key) == seq:
+                del entries[key]
+
+    def _store(self, doc: dict) -> Any:
+        doc.setdefault("_id", ObjectId())
+        stored = _clone(doc)
+        self._check_unique(stored)
+        seq = next(self._seq)
+        self._docs[seq] = stored
+        self._index(seq, stored)
+        return stored["_id"]
+
+    def _replace(self, seq: int, new_doc: dict) -> None:
+        old = self._docs[seq]
+        new_doc = _clone(new_doc)
+        new_doc["_id"] = old["_id"]
+        self._unindex(seq, old)
+        try:
+            self._check_unique(new_doc, ignore=seq)
+        except DuplicateKeyError:
+            self._index(seq, old)
+            raise
+        self._docs[seq] = new_doc
+        self._index(seq, new_doc)
+
+    def _remove(self, seq: int) -> None:
+        self._unindex(seq, self._docs.pop(seq))
+
+    def _expire(self) -> None:
+        """Remove documents past a TTL index's limit, like Mongo's TTL monitor."""
+        for index in self.indexes.values():
+            seconds = index.get("expireAfterSeconds")
+            if seconds is None:
+                continue
+            field = index["key"][0][0]
+            cutoff = datetime.utcnow() - timedelta(seconds=seconds)
+            if field == SORTED_INDEX_FIELD:
+                lo = bisect_left(self._sorted, (_sort_key(datetime.min),))
+                hi = bisect_left(self._sorted, (_sort_key(cutoff),))
+                expired = [seq for _, seq in self._sorted[lo:hi]]
+            else:
+                expired = [
+                    seq for seq, doc in self._docs.items()
+                    if isinstance(_get(doc, field), datetime) and _naive_utc(_get(doc, field)) < cutoff
+                ]
+            for seq in expired:
+                self._remove(seq)
+
+    # query planning
+
+    def _candidates(self, query: dict) -> Iterable[int]:
+        """Sequence numbers that may match, narrowed through an index when possible."""
+        meter_type = query.get(HASH_INDEX_FIELD, _MISSING)
+        if meter_type is not _MISSING and not isinstance(meter_type, dict):
+            return list(self._hashed.get(meter_type, ()))
+        if "_id" in query and not isinstance(query["_id"], dict):
+            seq = self._by_id.get(query["_id"])
+            return [] if seq is None else [seq]
+        timestamp = query.get(SORTED_INDEX_FIELD, _MISSING)
+        if isinstance(timestamp, dict) and timestamp and set(timestamp) <= {"$gt", "$gte", "$lt", "$lte"}:
+            lo, hi = 0, len(self._sorted)
+            if "$gte" in timestamp:
+                lo = bisect_left(self._sorted, (_sort_key(timestamp["$gte"]),))
+            if "$gt" in timestamp:
+                lo = max(lo, bisect_right(self._sorted, (_sort_key(timestamp["$gt"]), float("inf"))))
+            if "$lt" in timestamp:
+                hi = bisect_left(self._sorted, (_sort_key(timestamp["$lt"]),))
+            if "$lte" in timestamp:
+                hi = min(hi, bisect_right(self._sorted, (_sort_key(timestamp["$lte"]), float("inf"))))
+            return [seq for _, seq in self._sorted[lo:hi]]
+        return list(self._docs)
+
+    def _iter_sorted(self, descending: bool) -> Iterator[Tuple[Any, int]]:
+        return reversed(self._sorted) if descending else iter(self._sorted)
+
+    def _select(self, query: dict, sort: List[Tuple[str, int]], limit: int = 0) -> List[dict]:
+        """Matching documents in sort order; at least ``limit`` of them when limited."""
+        fully_indexed = len(self._sorted) == len(self._docs)
+        if limit and sort and sort[0][0] == SORTED_INDEX_FIELD and fully_indexed:
+            # Walk the timestamp index and stop once the limit is reached and
+            # the timestamp changes, so ties can still be ordered by later keys.
+            picked: List[dict] = []
+            last_key = None
+            for key, seq in self._iter_sorted(sort[0][1] < 0):
+                if len(picked) >= limit and key != last_key:
+                    break
+                doc = self._docs[seq]
+                if matches(doc, query):
+                    picked.append(doc)
+                    last_key = key
+            _sort_docs(picked, sort)
+            return picked
+
+        docs = [self._docs[seq] for seq in self._candidates(query) if seq in self._docs]
+        docs = [doc for doc in docs if matches(doc, query)]
+        if sort:
+            _sort_docs(docs, sort)
+        else:
+            docs.sort(key=lambda doc: self._by_id[doc["_id"]])
+        return docs
+
+    def _first_seq(self, query: dict, sort: Optional[List[Tuple[str, int]]] = None) -> Optional[int]:
+        docs = self._select(query or {}, sort or [], 1)
+        return self._by_id[docs[0]["_id"]] if docs else None
+
+    # Motor API
+
+    async def insert_one(self, doc: dict, **_kwargs) -> InsertOneResult:
+        return InsertOneResult(self._store(doc), True)
+
+    async def insert_many(self, docs: Iterable[dict], ordered: bool = True, **_kwargs) -> InsertManyResult:
+        inserted: List[Any] = []
+        errors = []
+        for index, doc in enumerate(docs):
+            try:
+                inserted.append(self._store(doc))
+            except DuplicateKeyError as exc:
+                errors.append({"index": index, "code": 11000, "errmsg": str(exc), "op": doc})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({
+                "writeErrors": errors, "writeConcernErrors": [], "nInserted": len(inserted),
+                "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []
+            })
+        return InsertManyResult(inserted, True)
+
+    def find(self, filter: Optional[dict] = None, projection: Optional[dict] = None, **kwargs) -> MemoryCursor:
+        self._expire()
+        cursor = MemoryCursor(self, filter, projection)
+        if kwargs.get("sort"):
+            cursor.sort(kwargs["sort"])
+        if kwargs.get("limit"):
+            cursor.limit(kwargs["limit"])
+        return cursor
+
+    async def find_one(self, filter: Optional[dict] = None, projection: Optional[dict] = None, sort=None, **_kwargs):
+        self._expire()
+        seq = self._first_seq(filter, _normalize_sort(sort) if sort else None)
+        return None if seq is None else _project(self._docs[seq], projection)
+
+    async def count_documents(self, filter: Optional[dict] = None, **_kwargs) -> int:
+        self._expire()
+        if not filter:
+            return len(self._docs)
+        return sum(1 for seq in self._candidates(filter) if matches(self._docs[seq], filter))
+
+    async def estimated_document_count(self, **_kwargs) -> int:
+        self._expire()
+        return len(self._docs)
+
+    def _apply_update(self, doc: dict, update: dict) -> dict:
+        if not any(key.startswith("$") for key in update):
+            return dict(update)
+        doc = _clone(doc)
+        for op, fields in update.items():
+            for path, value in fields.items():
+                if op == "$set":
+                    _set(doc, path, _clone(value))
+                elif op == "$unset":
+                    _unset(doc, path)
+                elif op == "$inc":
+                    current = _get(doc, path)
+                    _set(doc, path, (0 if current is _MISSING else current) + value)
+                elif op == "$setOnInsert":
+                    continue
+                else:
+                    raise NotImplementedError(f"Update operator {op} is not supported by the memory store")
+        return doc
+
+    def _upsert_doc(self, query: dict, update: dict) -> dict:
+        base = {key: value for key, value in query.items() if not key.startswith("$") and not isinstance(value, dict)}
+        if any(key.startswith("$") for key in update):
+            doc = self._apply_update(base, update)
+            for path, value in update.get("$setOnInsert", {}).items():
+                _set(doc, path, _clone(value))
+            return doc
+        doc = dict(update)
+        if "_id" in base:
+            doc.setdefault("_id", base["_id"])
+        return doc
+
+    def _update(self, query: dict, update: dict, upsert: bool, many: bool) -> dict:
+        seqs = [seq for seq in self._candidates(query) if seq in self._docs and matches(self._docs[seq], query)]
+        if not many:
+            seqs = sorted(seqs)[:1]
+        result = {"n": len(seqs), "nModified": 0, "ok": 1.0, "updatedExisting": bool(seqs)}
+        for seq in seqs:
+            new_doc = self._apply_update(self._docs[seq], update)
+            new_doc["_id"] = self._docs[seq]["_id"]
+            if new_doc != self._docs[seq]:
+                self._replace(seq, new_doc)
+                result["nModified"] += 1
+        if not seqs and upsert:
+            result["upserted"] = self._store(self._upsert_doc(query, update))
+            result["n"] = 1
+        return result
+
+    async def replace_one(self, filter: dict, replacement: dict, upsert: bool = False, **_kwargs) -> UpdateResult:
+        return UpdateResult(self._update(filter, replacement, upsert, many=False), True)
+
+    async def update_one(self, filter: dict, update: dict, upsert: bool = False, **_kwargs) -> UpdateResult:
+        return UpdateResult(self._update(filter, update, upsert, many=False), True)
+
+    async def update_many(self, filter: dict, update: dict, upsert: bool = False, **_kwargs) -> UpdateResult:
+        return UpdateResult(self._update(filter, update, upsert, many=True), True)
+
+    def _delete(self, query: dict, many: bool) -> int:
+        if not query and many:
+            deleted = len(self._docs)
+            self._docs.clear()
+            self._by_id.clear()
+            self._sorted.clear()
+            self._hashed.clear()
+            for entries in self._unique.values():
+                entries.clear()
+            return deleted
+        seqs = sorted(seq for seq in self._candidates(query) if seq in self._docs and matches(self._docs[seq], query))
+        if not many:
+            seqs = seqs[:1]
+        for seq in seqs:
+            self._remove(seq)
+        return len(seqs)
+
+    async def delete_one(self, filter: dict, **_kwargs) -> DeleteResult:
+        return DeleteResult({"n": self._delete(filter, many=False), "ok": 1.0}, True)
+
+    async def delete_many(self, filter: dict, **_kwargs) -> DeleteResult:
+        return DeleteResult({"n": self._delete(filter, many=True), "ok": 1.0}, True)
+
+    async def bulk_write(self, requests: List[Any], ordered: bool = True, **_kwargs) -> BulkWriteResult:
+        totals = {
+            "writeErrors": [], "writeConcernErrors": [], "nInserted": 0, "nUpserted": 0,
+            "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []
+        }
+        for index, request in enumerate(requests):
+            try:
+                if isinstance(request, InsertOne):
+                    self._store(request._doc)
+                    totals["nInserted"] += 1
+                elif isinstance(request, (ReplaceOne, UpdateOne, UpdateMany)):
+                    result = self._update(
+                        request._filter, request._doc, bool(request._upsert), many=isinstance(request, UpdateMany)
+                    )
+                    if "upserted" in result:
+                        totals["nUpserted"] += 1
+                        totals["upserted"].append({"index": index, "_id": result["upserted"]})
+                    else:
+                        totals["nMatched"] += result["n"]
+                        totals["nModified"] += result["nModified"]
+                elif isinstance(request, (DeleteOne, DeleteMany)):
+                    totals["nRemoved"] += self._delete(request._filter, many=isinstance(request, DeleteMany))
+                else:
+                    raise NotImplementedError(f"{type(request).__name__} is not supported by the memory store")
+            except DuplicateKeyError as exc:
+                totals["writeErrors"].append({"index": index, "code": 11000, "errmsg": str(exc)})
+                if ordered:
+                    break
+        if totals["writeErrors"]:
+            raise BulkWriteError(totals)
+        return BulkWriteResult(totals, True)
+
+    def aggregate(self, pipeline: List[dict], **_kwargs) -> _ListCursor:
+        self._expire()
+        docs: Iterable[dict] = (self._docs[seq] for seq in sorted(self._docs))
+        if pipeline and "$match" in pipeline[0]:
+            query = pipeline[0]["$match"]
+            docs = [self._docs[seq] for seq in sorted(self._candidates(query)) if seq in self._docs]
+        return _ListCursor([_clone(doc) for doc in run_pipeline(docs, pipeline)])
+
+    async def create_index(
+        self, keys, unique: bool = False, name: Optional[str] = None, sparse: bool = False, **kwargs
+    ) -> str:
+        keys = _normalize_sort(keys)
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        self.indexes[name] = dict(kwargs, key=keys, unique=unique)
+        if sparse:
+            self.indexes[name]["sparse"] = True
+        if unique:
+            fields = tuple(field for field, _ in keys)
+            if fields not in self._unique:
+                if sparse:
+                    self._sparse.add(fields)
+                entries: Dict[tuple, int] = {}
+                for seq, doc in self._docs.items():
+                    key = self._unique_key(fields, doc)
+                    if key is None:
+                        continue
+                    if key in entries:
+                        raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {name}")
+                    entries[key] = seq
+                self._unique[fields] = entries
+        return name
+
+    async def index_information(self) -> Dict[str, dict]:
+        return dict(self.indexes)
+
+    async def drop_index(self, name: str) -> None:
+        index = self.indexes.pop(name, None)
+        if index is None:
+            raise OperationFailure(f"index not found with name [{name}]", code=27)
+        fields = tuple(field for field, _ in index["key"])
+        if index["unique"] and not any(
+            other["unique"] and tuple(field for field, _ in other["key"]) == fields for other in self.indexes.values()
+        ):
+            self._unique.pop(fields, None)
+            self._sparse.discard(fields)
+
+    async def drop(self) -> None:
+        self._delete({}, many=True)
+
+
+class MemoryDatabase:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._collections: Dict[str, MemoryCollection] = {}
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = MemoryCollection(name)
+        return collection
+
+    async def list_collection_names(self) -> List[str]:
+        return list(self._collections)
+
+    async def command(self, command, value=None, **kwargs) -> dict:
+        if command == "collMod" and "index" in kwargs:
+            options = dict(kwargs["index"])
+            index = self[value].indexes.get(options.pop("name", None))
+            if index is None:
+                raise OperationFailure("cannot find index", code=27)
+            index.update(options)
+        return {"ok": 1.0}
+
+
+class MemoryClient:
+    """Stand-in for ``AsyncIOMotorClient`` holding memory databases."""
+
+    def __init__(self) -> None:
+        self._databases: Dict[str, MemoryDatabase] = {}
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        database = self._databases.get(name)
+        if database is None:
+            database = self._databases[name] = MemoryDatabase(name)
+        return database
+
+    def close(self) -> None:
+        pass
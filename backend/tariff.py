@@ -0,0 +1,267 @@
+"""Compiled tariff tables for the electricity calculators.
+
+A rate schedule is compiled once into flat per-tier arrays (upper bounds,
+rates, cumulative kWh and cumulative cost) so that both directions of the
+conversion are a bisect lookup followed by a single arithmetic step.
+
+``DEFAULT_RATES`` is the single definition of the built-in schedule. The
+frontend's preview tables are generated from it (see ``build_frontend_tariff``)
+using ``CompiledSchedule.table()``, so client previews price exactly as the
+server does.
+"""
+
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+INFINITY = float('inf')
+
+# Per-row error codes returned by the batch calculators.
+ERROR_NON_POSITIVE_CONSUMPTION = "non_positive_consumption"
+ERROR_NON_POSITIVE_AMOUNT = "non_positive_amount"
+ERROR_INVALID_METER_TYPE = "invalid_meter_type"
+
+# Built-in schedule, used to seed the versioned schedules and the frontend.
+DEFAULT_RATES = {
+    "residential": [
+        {"min": 1, "max": 200, "rate": 2.19},
+        {"min": 201, "max": 400, "rate": 5.63},
+        {"min": 401, "max": 700, "rate": 8.13},
+        {"min": 701, "max": 2000, "rate": 11.25},
+        {"min": 2001, "max": INFINITY, "rate": 12.5}
+    ],
+    "commercial": {"rate": 16.25},
+    "factory": {"rate": 6.75}
+}
+
+
+def _tier_label(lower, upper) -> str:
+    return f"{lower}-{upper if upper != INFINITY else '∞'}"
+
+
+class CompiledSchedule:
+    """Prefix-sum table for one meter type.
+
+    ``bounds[i]``/``bounds[i + 1]`` are the cumulative kWh at the start/end of
+    tier ``i`` and ``costs[i]`` the cumulative cost of every tier before it.
+    """
+
+    __slots__ = (
+        "labels", "rates", "widths", "bounds", "costs", "_full_breakdown",
+        "_rates_array", "_bounds_array", "_costs_array"
+    )
+
+    def __init__(self, tiers: List[dict]):
+        self.labels: List[str] = []
+        self.rates: List[float] = []
+        self.widths: List[float] = []
+        self.bounds: List[float] = [0]
+        self.costs: List[float] = [0]
+        self._full_breakdown: List[dict] = []
+
+        for tier in tiers:
+            width = INFINITY if tier["max"] == INFINITY else tier["max"] - tier["min"] + 1
+            label = _tier_label(tier["min"], tier["max"])
+            self.labels.append(label)
+            self.rates.append(tier["rate"])
+            self.widths.append(width)
+            self.bounds.append(self.bounds[-1] + width)
+            if width == INFINITY:
+                break
+            full_cost = width * tier["rate"]
+            self.costs.append(self.costs[-1] + full_cost)
+            self._full_breakdown.append({
+                "tier": label,
+                "usage": width,
+                "rate": tier["rate"],
+                "cost": full_cost
+            })
+
+        self._rates_array = np.array(self.rates, dtype=np.float64)
+        self._bounds_array = np.array(self.bounds, dtype=np.float64)
+        self._costs_array = np.array(self.costs, dtype=np.float64)
+
+    @classmethod
+    def from_rate_spec(cls, spec) -> "CompiledSchedule":
+        """Compile either a tier list or a ``{"rate": x}`` flat-rate entry."""
+        if isinstance(spec, dict):
+            return cls([{"min": 0, "max": INFINITY, "rate": spec["rate"]}])
+        return cls(spec)
+
+    def table(self) -> dict:
+        """The compiled arrays as JSON-safe lists, with None for an infinite bound."""
+        def finite(values):
+            return [None if value == INFINITY else value for value in values]
+
+        return {
+            "labels": list(self.labels),
+            "rates": list(self.rates),
+            "widths": finite(self.widths),
+            "bounds": finite(self.bounds),
+            "costs": list(self.costs)
+        }
+
+    def cost(self, kw: float) -> dict:
+        """Price ``kw`` of consumption and return the total and tier breakdown."""
+        if kw <= 0:
+            return {"total_cost": 0, "breakdown": []}
+
+        # Last tier touched by this consumption; every tier before it is full.
+        index = bisect_left(self.bounds, kw) - 1
+        if index >= len(self.rates):
+            # Schedule without an open-ended tier: usage past the end is unbilled.
+            return {
+                "total_cost": self.costs[-1],
+                "breakdown": [dict(entry) for entry in self._full_breakdown]
+            }
+        usage = kw - self.bounds[index]
+        rate = self.rates[index]
+        tier_cost = usage * rate
+
+        breakdown = [dict(entry) for entry in self._full_breakdown[:index]]
+        breakdown.append({
+            "tier": self.labels[index],
+            "usage": usage,
+            "rate": rate,
+            "cost": tier_cost
+        })
+        return {"total_cost": self.costs[index] + tier_cost, "breakdown": breakdown}
+
+    def kw_for_amount(self, amount: float) -> float:
+        """Return how many kWh ``amount`` buys under this schedule."""
+        if amount <= 0:
+            return 0
+
+        index = bisect_right(self.costs, amount) - 1
+        if index >= len(self.rates):
+            return self.bounds[-1]
+        return self.bounds[index] + (amount - self.costs[index]) / self.rates[index]
+
+    def cost_array(self, kw: np.ndarray) -> np.ndarray:
+        """Vectorized ``cost()`` total for an array of positive consumptions."""
+        last = len(self.rates) - 1
+        index = np.searchsorted(self._bounds_array, kw, side="left") - 1
+        clipped = np.minimum(index, last)
+        total = self._costs_array[clipped] + (kw - self._bounds_array[clipped]) * self._rates_array[clipped]
+        return np.where(index > last, self._costs_array[-1], total)
+
+    def breakdown_array(self, kw: np.ndarray) -> List[List[dict]]:
+        """``cost()`` breakdowns for an array of positive consumptions."""
+        last = len(self.rates) - 1
+        index = np.searchsorted(self._bounds_array, kw, side="left") - 1
+        breakdowns = []
+        for tier, value in zip(index.tolist(), kw.tolist()):
+            breakdown = [dict(entry) for entry in self._full_breakdown[:tier]]
+            if tier <= last:
+                usage = value - self.bounds[tier]
+                breakdown.append({
+                    "tier": self.labels[tier],
+                    "usage": usage,
+                    "rate": self.rates[tier],
+                    "cost": usage * self.rates[tier]
+                })
+            breakdowns.append(breakdown)
+        return breakdowns
+
+    def kw_for_amount_array(self, amount: np.ndarray) -> np.ndarray:
+        """Vectorized ``kw_for_amount()`` for an array of positive amounts."""
+        last = len(self.rates) - 1
+        index = np.searchsorted(self._costs_array, amount, side="right") - 1
+        clipped = np.minimum(index, last)
+        kw = self._bounds_array[clipped] + (amount - self._costs_array[clipped]) / self._rates_array[clipped]
+        return np.where(index > last, self._bounds_array[-1], kw)
+
+
+class TariffEngine:
+    """Holds one compiled schedule per meter type."""
+
+    def __init__(self, rates: Dict[str, object]):
+        self.schedules: Dict[str, CompiledSchedule] = {
+            meter_type: CompiledSchedule.from_rate_spec(spec)
+            for meter_type, spec in rates.items()
+        }
+
+    def schedule(self, meter_type: str) -> Optional[CompiledSchedule]:
+        return self.schedules.get(meter_type)
+
+    def kw_to_money(self, meter_type: str, kw: float) -> Optional[dict]:
+        """Return ``{"total_cost", "breakdown"}`` or None for an unknown meter type."""
+        schedule = self.schedules.get(meter_type)
+        if schedule is None:
+            return None
+        return schedule.cost(kw)
+
+    def money_to_kw(self, meter_type: str, amount: float) -> Optional[float]:
+        """Return the unrounded kWh for ``amount`` or None for an unknown meter type."""
+        schedule = self.schedules.get(meter_type)
+        if schedule is None:
+            return None
+        return schedule.kw_for_amount(amount)
+
+    def _group_rows(self, meter_types: Sequence[str], valid: np.ndarray):
+        """Yield ``(schedule, row_mask)`` per known meter type among valid rows."""
+        types = np.asarray(meter_types, dtype=object)
+        for meter_type in set(meter_types):
+            schedule = self.schedules.get(meter_type)
+            if schedule is None:
+                continue
+            mask = valid & (types == meter_type)
+            if mask.any():
+                yield schedule, mask
+
+    def _row_errors(self, meter_types: Sequence[str], positive: np.ndarray, non_positive_code: str):
+        errors: List[Optional[str]] = [None] * len(meter_types)
+        for row, (meter_type, ok) in enumerate(zip(meter_types, positive.tolist())):
+            if not ok:
+                errors[row] = non_positive_code
+            elif meter_type not in self.schedules:
+                errors[row] = ERROR_INVALID_METER_TYPE
+        return errors
+
+    def kw_to_money_batch(
+        self,
+        meter_types: Sequence[str],
+        previous_readings: Sequence[float],
+        current_readings: Sequence[float]
+    ) -> dict:
+        """Price many readings at once.
+
+        Returns column lists ``consumption``, ``total_cost`` and ``error``;
+        rows with an error code have a null ``total_cost``.
+        """
+        consumption = np.asarray(current_readings, dtype=np.float64) - np.asarray(previous_readings, dtype=np.float64)
+        errors = self._row_errors(meter_types, consumption > 0, ERROR_NON_POSITIVE_CONSUMPTION)
+        valid = np.array([error is None for error in errors], dtype=bool)
+
+        total_cost = np.full(consumption.shape, np.nan)
+        for schedule, mask in self._group_rows(meter_types, valid):
+            total_cost[mask] = schedule.cost_array(consumption[mask])
+
+        costs = total_cost.tolist()
+        return {
+            "consumption": consumption.tolist(),
+            "total_cost": [None if error else cost for cost, error in zip(costs, errors)],
+            "error": errors
+        }
+
+    def money_to_kw_batch(self, meter_types: Sequence[str], amounts: Sequence[float]) -> dict:
+        """Convert many amounts at once.
+
+        Returns column lists ``amount``, ``total_kw`` (rounded to 2 places like
+        the single-row endpoint) and ``error``.
+        """
+        amount = np.asarray(amounts, dtype=np.float64)
+        errors = self._row_errors(meter_types, amount > 0, ERROR_NON_POSITIVE_AMOUNT)
+        valid = np.array([error is None for error in errors], dtype=bool)
+
+        total_kw = np.full(amount.shape, np.nan)
+        for schedule, mask in self._group_rows(meter_types, valid):
+            total_kw[mask] = schedule.kw_for_amount_array(amount[mask])
+
+        kws = total_kw.tolist()
+        return {
+            "amount": amount.tolist(),
+            "total_kw": [None if error else round(kw, 2) for kw, error in zip(kws, errors)],
+            "error": errors
+        }
@@ -0,0 +1,102 @@
+"""Optional write-behind buffering for document inserts.
+
+Routes enqueue documents instead of awaiting a database round trip; a
+background task drains the queue and writes with ``insert_many`` once a
+batch is full or the flush interval elapses. The queue is bounded, so when
+the database falls behind ``enqueue`` blocks and applies backpressure to the
+callers instead of growing memory.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from typing import List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# Sentinel pushed by ``close`` to make the flusher drain and exit.
+_STOP = object()
+
+
+class WriteBehindBuffer:
+    """Bounded asyncio queue flushed to Mongo in batches by a background task."""
+
+    def __init__(self, max_queue: int = 10000, batch_size: int = 500, flush_interval: float = 0.05) -> None:
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def enqueue(self, collection, doc: dict) -> None:
+        """Queue ``doc`` for ``collection``, waiting while the queue is full."""
+        await self._queue.put((collection, doc))
+        self.queued += 1
+
+    async def close(self) -> None:
+        """Flush everything still queued and stop the background task."""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch: List[Tuple[object, dict]] = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write(batch)
+
+    async def _write(self, batch: List[Tuple[object, dict]]) -> None:
+        by_collection = defaultdict(list)
+        for collection, doc in batch:
+            by_collection[collection].append(doc)
+
+        for collection, docs in by_collection.items():
+            try:
+                await collection.insert_many(docs, ordered=False)
+                self.flushed += len(docs)
+            except BulkWriteError as exc:
+                inserted = exc.details.get("nInserted", 0)
+                self.flushed += inserted
+                self.dropped += len(docs) - inserted
+                logger.error("Write-behind flush dropped %d documents", len(docs) - inserted)
+            except Exception:
+                # Keep the flusher alive; failed records are counted, not retried.
+                self.dropped += len(docs)
+                logger.exception("Write-behind flush of %d documents failed", len(docs))
@@ -0,0 +1,310 @@
+"""Micro and load benchmarks for the FastAPI backend.
+
+Runs fully offline: the app is driven in-process through an ASGI transport
+and storage uses the in-memory backend (``STORAGE_BACKEND=memory``).
+Results are written as JSON so runs from different commits can be compared
+with ``--compare``.
+
+Usage:
+    python benchmarks/bench_backend.py [micro|serialization|load|all] [--concurrency 32]
+        [--requests 2000] [--output results.json] [--compare baseline.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "backend"))
+
+# Use the in-process store so the suite runs without MongoDB.
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ.setdefault("DB_NAME", "benchmark")
+# Keep admission control in the request path but never let it reject.
+os.environ.setdefault("RATE_LIMIT_PER_SECOND", "1e9")
+os.environ.setdefault("RATE_LIMIT_BURST", "1e9")
+os.environ.setdefault("MAX_CONCURRENT_REQUESTS", "100000")
+
+import httpx  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+
+import server  # noqa: E402
+
+# Per-request client logging would dominate the in-process timings.
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+# --- micro benchmarks -------------------------------------------------------
+
+DISTRIBUTIONS: Dict[str, Callable[[random.Random], float]] = {
+    "household": lambda rng: rng.lognormvariate(5.3, 0.6),
+    "uniform_0_3000": lambda rng: rng.uniform(0.01, 3000),
+    "tier_boundaries": lambda rng: float(rng.choice([200, 400, 700, 2000, 2001])),
+    "industrial": lambda rng: rng.uniform(5000, 200000)
+}
+
+
+def _time_per_call(func: Callable[[float], object], values: List[float], repeats: int) -> dict:
+    runs = []
+    for _ in range(repeats):
+        started = time.perf_counter_ns()
+        for value in values:
+            func(value)
+        runs.append((time.perf_counter_ns() - started) / len(values))
+    return {"ns_per_call_median": round(statistics.median(runs), 1), "ns_per_call_min": round(min(runs), 1)}
+
+
+def run_micro(samples: int, repeats: int, seed: int) -> dict:
+    engine = server.rate_schedules.at().engine
+    commercial_rate = server.rate_schedules.at().rates["commercial"]["rate"]
+    functions: Dict[str, Callable[[float], object]] = {
+        "calculate_residential_cost": server.calculate_residential_cost,
+        "calculate_flat_rate_cost": lambda kw: server.calculate_flat_rate_cost(kw, commercial_rate),
+        "money_to_kw_residential": lambda amount: engine.money_to_kw("residential", amount)
+    }
+
+    results: Dict[str, dict] = {}
+    for dist_name, draw in DISTRIBUTIONS.items():
+        rng = random.Random(seed)
+        values = [draw(rng) for _ in range(samples)]
+        for func_name, func in functions.items():
+            inputs = values
+            if func_name.startswith("money_to_kw"):
+                # Feed amounts of the same magnitude as the consumption bills.
+                inputs = [server.calculate_residential_cost(value)["total_cost"] for value in values]
+            results[f"{func_name}[{dist_name}]"] = _time_per_call(func, inputs, repeats)
+    return results
+
+
+# --- serialization benchmarks ----------------------------------------------
+
+def _calculation_page(size: int, rng: random.Random) -> List[dict]:
+    page = []
+    for _ in range(size):
+        kw = rng.uniform(1, 3000)
+        result = server.calculate_residential_cost(kw)
+        doc = server.ElectricityCalculation(
+            calculation_type="kw_to_money", meter_type="residential", previous_reading=0,
+            current_reading=kw, consumption=kw, total_cost=result["total_cost"], breakdown=result["breakdown"]
+        ).dict()
+        # Stored timestamps have millisecond precision, as in Mongo.
+        doc["timestamp"] = doc["timestamp"].replace(microsecond=doc["timestamp"].microsecond // 1000 * 1000)
+        page.append(doc)
+    return page
+
+
+def run_serialization(repeats: int, seed: int, page_size: int = 1000) -> dict:
+    """CPU time to encode one ``GET /api/calculations?limit=1000`` page.
+
+    ``revalidate_json`` is the previous path (model per document, then
+    ``jsonable_encoder`` and the stdlib encoder); ``orjson_passthrough``
+    serializes the stored documents directly.
+    """
+    page = _calculation_page(page_size, random.Random(seed))
+    paths: Dict[str, Callable[[], bytes]] = {
+        "revalidate_json": lambda: JSONResponse(
+            jsonable_encoder([server.ElectricityCalculation(**doc) for doc in page])
+        ).body,
+        "orjson_passthrough": lambda: ORJSONResponse(page).body
+    }
+    results: Dict[str, dict] = {}
+    for name, encode in paths.items():
+        runs = []
+        for _ in range(repeats):
+            started = time.process_time()
+            for _ in range(10):
+                encode()
+            runs.append((time.process_time() - started) / 10 * 1000)
+        results[f"{name}[limit={page_size}]"] = {
+            "cpu_ms_per_request_median": round(statistics.median(runs), 3),
+            "cpu_ms_per_request_min": round(min(runs), 3)
+        }
+    old, new = (results[f"{name}[limit={page_size}]"]["cpu_ms_per_request_median"] for name in paths)
+    results["speedup"] = round(old / new, 2) if new else None
+    return results
+
+
+# --- load benchmarks --------------------------------------------------------
+
+def _scenarios(rng: random.Random) -> Dict[str, Callable[[], dict]]:
+    calculation = {
+        "calculation_type": "kw_to_money",
+        "meter_type": "residential",
+        "previous_reading": 100,
+        "current_reading": 350,
+        "consumption": 250,
+        "total_cost": 719.5
+    }
+    batch_size = 1000
+    batch = {
+        "meter_type": [rng.choice(["residential", "commercial", "factory"]) for _ in range(batch_size)],
+        "previous_reading": [0.0] * batch_size,
+        "current_reading": [rng.uniform(1, 3000) for _ in range(batch_size)]
+    }
+    return {
+        "POST /api/calculate/kw-to-money": lambda: {
+            "method": "POST", "url": "/api/calculate/kw-to-money",
+            "params": {"meter_type": "residential", "previous_reading": 0, "current_reading": rng.uniform(1, 3000)}
+        },
+        "POST /api/calculate/money-to-kw": lambda: {
+            "method": "POST", "url": "/api/calculate/money-to-kw",
+            "params": {"meter_type": "residential", "amount": rng.uniform(1, 30000)}
+        },
+        "POST /api/calculate/kw-to-money/batch[1000]": lambda: {
+            "method": "POST", "url": "/api/calculate/kw-to-money/batch", "json": batch
+        },
+        "POST /api/calculate": lambda: {"method": "POST", "url": "/api/calculate", "json": calculation},
+        "GET /api/calculations?limit=100": lambda: {
+            "method": "GET", "url": "/api/calculations", "params": {"limit": 100}
+        },
+        "GET /api/calculations?limit=1000": lambda: {
+            "method": "GET", "url": "/api/calculations", "params": {"limit": 1000}
+        },
+        "GET /api/rates": lambda: {"method": "GET", "url": "/api/rates"}
+    }
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def _drive(client: httpx.AsyncClient, make_request: Callable[[], dict], total: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    remaining = total
+
+    async def worker() -> None:
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            request = make_request()
+            started = time.perf_counter()
+            response = await client.request(**request)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 0.50), 3),
+            "p90": round(_percentile(latencies, 0.90), 3),
+            "p99": round(_percentile(latencies, 0.99), 3),
+            "max": round(latencies[-1], 3)
+        }
+    }
+
+
+async def run_load(total: int, concurrency: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    transport = httpx.ASGITransport(app=server.app)
+    results: Dict[str, dict] = {}
+    # ASGITransport does not send lifespan events, so run the app's lifespan here.
+    async with server.app.router.lifespan_context(server.app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Seed history so list queries have something to return.
+        for _ in range(1000):
+            await client.post("/api/calculate", json={"calculation_type": "kw_to_money", "meter_type": "factory", "consumption": 10})
+        for name, make_request in _scenarios(rng).items():
+            results[name] = await _drive(client, make_request, total, concurrency)
+        results["_stored_calculations"] = await server.db.electricity_calculations.count_documents({})
+    return results
+
+
+# --- reporting --------------------------------------------------------------
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: dict, baseline: dict) -> List[str]:
+    """Human-readable ratios (current / baseline) for matching benchmarks."""
+    lines = []
+    for name, result in current.get("micro", {}).items():
+        base = baseline.get("micro", {}).get(name)
+        if base:
+            ratio = result["ns_per_call_median"] / base["ns_per_call_median"]
+            lines.append(f"micro {name}: {ratio:.2f}x time")
+    for name, result in current.get("serialization", {}).items():
+        base = baseline.get("serialization", {}).get(name)
+        if isinstance(result, dict) and base:
+            ratio = result["cpu_ms_per_request_median"] / base["cpu_ms_per_request_median"]
+            lines.append(f"serialization {name}: {ratio:.2f}x cpu")
+    for name, result in current.get("load", {}).items():
+        base = baseline.get("load", {}).get(name)
+        if isinstance(result, dict) and base:
+            ratio = result["latency_ms"]["p99"] / base["latency_ms"]["p99"]
+            lines.append(f"load {name}: {ratio:.2f}x p99, {result['throughput_rps'] / base['throughput_rps']:.2f}x rps")
+    return lines
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("suite", nargs="?", choices=["micro", "serialization", "load", "all"], default="all")
+    parser.add_argument("--samples", type=int, default=20000, help="inputs per micro benchmark")
+    parser.add_argument("--repeats", type=int, default=5, help="timed passes per micro benchmark")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per load scenario")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent in-flight requests")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON results to compare against")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "args": vars(args)
+        }
+    }
+    if args.suite in ("micro", "all"):
+        report["micro"] = run_micro(args.samples, args.repeats, args.seed)
+    if args.suite in ("serialization", "all"):
+        report["serialization"] = run_serialization(args.repeats, args.seed)
+    if args.suite in ("load", "all"):
+        report["load"] = asyncio.run(run_load(args.requests, args.concurrency, args.seed))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        for line in compare(report, baseline):
+            print(line, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,5 +1,12 @@
 import React, { useState, useEffect } from 'react';
+import axios from 'axios';
 import './App.css';
+import { TARIFF_VERSION, kwToMoney, moneyToKw } from './tariff.generated';
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+// How often the rate schedule in force is compared with the generated tables
+const RATE_CHECK_INTERVAL_MS = 5 * 60 * 1000;
 
 // Translations object with manual translations
 const translations = {
@@ -116,19 +123,6 @@ const translations = {
   }
 };
 
-// Rate configurations
-const rates = {
-  residential: [
-    { min: 1, max: 200, rate: 2.19 },
-    { min: 201, max: 400, rate: 5.63 },
-    { min: 401, max: 700, rate: 8.13 },
-    { min: 701, max: 2000, rate: 11.25 },
-    { min: 2001, max: Infinity, rate: 12.5 }
-  ],
-  commercial: { rate: 16.25 },
-  factory: { rate: 6.75 }
-};
-
 function App() {
   const [isLoggedIn, setIsLoggedIn] = useState(false);
   const [password, setPassword] = useState('');
@@ -150,6 +144,20 @@ function App() {
   });
   
   const [history, setHistory] = useState([]);
+  // True once the server prices with a schedule newer than the generated tables
+  const [serverPricing, setServerPricing] = useState(false);
+
+  useEffect(() => {
+    if (!BACKEND_URL) return undefined;
+    const checkRateVersion = () => {
+      axios.get(`${API}/rates`)
+        .then((response) => setServerPricing(response.headers['x-rate-version'] !== String(TARIFF_VERSION)))
+        .catch(() => {});
+    };
+    checkRateVersion();
+    const timer = setInterval(checkRateVersion, RATE_CHECK_INTERVAL_MS);
+    return () => clearInterval(timer);
+  }, []);
 
   useEffect(() => {
     const savedData = localStorage.getItem('electricityMeterData');
@@ -181,58 +189,22 @@ function App() {
     }
   };
 
-  const calculateResidentialCost = (kw) => {
-    let totalCost = 0;
-    let remainingKw = kw;
-    const breakdown = [];
-
-    for (const tier of rates.residential) {
-      if (remainingKw <= 0) break;
-      
-      const tierUsage = Math.min(remainingKw, tier.max - tier.min + 1);
-      if (tierUsage > 0) {
-        const tierCost = tierUsage * tier.rate;
-        totalCost += tierCost;
-        breakdown.push({
-          tier: `${tier.min}-${tier.max === Infinity ? '∞' : tier.max}`,
-          usage: tierUsage,
-          rate: tier.rate,
-          cost: tierCost
-        });
-        remainingKw -= tierUsage;
+  // Price through the API; used while the generated tables are out of date
+  const priceOnServer = async (path, params) => {
+    try {
+      const response = await axios.post(`${API}/calculate/${path}`, null, { params });
+      if (response.data.error) {
+        alert(response.data.error);
+        return null;
       }
+      return response.data;
+    } catch (error) {
+      alert('Could not reach the server to price this calculation');
+      return null;
     }
-
-    return { totalCost, breakdown };
-  };
-
-  const calculateCommercialCost = (kw) => {
-    const totalCost = kw * rates.commercial.rate;
-    return { 
-      totalCost, 
-      breakdown: [{ 
-        tier: '0-∞', 
-        usage: kw, 
-        rate: rates.commercial.rate, 
-        cost: totalCost 
-      }] 
-    };
-  };
-
-  const calculateFactoryCost = (kw) => {
-    const totalCost = kw * rates.factory.rate;
-    return { 
-      totalCost, 
-      breakdown: [{ 
-        tier: '0-∞', 
-        usage: kw, 
-        rate: rates.factory.rate, 
-        cost: totalCost 
-      }] 
-    };
   };
 
-  const calculateKwToMoney = () => {
+  const calculateKwToMoney = async () => {
     const prevReading = parseFloat(kwToMoneyData.previousReading) || 0;
     const currReading = parseFloat(kwToMoneyData.currentReading) || 0;
     const consumption = currReading - prevReading;
@@ -243,19 +215,18 @@ function App() {
     }
 
     let result;
-    switch (currentType) {
-      case 'residential':
-        result = calculateResidentialCost(consumption);
-        break;
-      case 'commercial':
-        result = calculateCommercialCost(consumption);
-        break;
-      case 'factory':
-        result = calculateFactoryCost(consumption);
-        break;
-      default:
-        return;
+    if (serverPricing) {
+      const data = await priceOnServer('kw-to-money', {
+        meter_type: currentType,
+        previous_reading: prevReading,
+        current_reading: currReading
+      });
+      result = data && { totalCost: data.total_cost, breakdown: data.breakdown };
+    } else {
+      // Priced locally with the tables generated from the backend tariff
+      result = kwToMoney(currentType, consumption);
     }
+    if (!result) return;
 
     const calculationResult = {
       consumption,
@@ -276,37 +247,18 @@ function App() {
     saveToLocalStorage();
   };
 
-  const calculateMoneyToKw = () => {
+  const calculateMoneyToKw = async () => {
     const amount = parseFloat(moneyToKwData.amount) || 0;
     if (amount <= 0) return;
 
-    let totalKw = 0;
-
-    switch (currentType) {
-      case 'residential':
-        let remainingAmount = amount;
-        for (const tier of rates.residential) {
-          if (remainingAmount <= 0) break;
-          
-          const tierRange = tier.max === Infinity ? Infinity : tier.max - tier.min + 1;
-          const maxTierCost = tierRange === Infinity ? Infinity : tierRange * tier.rate;
-          
-          if (remainingAmount >= maxTierCost && tierRange !== Infinity) {
-            totalKw += tierRange;
-            remainingAmount -= maxTierCost;
-          } else {
-            totalKw += remainingAmount / tier.rate;
-            break;
-          }
-        }
-        break;
-      case 'commercial':
-        totalKw = amount / rates.commercial.rate;
-        break;
-      case 'factory':
-        totalKw = amount / rates.factory.rate;
-        break;
+    let totalKw;
+    if (serverPricing) {
+      const data = await priceOnServer('money-to-kw', { meter_type: currentType, amount });
+      totalKw = data ? data.total_kw : null;
+    } else {
+      totalKw = moneyToKw(currentType, amount);
     }
+    if (totalKw === null) return;
 
     setMoneyToKwData({
       ...moneyToKwData,
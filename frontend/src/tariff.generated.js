@@ -0,0 +1,83 @@
+// Generated by backend/build_frontend_tariff.py from tariff.DEFAULT_RATES.
+// Do not edit by hand: change the backend schedule and regenerate.
+
+// Rate schedule version of these tables; compare with X-Rate-Version from /api/rates.
+export const TARIFF_VERSION = 1;
+
+export const TARIFF_TABLES = {
+  "residential": {
+    "labels": ["1-200", "201-400", "401-700", "701-2000", "2001-∞"],
+    "rates": [2.19, 5.63, 8.13, 11.25, 12.5],
+    "widths": [200, 200, 300, 1300, null],
+    "bounds": [0, 200, 400, 700, 2000, null],
+    "costs": [0, 438.0, 1564.0, 4003.0000000000005, 18628.0]
+  },
+  "commercial": {
+    "labels": ["0-∞"],
+    "rates": [16.25],
+    "widths": [null],
+    "bounds": [0, null],
+    "costs": [0]
+  },
+  "factory": {
+    "labels": ["0-∞"],
+    "rates": [6.75],
+    "widths": [null],
+    "bounds": [0, null],
+    "costs": [0]
+  }
+};
+
+const bound = (value) => (value === null ? Infinity : value);
+
+// Python's bisect_left/bisect_right over a sorted table column.
+const bisect = (values, x, right) => {
+  let lo = 0;
+  let hi = values.length;
+  while (lo < hi) {
+    const mid = (lo + hi) >> 1;
+    const v = bound(values[mid]);
+    if (v < x || (right && v === x)) lo = mid + 1;
+    else hi = mid;
+  }
+  return lo;
+};
+
+const fullTier = (table, i) => ({
+  tier: table.labels[i],
+  usage: table.widths[i],
+  rate: table.rates[i],
+  cost: table.widths[i] * table.rates[i]
+});
+
+// Price ``kw`` with one compiled table; mirrors CompiledSchedule.cost.
+export const priceKw = (table, kw) => {
+  if (kw <= 0) return { totalCost: 0, breakdown: [] };
+  const index = bisect(table.bounds, kw, false) - 1;
+  const full = Math.min(index, table.rates.length);
+  const breakdown = [];
+  for (let i = 0; i < full; i++) breakdown.push(fullTier(table, i));
+  if (index >= table.rates.length) {
+    return { totalCost: table.costs[table.costs.length - 1], breakdown };
+  }
+  const usage = kw - table.bounds[index];
+  const rate = table.rates[index];
+  const tierCost = usage * rate;
+  breakdown.push({ tier: table.labels[index], usage, rate, cost: tierCost });
+  return { totalCost: table.costs[index] + tierCost, breakdown };
+};
+
+// kWh bought by ``amount`` with one compiled table; mirrors CompiledSchedule.kw_for_amount.
+export const kwForAmount = (table, amount) => {
+  if (amount <= 0) return 0;
+  const index = bisect(table.costs, amount, true) - 1;
+  if (index >= table.rates.length) return bound(table.bounds[table.bounds.length - 1]);
+  return table.bounds[index] + (amount - table.costs[index]) / table.rates[index];
+};
+
+// Returns null for an unknown meter type, like the API.
+export const kwToMoney = (meterType, kw) =>
+  TARIFF_TABLES[meterType] ? priceKw(TARIFF_TABLES[meterType], kw) : null;
+
+export const moneyToKw = (meterType, amount) =>
+  TARIFF_TABLES[meterType] ? kwForAmount(TARIFF_TABLES[meterType], amount) : null;
@@ -0,0 +1,29 @@
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+# The backend is run from its own directory and uses flat imports.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# API tests run against the in-process store, without rate limiting.
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("ADMISSION_ENABLED", "false")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def client():
+    """API client over a fresh in-memory database for each test."""
+    import server
+
+    async with server.lifespan(server.app):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as api:
+            yield api
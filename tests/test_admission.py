@@ -0,0 +1,124 @@
+"""Token buckets, client identification and the admission middleware."""
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+import admission
+from admission import AdmissionController, AdmissionMiddleware
+
+pytestmark = pytest.mark.anyio
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    return clock
+
+
+def test_bucket_allows_burst_then_refills(clock):
+    controller = AdmissionController(rate=2, burst=3, max_concurrent=10)
+    assert [controller.admit("GET /api/calculations", "a") for _ in range(3)] == [None] * 3
+    assert controller.admit("GET /api/calculations", "a") == (429, "rate_limited", 1)
+    # Other clients have buckets of their own.
+    assert controller.admit("GET /api/calculations", "b") is None
+
+    clock.now += 0.5
+    assert controller.admit("GET /api/calculations", "a") is None
+    assert controller.admit("GET /api/calculations", "a") is not None
+
+    # Refill is capped at the burst size.
+    clock.now += 60
+    assert [controller.admit("GET /api/calculations", "a") for _ in range(4)][-1] is not None
+
+
+def test_clearing_history_is_allowed_once_a_minute(clock):
+    controller = AdmissionController(rate=1000, burst=1000, max_concurrent=10)
+    assert controller.admit("DELETE /api/calculations", "a") is None
+    status, reason, retry_after = controller.admit("DELETE /api/calculations", "a")
+    assert (status, reason) == (429, "rate_limited") and 59 <= retry_after <= 60
+    clock.now += 60
+    assert controller.admit("DELETE /api/calculations", "a") is None
+
+
+def test_route_limits_override_defaults(clock):
+    controller = AdmissionController(
+        rate=1000, burst=1000, max_concurrent=10, route_limits={"POST /api/calculate": {"rate": 1, "burst": 1}}
+    )
+    assert controller.admit("POST /api/calculate", "a") is None
+    assert controller.admit("POST /api/calculate", "a")[1] == "rate_limited"
+    assert controller.admit("GET /api/rates", "a") is None
+
+
+def test_saturated_write_path_sheds_writes_only():
+    controller = AdmissionController(rate=1000, burst=1000, max_concurrent=10, saturated=lambda: True)
+    assert controller.admit("POST /api/calculate", "a") == (503, "saturated", 1)
+    assert controller.admit("GET /api/calculations", "a") is None
+
+
+def test_only_allow_listed_api_keys_identify_clients():
+    controller = AdmissionController.from_env({"ADMISSION_API_KEYS": "alpha, beta"})
+    assert controller.client("1.2.3.4", "alpha", None) == "key:alpha"
+    assert controller.client("1.2.3.4", "invented", None) == "1.2.3.4"
+    assert controller.client(None, None, None) == "unknown"
+
+
+def test_forwarded_for_is_trusted_from_listed_proxies_only():
+    controller = AdmissionController.from_env({"TRUSTED_PROXIES": "10.0.0.1,10.0.0.2"})
+    assert controller.client("1.2.3.4", None, "9.9.9.9") == "1.2.3.4"
+    assert controller.client("10.0.0.1", None, "9.9.9.9") == "9.9.9.9"
+    # The right-most untrusted hop wins; earlier entries can be forged.
+    assert controller.client("10.0.0.1", None, "6.6.6.6, 9.9.9.9, 10.0.0.2") == "9.9.9.9"
+    assert controller.client("10.0.0.1", None, " , ") == "10.0.0.1"
+
+
+def limited_app(controller):
+    app = FastAPI()
+
+    @app.get("/api/")
+    async def health():
+        return {}
+
+    @app.delete("/api/calculations")
+    async def clear():
+        return {}
+
+    app.add_middleware(AdmissionMiddleware, controller=controller, routes_app=app)
+    return app
+
+
+async def call(app, method, path, peer="1.2.3.4", headers=None):
+    transport = httpx.ASGITransport(app=app, client=(peer, 1234))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.request(method, path, headers=headers)
+
+
+async def test_middleware_rejects_with_retry_after(clock):
+    app = limited_app(AdmissionController(rate=1000, burst=1000, max_concurrent=10))
+    assert (await call(app, "DELETE", "/api/calculations")).status_code == 200
+    response = await call(app, "DELETE", "/api/calculations")
+    assert response.status_code == 429 and int(response.headers["retry-after"]) >= 1
+    # Invented keys do not buy a fresh bucket.
+    response = await call(app, "DELETE", "/api/calculations", headers={"X-API-Key": "new"})
+    assert response.status_code == 429
+    # Exempt routes are never limited.
+    assert (await call(app, "GET", "/api/")).status_code == 200
+
+
+async def test_middleware_keys_forwarded_clients_behind_trusted_proxy(clock):
+    controller = AdmissionController.from_env({"TRUSTED_PROXIES": "10.0.0.1"})
+    app = limited_app(controller)
+    for client in ("5.5.5.1", "5.5.5.2"):
+        response = await call(app, "DELETE", "/api/calculations", peer="10.0.0.1", headers={"X-Forwarded-For": client})
+        assert response.status_code == 200
+    response = await call(app, "DELETE", "/api/calculations", peer="10.0.0.1", headers={"X-Forwarded-For": "5.5.5.1"})
+    assert response.status_code == 429
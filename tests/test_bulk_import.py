@@ -0,0 +1,80 @@
+"""Line splitting, CSV parsing and the streaming import endpoint."""
+
+import pytest
+
+from bulk_import import CsvRowParser, iter_lines
+
+pytestmark = pytest.mark.anyio
+
+
+async def chunked(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def lines(*chunks, **kwargs):
+    return [line async for line in iter_lines(chunked(*chunks), **kwargs)]
+
+
+async def test_lines_are_split_across_chunk_boundaries():
+    assert await lines(b"ab", b"c\nd", b"e\n\n  \nf") == [(1, b"abc"), (2, b"de"), (5, b"f")]
+    assert await lines(b"a\r\n", b"b\n") == [(1, b"a\r"), (2, b"b")]
+    assert await lines() == []
+
+
+async def test_overlong_lines_are_reported_without_buffering():
+    result = await lines(b"ok\n" + b"x" * 5, b"x" * 5, b"x\nfine\n", b"y" * 20, max_line_bytes=8)
+    assert result == [(1, b"ok"), (2, None), (3, b"fine"), (4, None)]
+    # A line at the limit is kept.
+    assert await lines(b"x" * 8 + b"\n", max_line_bytes=8) == [(1, b"x" * 8)]
+
+
+def test_csv_header_byte_order_mark_is_stripped():
+    parse = CsvRowParser()
+    assert parse("\ufeffmeter_type, consumption") is None
+    assert parse("residential,") == {"meter_type": "residential", "consumption": None}
+
+
+CSV = (
+    "\ufeffcalculation_type,meter_type,consumption,amount\n"
+    "kw_to_money,residential,100,\n"
+    "money_to_kw,factory,,67.5\n"
+    "kw_to_money,spaceship,10,\n"
+    "kw_to_money,residential\n"
+)
+
+
+async def test_csv_import_reports_rejected_lines(client):
+    response = await client.post(
+        "/api/calculations/import", content=CSV.encode("utf-8"), headers={"Content-Type": "text/csv"}
+    )
+    summary = response.json()
+    assert summary["accepted"] == 2
+    assert [error["line"] for error in summary["rejected"]] == [4, 5]
+    assert summary["rejected"][0]["error"] == "Invalid meter type"
+
+    stored = {calc["meter_type"]: calc for calc in (await client.get("/api/calculations")).json()}
+    assert stored["residential"]["total_cost"] == pytest.approx(219)
+    assert stored["factory"]["consumption"] == pytest.approx(10)
+
+
+async def test_dry_run_writes_nothing(client):
+    response = await client.post(
+        "/api/calculations/import",
+        params={"dry_run": True, "chunk_size": 1},
+        content=CSV.encode("utf-8"),
+        headers={"Content-Type": "text/csv"}
+    )
+    assert response.json()["accepted"] == 2 and response.json()["dry_run"]
+    assert (await client.get("/api/calculations")).json() == []
+
+
+async def test_ndjson_import_flushes_in_chunks(client):
+    body = "\n".join(
+        f'{{"calculation_type": "kw_to_money", "meter_type": "commercial", "consumption": {kw}}}'
+        for kw in range(1, 8)
+    ) + "\nnot json\n[1]"
+    summary = (await client.post("/api/calculations/import", params={"chunk_size": 3}, content=body)).json()
+    assert summary["accepted"] == 7
+    assert [error["line"] for error in summary["rejected"]] == [8, 9]
+    assert len((await client.get("/api/calculations")).json()) == 7
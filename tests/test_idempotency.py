@@ -0,0 +1,97 @@
+"""Idempotency-Key handling of POST /api/calculate."""
+
+import uuid
+
+import anyio
+import pytest
+
+from idempotency import KEY_FIELD, REPLAYED_HEADER, IdempotentWriter, request_hash
+from result_cache import ResultCache
+from storage import MemoryClient
+
+pytestmark = pytest.mark.anyio
+
+BODY = {"calculation_type": "kw_to_money", "meter_type": "factory", "consumption": 10, "total_cost": 67.5}
+
+
+def new_key():
+    # The server's replay cache outlives each test's database.
+    return str(uuid.uuid4())
+
+
+async def calculate(client, key, body=BODY):
+    return await client.post("/api/calculate", json=body, headers={"Idempotency-Key": key})
+
+
+async def test_retry_returns_the_stored_calculation(client):
+    key = new_key()
+    first = await calculate(client, key)
+    retry = await calculate(client, key)
+    assert first.status_code == retry.status_code == 200
+    assert REPLAYED_HEADER not in first.headers and retry.headers[REPLAYED_HEADER] == "true"
+    assert retry.json() == first.json()
+
+    stored = (await client.get("/api/calculations")).json()
+    assert [calc["id"] for calc in stored] == [first.json()["id"]]
+    assert "idempotency" not in stored[0]
+
+
+async def test_key_reused_for_another_request_is_rejected(client):
+    key = new_key()
+    await calculate(client, key)
+    assert (await calculate(client, key, dict(BODY, consumption=11))).status_code == 422
+
+
+async def test_concurrent_retries_insert_once(client):
+    key = new_key()
+    responses = []
+
+    async def send():
+        responses.append(await calculate(client, key))
+
+    async with anyio.create_task_group() as group:
+        for _ in range(5):
+            group.start_soon(send)
+    assert len({response.json()["id"] for response in responses}) == 1
+    assert len((await client.get("/api/calculations")).json()) == 1
+
+
+async def test_requests_without_a_key_are_not_deduplicated(client):
+    await client.post("/api/calculate", json=BODY)
+    await client.post("/api/calculate", json=BODY)
+    assert len((await client.get("/api/calculations")).json()) == 2
+
+
+@pytest.fixture
+async def collection():
+    collection = MemoryClient()["test"]["electricity_calculations"]
+    await collection.create_index(KEY_FIELD, unique=True, sparse=True)
+    return collection
+
+
+async def test_replay_after_restart_comes_from_the_database(collection):
+    payload_hash = request_hash(BODY)
+    await IdempotentWriter(collection, ResultCache()).insert("k", payload_hash, {"id": "first"})
+    # A fresh writer (new process) has an empty cache.
+    stored, replayed = await IdempotentWriter(collection, ResultCache()).insert("k", payload_hash, {"id": "second"})
+    assert replayed and stored["id"] == "first"
+    assert await collection.count_documents({}) == 1
+
+
+async def test_lost_insert_race_replays_the_winner(collection):
+    payload_hash = request_hash(BODY)
+    writer = IdempotentWriter(collection, ResultCache())
+    find_one = collection.find_one
+    calls = []
+
+    async def racing_find_one(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            # Another worker inserts between our lookup and our insert.
+            await collection.insert_one({"id": "winner", "idempotency": {"key": "k", "request_hash": payload_hash}})
+            return None
+        return await find_one(*args, **kwargs)
+
+    collection.find_one = racing_find_one
+    stored, replayed = await writer.insert("k", payload_hash, {"id": "loser"})
+    assert replayed and stored["id"] == "winner"
@@ -0,0 +1,16 @@
+"""Endpoints that skip response validation still document their schemas."""
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("path, model", [
+    ("/api/calculations", "ElectricityCalculation"),
+    ("/api/status", "StatusCheck")
+])
+async def test_list_endpoints_document_their_item_model(client, path, model):
+    schema = (await client.get("/openapi.json")).json()
+    response = schema["paths"][path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert response["type"] == "array"
+    assert response["items"]["$ref"] == f"#/components/schemas/{model}"
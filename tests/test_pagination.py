@@ -0,0 +1,88 @@
+"""Keyset pages, filters and projections of the history endpoints."""
+
+import json
+from datetime import datetime
+
+import pytest
+
+from pagination import NEXT_CURSOR_HEADER, build_filter, decode_cursor, encode_cursor
+
+pytestmark = pytest.mark.anyio
+
+
+async def import_rows(client, rows):
+    body = "\n".join(json.dumps(row) for row in rows)
+    assert (await client.post("/api/calculations/import", content=body)).json()["accepted"] == len(rows)
+
+
+def row(index, meter_type="residential"):
+    # Two rows per hour, so pages have to break ties on id.
+    return {
+        "calculation_type": "kw_to_money",
+        "meter_type": meter_type,
+        "consumption": 10,
+        "timestamp": f"2024-03-01T{index // 2:02d}:00:00"
+    }
+
+
+async def walk(client, **params):
+    pages, cursor = [], None
+    while True:
+        response = await client.get("/api/calculations", params=dict(params, **({"cursor": cursor} if cursor else {})))
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return pages
+
+
+async def test_pages_cover_every_row_once_newest_first(client):
+    await import_rows(client, [row(index) for index in range(11)])
+    pages = await walk(client, limit=4)
+    assert [len(page) for page in pages] == [4, 4, 3]
+    rows = [calc for page in pages for calc in page]
+    keys = [(calc["timestamp"], calc["id"]) for calc in rows]
+    assert len(set(keys)) == 11
+    assert keys == sorted(keys, reverse=True)
+
+
+async def test_full_last_page_ends_with_an_empty_page(client):
+    await import_rows(client, [row(index) for index in range(4)])
+    assert [len(page) for page in await walk(client, limit=2)] == [2, 2, 0]
+
+
+async def test_filters_and_projection(client):
+    await import_rows(client, [row(index, "residential" if index % 3 else "factory") for index in range(9)])
+    pages = await walk(client, limit=2, meter_type="factory", fields="total_cost")
+    rows = [calc for page in pages for calc in page]
+    assert len(rows) == 3
+    assert all(set(calc) == {"id", "timestamp", "total_cost"} for calc in rows)
+
+    in_range = (await client.get("/api/calculations", params={
+        "start": "2024-03-01T01:00:00", "end": "2024-03-01T03:00:00"
+    })).json()
+    assert {calc["timestamp"] for calc in in_range} == {"2024-03-01T01:00:00", "2024-03-01T02:00:00"}
+
+
+@pytest.mark.parametrize("params", [{"cursor": "not-a-cursor"}, {"fields": "total_cost,secret"}])
+async def test_bad_parameters_are_rejected(client, params):
+    assert (await client.get("/api/calculations", params=params)).status_code == 400
+
+
+async def test_status_checks_page_by_cursor(client):
+    for name in "abcde":
+        assert (await client.post("/api/status", json={"client_name": name})).status_code == 200
+    first = await client.get("/api/status", params={"limit": 3})
+    rest = await client.get("/api/status", params={"limit": 3, "cursor": first.headers[NEXT_CURSOR_HEADER]})
+    names = [check["client_name"] for check in first.json() + rest.json()]
+    assert sorted(names) == list("abcde")
+    assert NEXT_CURSOR_HEADER not in rest.headers
+
+
+def test_cursor_round_trip():
+    doc = {"timestamp": datetime(2024, 3, 1, 12), "id": "b"}
+    assert decode_cursor(encode_cursor(doc)) == {"$or": [
+        {"timestamp": {"$lt": doc["timestamp"]}},
+        {"timestamp": doc["timestamp"], "id": {"$lt": "b"}}
+    ]}
+    assert build_filter(encode_cursor(doc), meter_type="factory")["$and"][0] == {"meter_type": "factory"}
@@ -0,0 +1,41 @@
+"""Validation and pricing of posted rate schedule versions."""
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def schedule(**rates):
+    body = {
+        "residential": [{"min": 1, "max": 100, "rate": 1}, {"min": 101, "max": None, "rate": 2}],
+        "commercial": {"rate": 10},
+        "factory": {"rate": 5}
+    }
+    body.update(rates)
+    return {"effective_from": "2030-01-01T00:00:00", "rates": {k: v for k, v in body.items() if v is not None}}
+
+
+@pytest.mark.parametrize("body", [
+    schedule(factory=None),
+    schedule(residential=[{"min": 5, "max": None, "rate": 1}]),
+    schedule(residential=[{"min": 1, "max": 100, "rate": 1}, {"min": 50, "max": None, "rate": 2}]),
+    schedule(residential=[{"min": 1, "max": None, "rate": 1}, {"min": 2, "max": None, "rate": 2}]),
+    schedule(residential=[])
+])
+async def test_invalid_schedules_are_rejected(client, body):
+    assert (await client.post("/api/rates", json=body)).status_code == 422
+
+
+@pytest.mark.parametrize("first_min", [0, 1])
+async def test_new_version_is_served_from_its_effective_date(client, first_min):
+    body = schedule(residential=[
+        {"min": first_min, "max": 100, "rate": 1}, {"min": 101, "max": None, "rate": 2}
+    ])
+    response = await client.post("/api/rates", json=body)
+    assert response.status_code == 200
+    versions = (await client.get("/api/rates/versions")).json()
+    assert len(versions) == 2
+
+    rates = (await client.get("/api/rates", params={"as_of": "2030-06-01T00:00:00"})).json()
+    assert rates["commercial"] == {"rate": 10}
+    assert rates["residential"][-1]["max"] is None
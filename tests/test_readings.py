@@ -0,0 +1,112 @@
+"""Reading ingestion: incremental billing, rejections and concurrent batches."""
+
+from datetime import datetime, timedelta
+
+import anyio
+import pytest
+
+from rate_schedules import RateScheduleCache
+from readings import ERROR_CONFLICT, ingest_readings
+from storage import MemoryClient
+from tariff import DEFAULT_RATES
+
+pytestmark = pytest.mark.anyio
+
+T0 = datetime(2024, 5, 1)
+
+
+def at(hours):
+    return (T0 + timedelta(hours=hours)).isoformat()
+
+
+async def post(client, meter_ids, hours, values, meter_type="factory"):
+    response = await client.post("/api/readings/batch", json={
+        "meter_id": meter_ids,
+        "meter_type": [meter_type] * len(meter_ids),
+        "timestamp": [at(hour) for hour in hours],
+        "reading": values
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+async def test_bills_consumption_since_previous_reading(client):
+    first = await post(client, ["m1", "m1"], [0, 1], [100, 130])
+    assert first["consumption"] == [None, 30]
+    assert first["total_cost"] == [None, pytest.approx(30 * 6.75)]
+
+    second = await post(client, ["m1"], [2], [150])
+    assert second["consumption"] == [20]
+
+
+async def test_rejects_out_of_order_duplicate_and_decreasing(client):
+    await post(client, ["m1"], [5], [100])
+    result = await post(client, ["m1", "m1", "m1", "m2"], [4, 5, 6, 0], [90, 100, 99, 10])
+    assert result["error"] == ["out_of_order", "duplicate", "reading_decreased", None]
+    assert result["accepted"] == 1
+
+    result = await post(client, ["m3"], [0], [10], meter_type="unknown")
+    assert result["error"] == ["invalid_meter_type"]
+
+
+class YieldingState:
+    """State collection that yields to the event loop on every read, widening races."""
+
+    def __init__(self, collection) -> None:
+        self.collection = collection
+
+    def find(self, *args, **kwargs):
+        cursor = self.collection.find(*args, **kwargs)
+
+        class Cursor:
+            async def to_list(self, length):
+                docs = await cursor.to_list(length)
+                await anyio.sleep(0)
+                return docs
+
+        return Cursor()
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+def setup():
+    database = MemoryClient()["test"]
+    schedules = RateScheduleCache(database.rate_schedules, DEFAULT_RATES)
+    return database.meter_readings, YieldingState(database.meter_state), schedules.at
+
+
+async def ingest(readings, state, schedule_at, hour, value, results):
+    results.append(await ingest_readings(
+        readings, state, ["m1"], ["factory"], [T0 + timedelta(hours=hour)], [value], schedule_at
+    ))
+
+
+async def test_concurrent_batches_do_not_bill_twice():
+    readings, state, schedule_at = setup()
+    await ingest(readings, state, schedule_at, 0, 100, [])
+
+    results = []
+    async with anyio.create_task_group() as group:
+        group.start_soon(ingest, readings, state, schedule_at, 1, 150, results)
+        group.start_soon(ingest, readings, state, schedule_at, 2, 180, results)
+
+    billed = sum(result["consumption"][0] or 0 for result in results)
+    assert billed == 80
+    assert (await state.find_one({"_id": "m1"}))["reading"] == 180
+
+
+async def test_persistent_conflicts_are_rejected():
+    readings, state, schedule_at = setup()
+    await ingest(readings, state, schedule_at, 0, 100, [])
+
+    class MovingState(YieldingState):
+        async def update_one(self, filter, update, **kwargs):
+            # Another batch always moved the state first.
+            return await self.collection.update_one(dict(filter, timestamp=None), update, **kwargs)
+
+    results = []
+    await ingest(readings, MovingState(state.collection), schedule_at, 1, 150, results)
+    assert results[0]["error"] == [ERROR_CONFLICT]
+    assert results[0]["accepted"] == 0
+    assert await readings.count_documents({}) == 1
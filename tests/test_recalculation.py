@@ -0,0 +1,142 @@
+"""Re-pricing stored calculations: batches, checkpoints, leases and cancellation."""
+
+import json
+from datetime import datetime, timedelta
+
+import anyio
+import pytest
+
+from rate_schedules import RateScheduleCache
+from recalculation import CANCELLED, COMPLETED, EXPIRED, RUNNING, RecalculationManager, reprice
+from storage import MemoryClient
+from tariff import DEFAULT_RATES
+
+pytestmark = pytest.mark.anyio
+
+NEW_RATES = {
+    "residential": [{"min": 1, "max": None, "rate": 1}],
+    "commercial": {"rate": 2},
+    "factory": {"rate": 4}
+}
+
+
+def test_reprice_builds_updates_and_skips_unpriceable_rows():
+    schedule = RateScheduleCache(None, DEFAULT_RATES).at()
+    docs = [
+        {"_id": 1, "calculation_type": "kw_to_money", "meter_type": "residential", "consumption": 100},
+        {"_id": 2, "calculation_type": "kw_to_money", "meter_type": "factory", "previous_reading": 5, "current_reading": 15},
+        {"_id": 3, "calculation_type": "money_to_kw", "meter_type": "commercial", "amount": 32.5},
+        {"_id": 4, "calculation_type": "kw_to_money", "meter_type": "spaceship", "consumption": 1},
+        {"_id": 5, "calculation_type": "money_to_kw", "meter_type": "factory", "amount": 0},
+        {"_id": 6, "calculation_type": "unknown", "meter_type": "factory"}
+    ]
+    updates, skipped = reprice(docs, lambda _timestamp: schedule)
+    assert skipped == 3
+    fields = {update._filter["_id"]: update._doc["$set"] for update in updates}
+    assert fields[1]["total_cost"] == pytest.approx(219)
+    assert (fields[2]["consumption"], fields[2]["total_cost"]) == (10, pytest.approx(67.5))
+    assert fields[3] == {"consumption": 2, "total_cost": 32.5}
+
+
+async def wait_for_job(client, job_id):
+    for _ in range(200):
+        job = (await client.get(f"/api/recalculations/{job_id}")).json()
+        if job["status"] not in ("pending", "running"):
+            return job
+        await anyio.sleep(0.01)
+    raise AssertionError("recalculation job did not finish")
+
+
+async def test_job_reprices_history_with_a_new_schedule(client):
+    rows = [
+        {"calculation_type": "kw_to_money", "meter_type": meter_type, "consumption": 10,
+         "timestamp": "2024-03-01T12:00:00"}
+        for meter_type in ("residential", "commercial", "factory", "factory")
+    ]
+    await client.post("/api/calculations/import", content="\n".join(json.dumps(row) for row in rows))
+    assert (await client.post(
+        "/api/rates", json={"effective_from": "2000-01-01T00:00:00", "rates": NEW_RATES}
+    )).status_code == 200
+
+    response = await client.post("/api/recalculations", json={"meter_type": "factory", "batch_size": 1})
+    assert response.status_code == 202
+    job = await wait_for_job(client, response.json()["id"])
+    assert (job["status"], job["total"], job["processed"], job["modified"]) == (COMPLETED, 2, 2, 2)
+    assert "checkpoint" not in job and "owner" not in job
+
+    costs = {calc["meter_type"]: calc["total_cost"] for calc in (await client.get("/api/calculations")).json()}
+    assert costs["factory"] == pytest.approx(40)
+    assert costs["commercial"] == pytest.approx(162.5)
+
+
+async def test_unknown_job_is_not_found(client):
+    assert (await client.get("/api/recalculations/missing")).status_code == 404
+    assert (await client.post("/api/recalculations/missing/cancel")).status_code == 404
+
+
+@pytest.fixture
+async def manager():
+    database = MemoryClient()["test"]
+    schedules = RateScheduleCache(database.rate_schedules, DEFAULT_RATES)
+    await schedules.load()
+    await database.electricity_calculations.insert_many([
+        {"_id": f"{index:02d}", "calculation_type": "kw_to_money", "meter_type": "factory", "consumption": 1,
+         "total_cost": 0}
+        for index in range(10)
+    ])
+    finished = []
+
+    async def on_finish():
+        finished.append(True)
+
+    manager = RecalculationManager(database.electricity_calculations, database.recalculation_jobs, schedules, on_finish)
+    manager.finished = finished
+    yield manager
+    await manager.stop()
+
+
+async def orphan(manager, **fields):
+    """A running job whose owner went away after checkpointing ``04``."""
+    job = {
+        "_id": "job", "id": "job", "status": RUNNING, "params": {"batch_size": 3}, "total": 10,
+        "processed": 5, "modified": 5, "skipped": 0, "checkpoint": "04", "cancel_requested": False,
+        "owner": "dead", "lease_until": datetime.utcnow() - timedelta(seconds=1), "error": None
+    }
+    job.update(fields)
+    await manager.jobs.insert_one(job)
+
+
+async def wait_until_idle(manager):
+    with anyio.fail_after(2):
+        while manager._tasks or (await manager.get("job"))["status"] == RUNNING:
+            await anyio.sleep(0.01)
+
+
+async def test_orphaned_job_resumes_from_its_checkpoint(manager):
+    await orphan(manager)
+    manager.start(0.01)
+    await wait_until_idle(manager)
+
+    job = await manager.jobs.find_one({"_id": "job"})
+    assert (job["status"], job["processed"], job["checkpoint"]) == (COMPLETED, 10, "09")
+    assert job["lease_until"] == EXPIRED and job["owner"] == manager.owner
+    repriced = await manager.source.find({"total_cost": {"$gt": 0}}, {"_id": 1}).to_list(None)
+    assert [doc["_id"] for doc in repriced] == [f"{index:02d}" for index in range(5, 10)]
+    assert manager.finished == [True]
+
+
+async def test_leased_job_is_left_to_its_owner(manager):
+    await orphan(manager, lease_until=datetime.utcnow() + timedelta(minutes=1))
+    manager.start(0.01)
+    await anyio.sleep(0.05)
+    assert (await manager.get("job"))["processed"] == 5
+
+
+async def test_cancel_stops_an_active_job(manager):
+    await orphan(manager)
+    assert await manager.cancel("job")
+    manager.start(0.01)
+    await wait_until_idle(manager)
+    job = await manager.get("job")
+    assert (job["status"], job["processed"]) == (CANCELLED, 5)
+    assert not await manager.cancel("job")
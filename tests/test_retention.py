@@ -0,0 +1,137 @@
+"""Retention through TTL indexes, archival and purge jobs."""
+
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import anyio
+import pytest
+
+from retention import Archiver, RetentionManager, purge_batches
+from storage import MemoryClient
+
+pytestmark = pytest.mark.anyio
+
+
+def manager(database, days=30, mode="none", **kwargs):
+    return RetentionManager(
+        database, {"electricity_calculations": days}, Archiver(mode, database=database, **kwargs), pause=0
+    )
+
+
+def docs(*ages_in_days):
+    now = datetime.utcnow()
+    return [{"_id": index, "timestamp": now - timedelta(days=age)} for index, age in enumerate(ages_in_days)]
+
+
+async def test_memory_store_expires_documents_past_ttl_index():
+    database = MemoryClient()["test"]
+    await manager(database, days=30).ensure_indexes()
+    await database.electricity_calculations.insert_many(docs(1, 29, 31, 400))
+
+    remaining = await database.electricity_calculations.find({}).to_list(None)
+    assert sorted(doc["_id"] for doc in remaining) == [0, 1]
+    assert await database.electricity_calculations.count_documents({}) == 2
+
+
+async def test_ttl_is_retuned_and_dropped():
+    database = MemoryClient()["test"]
+    collection = database.electricity_calculations
+    await manager(database, days=30).ensure_indexes()
+    await manager(database, days=10).ensure_indexes()
+    assert (await collection.index_information())["timestamp_ttl"]["expireAfterSeconds"] == 10 * 86400
+
+    await manager(database, days=None).ensure_indexes()
+    await collection.insert_many(docs(1, 400))
+    assert await collection.count_documents({}) == 2
+
+
+async def test_archiving_delays_ttl_by_grace_period():
+    database = MemoryClient()["test"]
+    retention = manager(database, days=30, mode="collection")
+    await retention.ensure_indexes()
+    await database.electricity_calculations.insert_many(docs(1, 31, 400))
+
+    # The TTL backstop only removed the document past retention + grace.
+    assert await database.electricity_calculations.count_documents({}) == 2
+    assert await retention.archive_expired() == {"electricity_calculations": 1}
+    assert [doc["_id"] for doc in await database.electricity_calculations.find({}).to_list(None)] == [0]
+    assert [doc["_id"] for doc in await database.electricity_calculations_archive.find({}).to_list(None)] == [1]
+
+
+async def test_file_archive_appends_monthly_gzip_members(tmp_path):
+    archiver = Archiver("files", directory=tmp_path)
+    await archiver.archive("electricity_calculations", [
+        {"_id": 1, "timestamp": datetime(2024, 1, 5)}, {"_id": 2, "timestamp": datetime(2024, 2, 1)}
+    ])
+    await archiver.archive("electricity_calculations", [{"_id": 3, "timestamp": datetime(2024, 1, 9)}, {"_id": 4}])
+
+    folder = tmp_path / "electricity_calculations"
+    assert sorted(path.name for path in folder.iterdir()) == [
+        "2024-01.ndjson.gz", "2024-02.ndjson.gz", "undated.ndjson.gz"
+    ]
+    january = gzip.decompress((folder / "2024-01.ndjson.gz").read_bytes()).splitlines()
+    assert [json.loads(line)["_id"] for line in january] == [1, 3]
+
+
+async def test_collection_archive_tolerates_documents_archived_before():
+    database = MemoryClient()["test"]
+    archiver = Archiver("collection", database=database)
+    await archiver.archive("electricity_calculations", docs(40, 50))
+    # An interrupted run is retried with the same documents.
+    await archiver.archive("electricity_calculations", docs(40, 50, 60))
+    assert await database.electricity_calculations_archive.count_documents({}) == 3
+
+
+async def test_archival_is_skipped_while_another_worker_holds_the_lock():
+    database = MemoryClient()["test"]
+    await database.electricity_calculations.insert_many(docs(31))
+    first, second = manager(database, mode="collection"), manager(database, mode="collection")
+    await first._acquire()
+    assert await second.archive_expired() == {}
+    await database.maintenance_locks.update_one({}, {"$set": {"lease_until": datetime(1970, 1, 1)}})
+    assert await second.archive_expired() == {"electricity_calculations": 1}
+
+
+async def test_purge_batches_report_progress_oldest_first():
+    collection = MemoryClient()["test"]["electricity_calculations"]
+    await collection.insert_many(docs(5, 1, 4, 2, 3))
+    progress = []
+
+    async def on_batch(deleted):
+        progress.append((deleted, sorted(doc["_id"] for doc in await collection.find({}).to_list(None))))
+
+    assert await purge_batches(collection, {}, 2, 0, on_batch=on_batch) == 5
+    assert progress == [(2, [1, 3, 4]), (4, [1]), (5, [])]
+
+
+async def wait_for_purge(client, job_id):
+    for _ in range(100):
+        job = (await client.get(f"/api/calculations/purge/{job_id}")).json()
+        if job["status"] != "running":
+            return job
+        await anyio.sleep(0.01)
+    raise AssertionError("purge job did not finish")
+
+
+@pytest.mark.parametrize("body", [{}, {"all": False}, {"all": True, "before": "2024-01-01T00:00:00"}])
+async def test_purge_requires_an_explicit_scope(client, body):
+    response = await client.post("/api/calculations/purge", json=body)
+    assert response.status_code == 422
+
+
+async def test_purge_before_and_all(client):
+    rows = "\n".join(
+        '{"calculation_type": "money_to_kw", "meter_type": "factory", "amount": 10, "timestamp": "%s"}' % day
+        for day in ("2024-01-01T00:00:00", "2024-06-01T00:00:00", "2024-06-02T00:00:00")
+    )
+    await client.post("/api/calculations/import", content=rows)
+
+    response = await client.post("/api/calculations/purge", json={"before": "2024-03-01T00:00:00", "pause_ms": 0})
+    assert response.status_code == 202
+    assert (await wait_for_purge(client, response.json()["id"]))["deleted"] == 1
+
+    response = await client.post("/api/calculations/purge", json={"all": True, "pause_ms": 0})
+    job = await wait_for_purge(client, response.json()["id"])
+    assert job["status"] == "completed" and job["deleted"] == 2
+    assert (await client.get("/api/calculations")).json() == []
@@ -0,0 +1,59 @@
+"""Summary rollups stay correct when history is written behind the watermark."""
+
+import json
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def ndjson(*rows):
+    return "\n".join(json.dumps(row) for row in rows)
+
+
+def reading(day, kw=10):
+    return {
+        "calculation_type": "kw_to_money",
+        "meter_type": "residential",
+        "consumption": kw,
+        "timestamp": f"{day}T12:00:00"
+    }
+
+
+async def summary(client, **params):
+    response = await client.get("/api/calculations/summary", params=dict(group_by="day", **params))
+    assert response.status_code == 200
+    return {group["key"]: group for group in response.json()["groups"]}
+
+
+async def test_import_into_materialized_day_is_summarized(client):
+    await client.post("/api/calculations/import", content=ndjson(reading("2024-03-02")))
+    assert (await summary(client))["2024-03-02"]["count"] == 1
+
+    # The day is now materialized; a backdated import must still show up.
+    response = await client.post(
+        "/api/calculations/import", content=ndjson(reading("2024-03-02", 5), reading("2024-03-03", 7))
+    )
+    assert response.json()["accepted"] == 2
+
+    days = await summary(client)
+    assert days["2024-03-02"]["count"] == 2
+    assert days["2024-03-02"]["consumption"] == 15
+    assert days["2024-03-03"]["count"] == 1
+
+
+async def test_dry_run_import_leaves_rollups_alone(client):
+    await client.post("/api/calculations/import", content=ndjson(reading("2024-03-02")))
+    await summary(client)
+    await client.post("/api/calculations/import", params={"dry_run": True}, content=ndjson(reading("2024-03-02")))
+    assert (await summary(client))["2024-03-02"]["count"] == 1
+
+
+async def test_summary_by_meter_type_totals(client):
+    await client.post("/api/calculations/import", content=ndjson(
+        reading("2024-03-01", 100),
+        dict(reading("2024-03-01", 10), meter_type="commercial")
+    ))
+    groups = {group["key"]: group for group in (await client.get("/api/calculations/summary")).json()["groups"]}
+    assert groups["residential"]["consumption"] == 100
+    assert groups["commercial"]["total_cost"] == pytest.approx(162.5)
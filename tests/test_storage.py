@@ -0,0 +1,170 @@
+"""Query, sort, index and timezone semantics of the in-memory Motor stand-in."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from storage import MemoryClient, matches
+
+pytestmark = pytest.mark.anyio
+
+T0 = datetime(2024, 3, 1, 12, 0)
+
+
+@pytest.fixture
+def collection():
+    return MemoryClient()["test"]["calculations"]
+
+
+async def seed(collection, *docs):
+    await collection.insert_many([dict(doc) for doc in docs])
+
+
+@pytest.mark.parametrize("query, expected", [
+    ({"a": 1}, True),
+    ({"a": {"$gte": 1, "$lt": 2}}, True),
+    ({"a": {"$ne": 1}}, False),
+    ({"a": {"$in": [0, 1]}}, True),
+    ({"a": {"$nin": [1]}}, False),
+    ({"tags": "x"}, True),
+    ({"tags": {"$in": ["z", "y"]}}, True),
+    ({"nested.b": "text"}, True),
+    ({"nested.b": {"$regex": "^te"}}, True),
+    ({"missing": None}, True),
+    ({"missing": {"$exists": False}}, True),
+    ({"a": {"$exists": True}, "missing": {"$exists": True}}, False),
+    ({"$or": [{"a": 2}, {"tags": "y"}]}, True),
+    ({"$nor": [{"a": 2}, {"tags": "y"}]}, False),
+    ({"a": {"$not": {"$gt": 0}}}, False),
+    ({"a": {"$gt": "0"}}, False)
+])
+def test_query_operators(query, expected):
+    doc = {"a": 1, "tags": ["x", "y"], "nested": {"b": "text"}}
+    assert matches(doc, query) is expected
+
+
+async def test_sort_orders_across_types(collection):
+    await seed(collection, {"v": "b"}, {"v": 2}, {}, {"v": None}, {"v": 1.5}, {"v": "a"})
+    docs = await collection.find({}, {"_id": 0}).sort("v", 1).to_list(None)
+    assert [doc.get("v") for doc in docs][2:] == [1.5, 2, "a", "b"]
+    docs = await collection.find({}, {"_id": 0}).sort("v", -1).to_list(None)
+    assert [doc.get("v") for doc in docs][:4] == ["b", "a", 2, 1.5]
+
+
+async def test_limited_timestamp_walk_orders_ties_by_later_keys(collection):
+    await seed(collection, *(
+        {"timestamp": T0 + timedelta(hours=hour), "id": f"{hour}-{index}"}
+        for hour in range(3) for index in "ba"
+    ))
+    sort = [("timestamp", -1), ("id", -1)]
+    first = await collection.find({}, {"_id": 0, "id": 1}).sort(sort).limit(3).to_list(None)
+    assert [doc["id"] for doc in first] == ["2-b", "2-a", "1-b"]
+    rest = await collection.find({}, {"_id": 0, "id": 1}).sort(sort).skip(3).to_list(None)
+    assert [doc["id"] for doc in rest] == ["1-a", "0-b", "0-a"]
+
+
+async def test_projection_and_copies(collection):
+    await seed(collection, {"_id": 1, "a": {"b": 1, "c": 2}, "d": 3})
+    assert await collection.find_one({}, {"a.b": 1}) == {"_id": 1, "a": {"b": 1}}
+    assert await collection.find_one({}, {"_id": 0, "a": 0}) == {"d": 3}
+    # Returned documents never alias the stored ones.
+    doc = await collection.find_one({"_id": 1})
+    doc["a"]["b"] = 99
+    assert (await collection.find_one({"_id": 1}))["a"]["b"] == 1
+
+
+async def test_unique_indexes(collection):
+    await collection.create_index([("meter_id", 1), ("timestamp", -1)], unique=True)
+    await collection.insert_one({"meter_id": "m", "timestamp": T0})
+    with pytest.raises(DuplicateKeyError):
+        await collection.insert_one({"meter_id": "m", "timestamp": T0})
+
+    with pytest.raises(BulkWriteError) as exc:
+        await collection.insert_many([
+            {"meter_id": "m", "timestamp": T0},
+            {"meter_id": "m", "timestamp": T0 + timedelta(hours=1)}
+        ], ordered=False)
+    assert exc.value.details["nInserted"] == 1
+    assert [error["index"] for error in exc.value.details["writeErrors"]] == [0]
+
+    # A failed update leaves the document and its index entries untouched.
+    with pytest.raises(DuplicateKeyError):
+        await collection.update_one({"timestamp": T0 + timedelta(hours=1)}, {"$set": {"timestamp": T0}})
+    assert await collection.count_documents({"meter_id": "m"}) == 2
+    assert await collection.find_one({"timestamp": T0 + timedelta(hours=1)}) is not None
+
+
+async def test_sparse_unique_index_skips_missing_fields(collection):
+    await collection.create_index("key", unique=True, sparse=True, name="key")
+    await seed(collection, {"a": 1}, {"a": 2}, {"key": "k"})
+    with pytest.raises(DuplicateKeyError):
+        await collection.insert_one({"key": "k"})
+    await collection.drop_index("key")
+    await collection.insert_one({"key": "k"})
+
+
+async def test_create_unique_index_over_duplicates_fails(collection):
+    await seed(collection, {"a": 1}, {"a": 1})
+    with pytest.raises(DuplicateKeyError):
+        await collection.create_index("a", unique=True)
+
+
+async def test_aware_datetimes_are_stored_and_compared_as_naive_utc(collection):
+    plus_two = timezone(timedelta(hours=2))
+    await collection.insert_one({"_id": 1, "timestamp": datetime(2024, 3, 1, 14, 0, tzinfo=plus_two)})
+    await collection.insert_one({"_id": 2, "timestamp": datetime(2024, 3, 1, 11, 0)})
+
+    assert (await collection.find_one({"_id": 1}))["timestamp"] == T0
+    assert await collection.count_documents({"timestamp": {"$gt": datetime(2024, 3, 1, 11, 30, tzinfo=timezone.utc)}}) == 1
+    assert await collection.count_documents({"timestamp": T0.replace(tzinfo=timezone.utc)}) == 1
+    docs = await collection.find({}).sort("timestamp", -1).limit(1).to_list(None)
+    assert docs[0]["_id"] == 1
+
+
+async def test_updates_upserts_and_bulk_writes(collection):
+    await collection.update_one({"_id": "s"}, {"$inc": {"n": 1}, "$setOnInsert": {"created": T0}}, upsert=True)
+    await collection.update_one({"_id": "s"}, {"$inc": {"n": 1}, "$setOnInsert": {"created": None}}, upsert=True)
+    assert await collection.find_one({"_id": "s"}) == {"_id": "s", "n": 2, "created": T0}
+
+    result = await collection.bulk_write([
+        InsertOne({"_id": "t", "n": 0}),
+        UpdateOne({"_id": "t"}, {"$set": {"n": 5}}),
+        UpdateOne({"_id": "u"}, {"$set": {"n": 1}}, upsert=True)
+    ])
+    assert (result.inserted_count, result.modified_count, result.upserted_count) == (1, 1, 1)
+    assert (await collection.find_one({"_id": "t"}))["n"] == 5
+
+
+async def test_bulk_write_reports_duplicates(collection):
+    with pytest.raises(BulkWriteError) as exc:
+        await collection.bulk_write([InsertOne({"_id": 1}), InsertOne({"_id": 1}), InsertOne({"_id": 2})])
+    assert exc.value.details["nInserted"] == 1
+    assert await collection.count_documents({}) == 1
+
+
+async def test_aggregate_groups(collection):
+    await seed(collection, *(
+        {"meter_type": meter_type, "total_cost": cost, "timestamp": T0}
+        for meter_type, cost in [("residential", 1), ("residential", 2), ("factory", 5)]
+    ))
+    rows = await collection.aggregate([
+        {"$match": {"meter_type": "residential"}},
+        {"$group": {"_id": {"$year": "$timestamp"}, "cost": {"$sum": "$total_cost"}, "count": {"$sum": 1}}}
+    ]).to_list(None)
+    assert rows == [{"_id": 2024, "cost": 3, "count": 2}]
+
+
+async def test_ttl_index_expires_documents_before_reads(collection):
+    now = datetime.utcnow()
+    await collection.create_index("timestamp", expireAfterSeconds=3600)
+    await collection.create_index("archived_at", expireAfterSeconds=60)
+    await seed(
+        collection,
+        {"_id": "old", "timestamp": now - timedelta(hours=2)},
+        {"_id": "new", "timestamp": now},
+        {"_id": "archived", "timestamp": now, "archived_at": now - timedelta(minutes=5)},
+        {"_id": "no-date", "archived_at": "not a date"}
+    )
+    assert sorted(doc["_id"] for doc in await collection.find({}).to_list(None)) == ["new", "no-date"]
@@ -0,0 +1,243 @@
+"""Property-based tests for the tariff engine and the generated frontend tables.
+
+The client tests run ``frontend/src/tariff.generated.js`` under Node and
+require the server and client to agree exactly, not just approximately:
+both perform the same floating-point operations on the same tables.
+"""
+
+import json
+import math
+import shutil
+import subprocess
+
+import pytest
+from hypothesis import given, settings
+from hypothesis import strategies as st
+
+import build_frontend_tariff
+from rate_schedules import SEED_VERSION
+from tariff import DEFAULT_RATES, INFINITY, TariffEngine
+
+NODE = shutil.which("node")
+needs_node = pytest.mark.skipif(NODE is None, reason="node is not installed")
+
+kws = st.floats(min_value=1e-6, max_value=1e6, allow_nan=False, allow_infinity=False)
+amounts = st.floats(min_value=1e-6, max_value=1e8, allow_nan=False, allow_infinity=False)
+rates = st.floats(min_value=0.01, max_value=100, allow_nan=False, allow_infinity=False)
+
+
+@st.composite
+def tiered_specs(draw):
+    widths = draw(st.lists(st.integers(min_value=1, max_value=5000), min_size=1, max_size=6))
+    open_ended = draw(st.booleans())
+    tiers, lower = [], 1
+    for width in widths:
+        tiers.append({"min": lower, "max": lower + width - 1, "rate": draw(rates)})
+        lower += width
+    if open_ended:
+        tiers.append({"min": lower, "max": INFINITY, "rate": draw(rates)})
+    return tiers
+
+
+rate_specs = st.one_of(tiered_specs(), st.builds(lambda rate: {"rate": rate}, rates))
+schedules = st.dictionaries(st.sampled_from(["residential", "commercial", "factory"]), rate_specs, min_size=1)
+
+
+# --- server calculators ------------------------------------------------------
+
+@given(spec=rate_specs, kw=kws)
+def test_breakdown_sums_to_total(spec, kw):
+    result = TariffEngine({"x": spec}).kw_to_money("x", kw)
+    assert math.isclose(sum(entry["cost"] for entry in result["breakdown"]), result["total_cost"], rel_tol=1e-9)
+    assert sum(entry["usage"] for entry in result["breakdown"]) <= kw * (1 + 1e-12)
+
+
+@given(spec=rate_specs, a=kws, b=kws)
+def test_cost_is_monotonic(spec, a, b):
+    engine = TariffEngine({"x": spec})
+    low, high = sorted((a, b))
+    assert engine.kw_to_money("x", low)["total_cost"] <= engine.kw_to_money("x", high)["total_cost"]
+
+
+@given(spec=rate_specs, kw=kws)
+def test_money_to_kw_inverts_kw_to_money(spec, kw):
+    engine = TariffEngine({"x": spec})
+    schedule = engine.schedule("x")
+    total = engine.kw_to_money("x", kw)["total_cost"]
+    if kw >= schedule.bounds[-1]:
+        # Usage past a closed schedule is unbilled, so only the end is recoverable.
+        assert engine.money_to_kw("x", total) == pytest.approx(schedule.bounds[-1])
+    else:
+        assert engine.money_to_kw("x", total) == pytest.approx(kw, rel=1e-9, abs=1e-6)
+
+
+@given(spec=rate_specs, values=st.lists(kws, min_size=1, max_size=50))
+def test_batch_matches_single(spec, values):
+    engine = TariffEngine({"x": spec})
+    batch = engine.kw_to_money_batch(["x"] * len(values), [0.0] * len(values), values)
+    for kw, total in zip(values, batch["total_cost"]):
+        assert total == pytest.approx(engine.kw_to_money("x", kw)["total_cost"], rel=1e-12)
+
+
+# --- reference tier loops ------------------------------------------------------
+# The per-request loops the compiled tables replaced, kept verbatim apart from
+# taking the tiers as an argument.
+
+def reference_cost(spec, kw):
+    if isinstance(spec, dict):
+        total_cost = kw * spec["rate"]
+        return {"total_cost": total_cost, "breakdown": [{
+            "tier": "0-∞",
+            "usage": kw,
+            "rate": spec["rate"],
+            "cost": total_cost
+        }]}
+
+    total_cost = 0
+    remaining_kw = kw
+    breakdown = []
+
+    for tier in spec:
+        if remaining_kw <= 0:
+            break
+
+        tier_range = float('inf') if tier["max"] == float('inf') else tier["max"] - tier["min"] + 1
+        tier_usage = min(remaining_kw, tier_range)
+
+        if tier_usage > 0:
+            tier_cost = tier_usage * tier["rate"]
+            total_cost += tier_cost
+            breakdown.append({
+                "tier": f"{tier['min']}-{tier['max'] if tier['max'] != float('inf') else '∞'}",
+                "usage": tier_usage,
+                "rate": tier["rate"],
+                "cost": tier_cost
+            })
+            remaining_kw -= tier_usage
+
+    return {"total_cost": total_cost, "breakdown": breakdown}
+
+
+def reference_kw(spec, amount):
+    if isinstance(spec, dict):
+        return amount / spec["rate"]
+
+    total_kw = 0
+    remaining_amount = amount
+    for tier in spec:
+        if remaining_amount <= 0:
+            break
+
+        tier_range = float('inf') if tier["max"] == float('inf') else tier["max"] - tier["min"] + 1
+        max_tier_cost = float('inf') if tier_range == float('inf') else tier_range * tier["rate"]
+
+        if remaining_amount >= max_tier_cost and tier_range != float('inf'):
+            total_kw += tier_range
+            remaining_amount -= max_tier_cost
+        else:
+            total_kw += remaining_amount / tier["rate"]
+            break
+    return total_kw
+
+
+@given(spec=st.one_of(st.just(DEFAULT_RATES["residential"]), rate_specs), kw=kws)
+def test_cost_matches_reference_loop(spec, kw):
+    expected = reference_cost(spec, kw)
+    result = TariffEngine({"x": spec}).kw_to_money("x", kw)
+    assert result["total_cost"] == pytest.approx(expected["total_cost"], rel=1e-9)
+    assert [entry["tier"] for entry in result["breakdown"]] == [entry["tier"] for entry in expected["breakdown"]]
+    for entry, reference in zip(result["breakdown"], expected["breakdown"]):
+        assert entry["rate"] == reference["rate"]
+        assert entry["usage"] == pytest.approx(reference["usage"], rel=1e-9, abs=1e-6)
+        assert entry["cost"] == pytest.approx(reference["cost"], rel=1e-9, abs=1e-6)
+
+
+@given(spec=st.one_of(st.just(DEFAULT_RATES["residential"]), rate_specs), amount=amounts)
+def test_kw_for_amount_matches_reference_loop(spec, amount):
+    assert TariffEngine({"x": spec}).money_to_kw("x", amount) == pytest.approx(
+        reference_kw(spec, amount), rel=1e-9, abs=1e-6
+    )
+
+
+# --- generated client tables ---------------------------------------------------
+
+def test_generated_module_is_current():
+    assert build_frontend_tariff.OUTPUT.read_text(encoding="utf-8") == build_frontend_tariff.render(), (
+        "frontend/src/tariff.generated.js is stale; run backend/build_frontend_tariff.py"
+    )
+
+
+def test_generated_tables_match_engine():
+    assert build_frontend_tariff.read_tables() == build_frontend_tariff.client_tables(DEFAULT_RATES)
+
+
+def test_generated_version_is_seed_version():
+    assert build_frontend_tariff.read_version() == SEED_VERSION
+
+
+DRIVER = """
+import * as tariff from "./tariff.mjs";
+let input = "";
+process.stdin.on("data", (chunk) => (input += chunk));
+process.stdin.on("end", () => {
+  const { tables, cases } = JSON.parse(input);
+  const out = cases.map(([meterType, kw, amount]) => {
+    const table = tables ? tables[meterType] : null;
+    return {
+      cost: table ? tariff.priceKw(table, kw) : tariff.kwToMoney(meterType, kw),
+      kw: table ? tariff.kwForAmount(table, amount) : tariff.moneyToKw(meterType, amount)
+    };
+  });
+  process.stdout.write(JSON.stringify(out));
+});
+"""
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    """Run cases through the generated module: ``client(cases, tables=None)``."""
+    directory = tmp_path_factory.mktemp("tariff")
+    shutil.copy(build_frontend_tariff.OUTPUT, directory / "tariff.mjs")
+    (directory / "driver.mjs").write_text(DRIVER, encoding="utf-8")
+
+    def run(cases, tables=None):
+        payload = json.dumps({"tables": tables, "cases": cases})
+        completed = subprocess.run(
+            [NODE, str(directory / "driver.mjs")], input=payload, capture_output=True, text=True, check=True
+        )
+        return json.loads(completed.stdout)
+    return run
+
+
+def assert_agree(engine, cases, results):
+    for (meter_type, kw, amount), result in zip(cases, results):
+        server = engine.kw_to_money(meter_type, kw)
+        assert result["cost"]["totalCost"] == server["total_cost"]
+        assert [
+            {"tier": entry["tier"], "usage": entry["usage"], "rate": entry["rate"], "cost": entry["cost"]}
+            for entry in result["cost"]["breakdown"]
+        ] == server["breakdown"]
+        assert result["kw"] == engine.money_to_kw(meter_type, amount)
+
+
+@needs_node
+@settings(max_examples=25, deadline=None)
+@given(cases=st.lists(st.tuples(st.sampled_from(sorted(DEFAULT_RATES)), kws, amounts), min_size=1, max_size=200))
+def test_client_agrees_with_server(client, cases):
+    assert_agree(TariffEngine(DEFAULT_RATES), cases, client([list(case) for case in cases]))
+
+
+@needs_node
+@settings(max_examples=25, deadline=None)
+@given(data=st.data(), rates_by_type=schedules)
+def test_client_agrees_with_server_for_any_schedule(client, data, rates_by_type):
+    cases = data.draw(st.lists(
+        st.tuples(st.sampled_from(sorted(rates_by_type)), kws, amounts), min_size=1, max_size=100
+    ))
+    tables = build_frontend_tariff.client_tables(rates_by_type)
+    assert_agree(TariffEngine(rates_by_type), cases, client([list(case) for case in cases], tables))
+
+
+@needs_node
+def test_client_rejects_unknown_meter_type(client):
+    assert client([["unknown", 10, 10]]) == [{"cost": None, "kw": None}]
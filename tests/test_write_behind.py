@@ -0,0 +1,98 @@
+"""Batching, backpressure and failure accounting of the write-behind buffer."""
+
+import anyio
+import pytest
+from pymongo.errors import BulkWriteError
+
+from storage import MemoryClient
+from write_behind import WriteBehindBuffer
+
+pytestmark = pytest.mark.anyio
+
+
+class RecordingCollection:
+    """Counts ``insert_many`` calls; ``fail`` makes every call raise it."""
+
+    def __init__(self, fail=None) -> None:
+        self.batches = []
+        self.fail = fail
+
+    async def insert_many(self, docs, ordered=True):
+        self.batches.append(list(docs))
+        if self.fail is not None:
+            raise self.fail
+
+
+async def test_documents_are_flushed_in_batches_per_collection():
+    buffer = WriteBehindBuffer(batch_size=3, flush_interval=10)
+    buffer.start()
+    first, second = RecordingCollection(), RecordingCollection()
+    for index in range(4):
+        await buffer.enqueue(first, {"n": index})
+    await buffer.enqueue(second, {"n": 4})
+    await buffer.close()
+
+    assert [len(batch) for batch in first.batches] == [3, 1]
+    assert [len(batch) for batch in second.batches] == [1]
+    assert buffer.stats() == {"queued": 5, "flushed": 5, "dropped": 0, "pending": 0, "max_queue": 10000}
+
+
+async def test_partial_batch_is_flushed_after_the_interval():
+    buffer = WriteBehindBuffer(batch_size=100, flush_interval=0.01)
+    buffer.start()
+    collection = RecordingCollection()
+    await buffer.enqueue(collection, {"n": 1})
+    with anyio.fail_after(1):
+        while not collection.batches:
+            await anyio.sleep(0.005)
+    assert buffer.flushed == 1
+    await buffer.close()
+
+
+async def test_full_queue_blocks_producers_until_the_database_catches_up():
+    buffer = WriteBehindBuffer(max_queue=2, batch_size=1, flush_interval=10)
+    buffer.start()
+    release = anyio.Event()
+    collection = RecordingCollection()
+    insert_many = collection.insert_many
+
+    async def slow_insert_many(docs, ordered=True):
+        await release.wait()
+        await insert_many(docs, ordered)
+
+    collection.insert_many = slow_insert_many
+    for index in range(3):
+        # The first document is taken by the stalled flusher, two fill the queue.
+        await buffer.enqueue(collection, {"n": index})
+        await anyio.sleep(0)
+    with pytest.raises(TimeoutError):
+        with anyio.fail_after(0.05):
+            await buffer.enqueue(collection, {"n": 3})
+    assert buffer.stats()["pending"] == 2
+
+    release.set()
+    await buffer.enqueue(collection, {"n": 3})
+    await buffer.close()
+    assert [doc["n"] for batch in collection.batches for doc in batch] == [0, 1, 2, 3]
+
+
+async def test_failed_writes_are_counted_and_the_flusher_survives():
+    buffer = WriteBehindBuffer(batch_size=2, flush_interval=10)
+    buffer.start()
+    broken = RecordingCollection(fail=RuntimeError("down"))
+    partial = RecordingCollection(fail=BulkWriteError({"nInserted": 1, "writeErrors": [{"index": 1}]}))
+    healthy = MemoryClient()["test"]["status_checks"]
+
+    await buffer.enqueue(broken, {"n": 1})
+    await buffer.enqueue(broken, {"n": 2})
+    await buffer.enqueue(partial, {"n": 3})
+    await buffer.enqueue(partial, {"n": 4})
+    await buffer.enqueue(healthy, {"n": 5})
+    await buffer.close()
+
+    assert (buffer.flushed, buffer.dropped) == (2, 3)
+    assert await healthy.count_documents({}) == 1
+
+
+async def test_close_without_start_is_a_no_op():
+    await WriteBehindBuffer().close()